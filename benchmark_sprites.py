@@ -0,0 +1,72 @@
+"""
+Benchmark of sprite blitting: separate unconverted sprites vs the atlas
+Run with: python benchmark_sprites.py (set SDL_VIDEODRIVER=dummy to run headless)
+"""
+
+import random
+import time
+import pygame
+from constants import *
+from sprites import SpriteManager
+
+BLITS = 20000
+ROUNDS = 5
+
+
+def _best_time(draw):
+    """Fastest of several rounds, in milliseconds"""
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        draw()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    rng = random.Random(1)
+    positions = [(rng.randrange(SCREEN_WIDTH), rng.randrange(SCREEN_HEIGHT)) for _ in range(BLITS)]
+    tile_types = [rng.choice([TILE_GRASS, TILE_TREE, TILE_WATER, TILE_STONE, TILE_CAVE_FLOOR])
+                  for _ in range(BLITS)]
+    enemy_types = [rng.choice(["tiger", "snake", "bear", "bat"]) for _ in range(BLITS)]
+
+    plain = SpriteManager()
+    atlas = SpriteManager()
+    atlas.build_atlas()
+    rle_atlas = SpriteManager()
+    rle_atlas.build_atlas(rle=True)
+
+    def separate(get_sprite, types):
+        """One blit call per unconverted sprite, as before the atlas"""
+        def draw():
+            for sprite_type, position in zip(types, positions):
+                screen.blit(get_sprite(sprite_type), position)
+        return draw
+
+    def batched(get_source, types):
+        """One Surface.blits call with atlas source rects"""
+        def draw():
+            batch = []
+            for sprite_type, position in zip(types, positions):
+                surface, area = get_source(sprite_type)
+                batch.append((surface, position, area))
+            screen.blits(batch, doreturn=False)
+        return draw
+
+    print(f"{BLITS} blits per round, best of {ROUNDS}, in blits/ms")
+    print(f"{'':>8} {'separate':>10} {'atlas':>10} {'atlas+RLE':>10}")
+    for name, types, get_sprite, source in (
+            ("tiles", tile_types, plain.get_tile, "tile_source"),
+            ("enemies", enemy_types, plain.get_enemy_sprite, "enemy_source")):
+        before_ms = _best_time(separate(get_sprite, types))
+        after_ms = _best_time(batched(getattr(atlas, source), types))
+        rle_ms = _best_time(batched(getattr(rle_atlas, source), types))
+        print(f"{name:>8} {BLITS / before_ms:10.0f} {BLITS / after_ms:10.0f} {BLITS / rle_ms:10.0f}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -58,11 +58,19 @@ PLAYER_DIAGONAL_SPEED = 2.1  # Speed when moving diagonally (sqrt(2) factor)
 PLAYER_MAX_HEALTH = 100
 PLAYER_MAX_HUNGER = 100
 HUNGER_DEPLETION_RATE = 0.01  # Per frame
-INVENTORY_SIZE = 20
+INVENTORY_SIZE = 20  # Slots; the first HOTBAR_SLOTS are the quick inventory bar
+HOTBAR_SLOTS = 8
+STACK_LIMIT = 64  # Most items per slot
+STACK_LIMITS = {  # Items that stack lower
+    "wooden_pickaxe": 1, "stone_pickaxe": 1, "iron_pickaxe": 1, "diamond_pickaxe": 1,
+    "wooden_sword": 1, "stone_sword": 1,
+}
 
 # World generation
 WORLD_WIDTH = 150  # In tiles
 WORLD_HEIGHT = 150  # In tiles (for each level)
+CHUNK_SIZE = 32  # Worlds are generated lazily in CHUNK_SIZE x CHUNK_SIZE tile chunks
+WALKABLE_BUCKET_SIZE = 8  # Walkable tiles are indexed in 8x8 tile buckets (must divide CHUNK_SIZE)
 
 # World levels
 LEVEL_JUNGLE = "jungle"
@@ -90,6 +98,49 @@ TILE_DIAMOND_ORE = 14
 TILE_CAVE_ENTRANCE = 15  # Portal between levels
 TILE_CAVE_EXIT = 16  # Portal between levels
 
+# Tile properties (bit flags), shared by collision, mining and AI code
+TILE_FLAG_SOLID = 1  # Blocks movement
+TILE_FLAG_MINABLE = 2  # Can be mined or cut
+
+TILE_PROPERTIES = {
+    TILE_AIR: 0,
+    TILE_GRASS: 0,
+    TILE_TREE: TILE_FLAG_SOLID | TILE_FLAG_MINABLE,
+    TILE_BUSH: TILE_FLAG_MINABLE,
+    TILE_FLOWER: 0,
+    TILE_WATER: TILE_FLAG_SOLID,
+    TILE_DIRT: 0,
+    TILE_CAVE_FLOOR: 0,
+    TILE_CAVE_WALL: TILE_FLAG_SOLID,
+    TILE_STONE: TILE_FLAG_SOLID | TILE_FLAG_MINABLE,
+    TILE_IRON_ORE: TILE_FLAG_SOLID | TILE_FLAG_MINABLE,
+    TILE_DIAMOND_ORE: TILE_FLAG_SOLID | TILE_FLAG_MINABLE,
+    TILE_CAVE_ENTRANCE: 0,
+    TILE_CAVE_EXIT: 0,
+}
+
+# 256-entry byte table (1 = solid) for bytes.translate and direct indexing
+SOLID_TABLE = bytes(1 if TILE_PROPERTIES.get(tile, 0) & TILE_FLAG_SOLID else 0
+                    for tile in range(256))
+
+# Autotiling: these tiles get a sprite variant for each combination of sides
+# that border a different tile group (walls and ores are all rock)
+AUTOTILE_GROUPS = {
+    TILE_CAVE_WALL: 1,
+    TILE_STONE: 1,
+    TILE_IRON_ORE: 1,
+    TILE_DIAMOND_ORE: 1,
+    TILE_WATER: 2,
+    TILE_TREE: 3,
+}
+AUTOTILED = (TILE_CAVE_WALL, TILE_STONE, TILE_WATER, TILE_TREE)
+EDGE_NORTH, EDGE_EAST, EDGE_SOUTH, EDGE_WEST = 1, 2, 4, 8  # Edge mask bits
+EDGE_SHIFT = 8  # Variant sprites are keyed tile_type | edges << EDGE_SHIFT
+
+# 256-entry byte tables of each tile's group, and 1 for autotiled tiles
+AUTOTILE_GROUP_TABLE = bytes(AUTOTILE_GROUPS.get(tile, 0) for tile in range(256))
+AUTOTILED_TABLE = bytes(1 if tile in AUTOTILED else 0 for tile in range(256))
+
 # Item types
 ITEM_WOOD = "wood"
 ITEM_STONE = "stone"
@@ -124,6 +175,20 @@ DAY_LENGTH = 3600  # 60 seconds at 60 FPS
 NIGHT_LENGTH = 2400  # 40 seconds at 60 FPS
 DAY_CYCLE_LENGTH = DAY_LENGTH + NIGHT_LENGTH
 
+# Day/night lighting: tiles are pre-tinted for a few discrete light levels
+LIGHT_LEVELS = 8  # 0 = darkest night, LIGHT_LEVELS - 1 = full daylight
+NIGHT_TINT = (70, 80, 140)  # Multiplied into tile colours at the darkest level
+LIGHT_PREFETCH_FRAMES = 30  # Chunks for the next light level are rendered this far ahead
+LIGHT_TINTS = [tuple(n + (255 - n) * light // (LIGHT_LEVELS - 1) for n in NIGHT_TINT)
+               for light in range(LIGHT_LEVELS)]
+
+# Cave lighting: light falls by one level per tile away from each emitter
+PLAYER_LIGHT = 8  # The player's light (also the brightest level)
+LIGHT_EMITTERS = {TILE_CAVE_EXIT: 6, TILE_DIAMOND_ORE: 4, TILE_IRON_ORE: 3}
+EMIT_TABLE = bytes(LIGHT_EMITTERS.get(tile, 0) for tile in range(256))  # For bytes.translate
+CAVE_FOG_BRIGHTNESS = 40  # Explored tiles out of the light stay dimly visible
+LIGHT_BRIGHTNESS = [255 * light // PLAYER_LIGHT for light in range(PLAYER_LIGHT + 1)]
+
 # Enemy spawning
 ENEMY_SPAWN_CHANCE = 0.01  # Per frame during night
 MAX_ENEMIES = 20
@@ -143,6 +208,44 @@ RECIPES = {
     "door": {"wood": 2},
 }
 
+# Save games
+SAVE_FILE = "savegame.vcw"
+SAVE_COMPRESS = True  # zlib-compress chunks that shrink
+AUTOSAVE_INTERVAL = 1800  # 30 seconds at 60 FPS
+
+# Cache of generated worlds, keyed by seed, size and generator version
+WORLD_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Rendering
+CHUNK_SURFACE_CACHE_BYTES = 32 * 1024 * 1024  # Pre-rendered chunks kept in memory
+RENDER_SCALES = (1, 2, 4)  # Window pixels per view pixel: tiles are drawn 1/scale size and the view upscaled
+RENDER_SCALE = 1
+ZOOM_LEVELS = (1, 2, 4, 8)  # World pixels per window pixel: 1x, 1/2x, 1/4x and 1/8x zoom
+WORLD_LAYER_MARGIN = 64  # Pixels of world kept around the view, so small camera moves need no redraw
+
+# Minimap: one pixel per tile, scaled to fit the HUD (tiles not loaded yet stay black)
+MINIMAP_SIZE = 150  # Pixels across
+MINIMAP_ENEMY_RANGE = 40  # Enemies within this many tiles of the player are marked
+MINIMAP_COLORS = {
+    TILE_GRASS: GRASS_GREEN,
+    TILE_TREE: JUNGLE_GREEN,
+    TILE_BUSH: BUSH_GREEN,
+    TILE_FLOWER: GRASS_GREEN,
+    TILE_WATER: WATER_BLUE,
+    TILE_DIRT: DIRT_BROWN,
+    TILE_CAVE_FLOOR: CAVE_FLOOR,
+    TILE_CAVE_WALL: CAVE_DARK,
+    TILE_STONE: STONE_GRAY,
+    TILE_IRON_ORE: IRON_GRAY,
+    TILE_DIAMOND_ORE: DIAMOND_CYAN,
+    TILE_CAVE_ENTRANCE: PORTAL_PURPLE,
+    TILE_CAVE_EXIT: PORTAL_PURPLE,
+}
+
+# UI
+TEXT_CACHE_ENTRIES = 256  # Rendered text surfaces kept (least recently used go first)
+HUD_COLORKEY = (0, 0, 1)  # Transparent colour of the retained HUD layer (near black, so text edges blend dark)
+
 # Game states
 STATE_MENU = "menu"
 STATE_PLAYING = "playing"
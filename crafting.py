@@ -0,0 +1,141 @@
+"""
+Crafting engine: which recipes the player can make, and how to make them
+Ingredients that have recipes of their own are crafted on the way
+"""
+
+from constants import *
+
+
+class CraftingBook:
+    """Craftability index over a recipe table, refreshed from the player's inventory version
+
+    counts holds how many times each recipe can be made straight from the
+    inventory; when the inventory changes only the recipes using the items
+    that changed are recounted. Plans (ordered crafting steps, intermediate
+    products included) are memoized until the inventory changes again.
+    """
+
+    def __init__(self, recipes=RECIPES):
+        self.recipes = recipes
+        self.users = {}  # {ingredient: [recipes that use it]}
+        for item_name, ingredients in recipes.items():
+            for ingredient in ingredients:
+                self.users.setdefault(ingredient, []).append(item_name)
+
+        self.player = None
+        self.version = None
+        self.stock = {}  # Inventory the index was built from
+        self.counts = {}  # {item_name: times it can be crafted directly}
+        self.plans = {}  # {(item_name, quantity): [(item_name, times)] or None}
+        self.recounts = 0
+
+    def refresh(self, player):
+        """Bring the index up to date with a player's inventory (only does work when it changed)"""
+        inventory = player.inventory
+        if player is self.player and inventory.version == self.version:
+            return
+
+        if player is self.player:
+            stale = set()
+            for item_type in set(self.stock) | set(inventory.counts):
+                if self.stock.get(item_type, 0) != inventory.count(item_type):
+                    stale.update(self.users.get(item_type, ()))
+        else:
+            stale = self.recipes
+
+        self.player = player
+        self.version = inventory.version
+        self.stock = dict(inventory.counts)
+        self.plans = {}
+        for item_name in stale:
+            self.counts[item_name] = self._direct_count(item_name)
+            self.recounts += 1
+
+    def craftable(self, player, item_name):
+        """How many times a recipe can be made straight from the inventory"""
+        self.refresh(player)
+        return self.counts.get(item_name, 0)
+
+    def can_craft(self, player, item_name, quantity=1):
+        """Check whether quantity of an item can be made, crafting missing ingredients first"""
+        return self.plan(player, item_name, quantity) is not None
+
+    def plan(self, player, item_name, quantity=1):
+        """Crafting steps [(item_name, times)] that make quantity of an item and fit the inventory, or None"""
+        self.refresh(player)
+        key = (item_name, quantity)
+        if key not in self.plans:
+            steps = []
+            if (item_name in self.recipes and
+                    self._resolve(item_name, quantity, dict(self.stock), steps, set(), True) and
+                    player.inventory.fits(self._changes(steps))):
+                self.plans[key] = steps
+            else:
+                self.plans[key] = None  # Missing ingredients, or no room for the products
+        return self.plans[key]
+
+    def max_craftable(self, player, item_name):
+        """Largest quantity of an item that can be made and stored, crafting missing ingredients first"""
+        self.refresh(player)
+        if self.plan(player, item_name, 1) is None:
+            return 0
+
+        # Double until a plan fails, then bisect between the last two
+        low, high = 1, 2
+        while self.plan(player, item_name, high) is not None:
+            low, high = high, high * 2
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.plan(player, item_name, middle) is not None:
+                low = middle
+            else:
+                high = middle
+        return low
+
+    def craft(self, player, item_name, quantity=1):
+        """Make quantity of an item (None = as many as possible) in one inventory change; returns how many"""
+        if quantity is None:
+            quantity = self.max_craftable(player, item_name)
+        steps = self.plan(player, item_name, quantity) if quantity > 0 else None
+        if steps is None:
+            return 0
+
+        if not player.change_inventory(self._changes(steps)):
+            return 0
+        return quantity
+
+    def _changes(self, steps):
+        """Net inventory change over crafting steps: intermediate products cancel out"""
+        changes = {}
+        for step_item, times in steps:
+            for ingredient, amount in self.recipes[step_item].items():
+                changes[ingredient] = changes.get(ingredient, 0) - amount * times
+            changes[step_item] = changes.get(step_item, 0) + times
+        return changes
+
+    def _direct_count(self, item_name):
+        """Times a recipe can be made from the stock alone"""
+        return min(self.stock.get(ingredient, 0) // amount
+                   for ingredient, amount in self.recipes[item_name].items())
+
+    def _resolve(self, item_name, quantity, stock, steps, resolving, craft):
+        """Take quantity of an item from stock, planning crafts for what is missing"""
+        have = stock.get(item_name, 0)
+        if have >= quantity and not craft:
+            stock[item_name] = have - quantity
+            return True
+        missing = quantity if craft else quantity - have
+        if not craft:
+            stock[item_name] = 0
+
+        recipe = self.recipes.get(item_name)
+        if recipe is None or item_name in resolving:
+            return False  # Raw material, or a recipe cycle
+
+        resolving.add(item_name)
+        for ingredient, amount in recipe.items():
+            if not self._resolve(ingredient, amount * missing, stock, steps, resolving, False):
+                return False
+        resolving.discard(item_name)
+        steps.append((item_name, missing))
+        return True
@@ -124,46 +124,38 @@ class Enemy:
     def _check_collisions(self, world, axis):
         """Check and resolve collisions with solid tiles"""
         rect = self.get_rect()
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
 
-        # Get nearby tiles
-        start_x = int(rect.left // TILE_SIZE) - 1
-        end_x = int(rect.right // TILE_SIZE) + 2
-        start_y = int(rect.top // TILE_SIZE) - 1
-        end_y = int(rect.bottom // TILE_SIZE) + 2
+        # Only the tiles the rectangle overlaps can collide
+        start_x = left // TILE_SIZE
+        end_x = (right - 1) // TILE_SIZE + 1
+        start_y = top // TILE_SIZE
+        end_y = (bottom - 1) // TILE_SIZE + 1
 
         for tile_x in range(start_x, end_x):
             for tile_y in range(start_y, end_y):
-                tile = world.get_tile(tile_x, tile_y, self.level)
-
-                # Check if tile is solid
-                if self._is_solid_tile(tile):
-                    tile_rect = pygame.Rect(tile_x * TILE_SIZE, tile_y * TILE_SIZE,
-                                           TILE_SIZE, TILE_SIZE)
-                    if rect.colliderect(tile_rect):
+                # Check the world's solidity mask
+                if world.is_solid(tile_x, tile_y, self.level):
+                    tile_left = tile_x * TILE_SIZE
+                    tile_top = tile_y * TILE_SIZE
+                    if (left < tile_left + TILE_SIZE and right > tile_left and
+                            top < tile_top + TILE_SIZE and bottom > tile_top):
                         # Resolve collision
                         if axis == 'x':
                             if self.velocity_x > 0:  # Moving right
-                                self.x = tile_rect.left - self.width
+                                self.x = tile_left - self.width
                             elif self.velocity_x < 0:  # Moving left
-                                self.x = tile_rect.right
+                                self.x = tile_left + TILE_SIZE
                             # Change wander direction
                             self.wander_direction_x *= -1
                         elif axis == 'y':
                             if self.velocity_y > 0:  # Moving down
-                                self.y = tile_rect.top - self.height
+                                self.y = tile_top - self.height
                             elif self.velocity_y < 0:  # Moving up
-                                self.y = tile_rect.bottom
+                                self.y = tile_top + TILE_SIZE
                             # Change wander direction
                             self.wander_direction_y *= -1
 
-    def _is_solid_tile(self, tile_type):
-        """Check if a tile type is solid (blocks movement)"""
-        solid_tiles = {
-            TILE_TREE, TILE_WATER,  # Jungle
-            TILE_CAVE_WALL, TILE_STONE, TILE_IRON_ORE, TILE_DIAMOND_ORE  # Cave
-        }
-        return tile_type in solid_tiles
-
     def _attack(self, player):
         """Attack the player"""
         player.take_damage(self.damage)
@@ -188,13 +180,15 @@ class Enemy:
 
         # Draw at camera-relative position
         screen.blit(sprite, (self.x - camera_x, self.y - camera_y))
+        self.draw_health_bar(screen, camera_x, camera_y)
 
-        # Draw health bar if damaged
+    def draw_health_bar(self, screen, camera_x, camera_y, zoom=1):
+        """Draw health bar if damaged"""
         if self.health < self.max_health:
-            bar_x = self.x - camera_x
-            bar_y = self.y - camera_y - 5
-            bar_width = self.width
-            bar_height = 3
+            bar_x = (self.x - camera_x) / zoom
+            bar_y = (self.y - camera_y - 5) / zoom
+            bar_width = self.width / zoom
+            bar_height = max(1, 3 // zoom)
 
             # Background
             pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, bar_width, bar_height))
@@ -238,16 +232,11 @@ class EnemyManager:
 
     def spawn_jungle_animal(self, player, world):
         """Spawn an animal in the jungle"""
-        # Random position around player but off-screen
-        angle = random.uniform(0, 2 * 3.14159)
-        distance = random.uniform(300, 500)
-
-        spawn_x = player.x + distance * pygame.math.Vector2(1, 0).rotate_rad(angle).x
-        spawn_y = player.y + distance * pygame.math.Vector2(0, 1).rotate_rad(angle).y
-
-        # Clamp to world bounds
-        spawn_x = max(0, min(spawn_x, world.width * TILE_SIZE - TILE_SIZE))
-        spawn_y = max(0, min(spawn_y, world.height * TILE_SIZE - TILE_SIZE))
+        # Random walkable tile around player but off-screen
+        tile = world.sample_walkable_near(LEVEL_JUNGLE, player.x, player.y, 300, 500, random)
+        if tile is None or not world.same_region((LEVEL_JUNGLE, *tile), (LEVEL_JUNGLE, *player.get_tile())):
+            return
+        spawn_x, spawn_y = tile[0] * TILE_SIZE, tile[1] * TILE_SIZE
 
         # Choose animal type
         animal_type = random.choice(["tiger", "snake", "bear"])
@@ -257,16 +246,11 @@ class EnemyManager:
 
     def spawn_cave_creature(self, player, world):
         """Spawn a creature in the cave"""
-        # Random position around player but off-screen
-        angle = random.uniform(0, 2 * 3.14159)
-        distance = random.uniform(300, 500)
-
-        spawn_x = player.x + distance * pygame.math.Vector2(1, 0).rotate_rad(angle).x
-        spawn_y = player.y + distance * pygame.math.Vector2(0, 1).rotate_rad(angle).y
-
-        # Clamp to world bounds
-        spawn_x = max(0, min(spawn_x, world.width * TILE_SIZE - TILE_SIZE))
-        spawn_y = max(0, min(spawn_y, world.height * TILE_SIZE - TILE_SIZE))
+        # Random walkable tile around player but off-screen
+        tile = world.sample_walkable_near(LEVEL_CAVE, player.x, player.y, 300, 500, random)
+        if tile is None or not world.same_region((LEVEL_CAVE, *tile), (LEVEL_CAVE, *player.get_tile())):
+            return
+        spawn_x, spawn_y = tile[0] * TILE_SIZE, tile[1] * TILE_SIZE
 
         # Bat is the main cave enemy
         creature_type = "bat"
@@ -274,11 +258,23 @@ class EnemyManager:
         enemy = Enemy(spawn_x, spawn_y, creature_type, self.sprite_manager, LEVEL_CAVE)
         self.enemies.append(enemy)
 
-    def draw(self, screen, camera_x, camera_y, current_level):
-        """Draw all enemies on the current level"""
-        for enemy in self.enemies:
-            if enemy.level == current_level:
-                enemy.draw(screen, camera_x, camera_y)
+    def draw(self, screen, camera_x, camera_y, current_level, zoom=1):
+        """Draw all enemies on the current level (camera in world pixels, zoom in world pixels per screen pixel)"""
+        visible = [enemy for enemy in self.enemies if enemy.level == current_level]
+
+        # Sprites in one batched call, then health bars on top
+        batch = []
+        for enemy in visible:
+            if zoom == 1:
+                surface, area = self.sprite_manager.enemy_source(enemy.enemy_type)
+            else:
+                surface = self.sprite_manager.zoomed(self.sprite_manager.get_enemy_sprite(enemy.enemy_type), zoom)
+                area = None
+            batch.append((surface, ((enemy.x - camera_x) / zoom, (enemy.y - camera_y) / zoom), area))
+        screen.blits(batch, doreturn=False)
+
+        for enemy in visible:
+            enemy.draw_health_bar(screen, camera_x, camera_y, zoom)
 
     def check_player_collision(self, player):
         """Check if any enemy is colliding with player (for continuous damage)"""
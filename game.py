@@ -2,6 +2,7 @@
 Main game file for Pixel Art Vampire Cave Crawler
 """
 
+import os
 import pygame
 import sys
 from constants import *
@@ -10,11 +11,17 @@ from player import Player
 from world import World
 from enemy import EnemyManager
 from ui import UI
+from savegame import save_game, load_game, Autosaver, SaveFormatError
+from profiler import FrameProfiler
+from worldcache import WorldCache
+
+# Window exposed event (separate from VIDEOEXPOSE since pygame 2.0.1)
+WINDOW_EXPOSED = getattr(pygame, "WINDOWEXPOSED", pygame.VIDEOEXPOSE)
 
 class Game:
     """Main game class"""
 
-    def __init__(self):
+    def __init__(self, render_scale=RENDER_SCALE):
         # Initialize Pygame
         pygame.init()
         pygame.display.set_caption("Vampire Cave Explorer")
@@ -23,8 +30,9 @@ class Game:
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.clock = pygame.time.Clock()
 
-        # Initialize sprite manager
+        # Initialize sprite manager (the atlas needs the display created above)
         self.sprite_manager = SpriteManager()
+        self.sprite_manager.build_atlas()
 
         # Initialize UI
         self.ui = UI(self.sprite_manager)
@@ -37,19 +45,40 @@ class Game:
         # Game time
         self.game_time = 0
 
-        # Camera
+        # Camera (top-left of the view in world pixels, and world pixels per window pixel)
         self.camera_x = 0
         self.camera_y = 0
+        self.zoom = 1
 
         # Game objects (initialized when game starts)
         self.world = None
         self.player = None
         self.enemy_manager = None
 
+        # Background autosave, generated world cache and frame-time instrumentation
+        self.autosaver = Autosaver(SAVE_FILE, compress=SAVE_COMPRESS)
+        self.world_cache = WorldCache()
+        self.profiler = FrameProfiler()
+        self.show_profile = False  # F3 overlay of the profiler's stats
+        self.profile_lines = []  # Refreshed a few times a second while shown
+
+        # Surface the world is drawn into (the screen itself at full resolution)
+        self.set_render_scale(render_scale)
+
+        # Presentation: static screens are only redrawn when something changes
+        self.scene = None  # World frame behind the pause/inventory/crafting overlays
+        self.dirty_rects = []  # Screen regions to redraw on static screens
+        self.presented_state = None
+
     def new_game(self):
         """Start a new game"""
+        self.autosaver.wait()
+        self.retire_world()
+
         # Create world
-        self.world = World(self.sprite_manager)
+        world = World(self.sprite_manager, cache=self.world_cache)
+        self.close_world()
+        self.world = world
 
         # Create player at spawn point
         self.player = Player(self.world.spawn_x, self.world.spawn_y, self.sprite_manager)
@@ -63,21 +92,112 @@ class Game:
         # Change state
         self.state = STATE_PLAYING
 
+    def set_render_scale(self, scale):
+        """Draw the world into a view 1/scale of the window size, upscaled in a single pass
+
+        Tiles are drawn TILE_SIZE // scale pixels wide, so the window shows the
+        same part of the world at every scale.
+        """
+        self.render_scale = scale
+        if scale == 1:
+            self.view = self.screen
+        else:
+            self.view = pygame.Surface((SCREEN_WIDTH // scale, SCREEN_HEIGHT // scale), 0, self.screen)
+        self.set_zoom(self.zoom)
+
+    def set_zoom(self, zoom):
+        """Show zoom world pixels per window pixel (one of ZOOM_LEVELS)
+
+        Zoom levels that would draw tiles smaller than a view pixel at the
+        render scale are capped.
+        """
+        self.zoom = max([level for level in ZOOM_LEVELS if level <= zoom and
+                         level * self.render_scale <= TILE_SIZE] or ZOOM_LEVELS[:1])
+        if self.player is not None:
+            self.update_camera()
+
+    def change_zoom(self, steps):
+        """Zoom out (positive steps) or back in through ZOOM_LEVELS"""
+        index = ZOOM_LEVELS.index(self.zoom) if self.zoom in ZOOM_LEVELS else 0
+        self.set_zoom(ZOOM_LEVELS[max(0, min(len(ZOOM_LEVELS) - 1, index + steps))])
+
+    def mouse_to_tile(self, pos):
+        """Tile under a window position, whatever the render scale and zoom"""
+        world_x = pos[0] * self.zoom + self.camera_x
+        world_y = pos[1] * self.zoom + self.camera_y
+        return int(world_x // TILE_SIZE), int(world_y // TILE_SIZE)
+
+    def retire_world(self):
+        """Hand the chunks the current world generated over to the world cache"""
+        if self.world is not None:
+            self.world_cache.store(self.world)
+
+    def close_world(self):
+        """Release the files the current world keeps mapped"""
+        if self.world is not None:
+            self.world.close()
+
+    def save_game(self):
+        """Save the current world, player and enemies to SAVE_FILE"""
+        if self.world is None or not self.player.is_alive():
+            return False
+        self.autosaver.wait()
+        try:
+            save_game(SAVE_FILE, self.world, self.player, self.enemy_manager,
+                      self.game_time, compress=SAVE_COMPRESS)
+        except OSError as e:
+            # Also runs when the window is closed, so report it rather than crash
+            print(f"Could not save to {SAVE_FILE}: {e}")
+            return False
+        self.autosaver.attach(self.world)
+        return True
+
+    def load_game(self):
+        """Resume the game stored in SAVE_FILE, if there is one"""
+        self.autosaver.wait()
+        if not os.path.exists(SAVE_FILE):
+            return False
+        self.retire_world()
+        try:
+            world, player, enemy_manager, game_time = \
+                load_game(SAVE_FILE, self.sprite_manager, self.world_cache)
+        except (SaveFormatError, OSError) as e:
+            print(f"Could not load {SAVE_FILE}: {e}")
+            return False
+        self.close_world()
+        self.world, self.player, self.enemy_manager, self.game_time = \
+            world, player, enemy_manager, game_time
+
+        self.autosaver.attach(self.world)
+        self.update_camera()
+        self.state = STATE_PLAYING
+        return True
+
     def run(self):
         """Main game loop"""
         while self.running:
+            self.profiler.begin_frame()
+
             # Handle events
             self.handle_events()
 
             # Update game state
-            self.update()
+            with self.profiler.section("update"):
+                self.update()
 
             # Draw
-            self.draw()
+            with self.profiler.section("draw"):
+                self.draw()
+
+            self.profiler.end_frame()
 
             # Maintain frame rate
             self.clock.tick(FPS)
 
+        # Let a pending autosave finish before exiting
+        self.autosaver.wait(5)
+        self.retire_world()
+        self.close_world()
         pygame.quit()
         sys.exit()
 
@@ -85,6 +205,9 @@ class Game:
         """Handle input events"""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                # Keep progress when the window is closed mid-game
+                if self.state in [STATE_PLAYING, STATE_PAUSED, STATE_INVENTORY, STATE_CRAFTING]:
+                    self.save_game()
                 self.running = False
 
             elif event.type == pygame.KEYDOWN:
@@ -93,11 +216,26 @@ class Game:
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 self.handle_mousedown(event.button, event.pos)
 
+            elif event.type == pygame.MOUSEMOTION and self.state == STATE_CRAFTING:
+                # Hover highlight: redraw just the rows it left and entered
+                for rect in self.ui.set_crafting_hover(event.pos):
+                    self.invalidate(rect)
+
+            elif event.type == pygame.MOUSEWHEEL and self.state == STATE_PLAYING:
+                # Wheel down zooms out
+                self.change_zoom(-event.y)
+
+            elif event.type in (pygame.VIDEOEXPOSE, WINDOW_EXPOSED, pygame.VIDEORESIZE):
+                # The window system lost our pixels
+                self.invalidate()
+
     def handle_keydown(self, key):
         """Handle key press events"""
         if self.state == STATE_MENU:
             if key == pygame.K_SPACE:
                 self.new_game()
+            elif key == pygame.K_l:
+                self.load_game()
 
         elif self.state == STATE_PLAYING:
             if key == pygame.K_ESCAPE:
@@ -106,13 +244,27 @@ class Game:
                 self.state = STATE_INVENTORY
             elif key == pygame.K_c:
                 self.state = STATE_CRAFTING
+                self.ui.set_crafting_hover(pygame.mouse.get_pos())
             elif key == pygame.K_e:
                 # Eat food (example: apple)
                 self.player.eat_food(ITEM_APPLE)
+            elif key == pygame.K_F2:
+                # Cycle through the render resolutions
+                scales = list(RENDER_SCALES)
+                index = scales.index(self.render_scale) if self.render_scale in scales else -1
+                self.set_render_scale(scales[(index + 1) % len(scales)])
+            elif key == pygame.K_F3:
+                self.show_profile = not self.show_profile
+            elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.change_zoom(1)
+            elif key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                self.change_zoom(-1)
 
         elif self.state == STATE_PAUSED:
             if key == pygame.K_ESCAPE:
                 self.state = STATE_PLAYING
+            elif key == pygame.K_s:
+                self.save_game()
 
         elif self.state == STATE_INVENTORY:
             if key == pygame.K_ESCAPE or key == pygame.K_i:
@@ -133,11 +285,7 @@ class Game:
         if button == 1:  # Left click
             if self.state == STATE_PLAYING:
                 # Mining
-                mouse_x, mouse_y = pos
-                world_x = mouse_x + self.camera_x
-                world_y = mouse_y + self.camera_y
-                tile_x = int(world_x // TILE_SIZE)
-                tile_y = int(world_y // TILE_SIZE)
+                tile_x, tile_y = self.mouse_to_tile(pos)
 
                 # Check if tile is in range
                 player_center_x = self.player.x + self.player.width // 2
@@ -152,8 +300,13 @@ class Game:
                     self.player.mine_tile(tile_x, tile_y, self.world)
 
             elif self.state == STATE_CRAFTING:
-                # Crafting click
-                self.ui.handle_crafting_click(pos, self.player)
+                # Crafting click, Shift crafts as many as possible (changes the HUD under the overlay too)
+                quantity = None if pygame.key.get_mods() & pygame.KMOD_SHIFT else 1
+                changed = self.ui.handle_crafting_click(pos, self.player, quantity)
+                if changed:
+                    self.scene = None
+                    for rect in changed:
+                        self.invalidate(rect)
 
     def update(self):
         """Update game logic"""
@@ -177,13 +330,14 @@ class Game:
             # Increment game time
             self.game_time += 1
 
+            # Autosave (only the snapshot happens on this thread)
+            if self.player.is_alive():
+                with self.profiler.section("autosave"):
+                    self.autosaver.update(self.world, self.player, self.enemy_manager, self.game_time)
+
             # Handle continuous mining
             if pygame.mouse.get_pressed()[0]:  # Left mouse button held
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                world_x = mouse_x + self.camera_x
-                world_y = mouse_y + self.camera_y
-                tile_x = int(world_x // TILE_SIZE)
-                tile_y = int(world_y // TILE_SIZE)
+                tile_x, tile_y = self.mouse_to_tile(pygame.mouse.get_pos())
 
                 # Check range
                 player_center_x = self.player.x + self.player.width // 2
@@ -199,44 +353,49 @@ class Game:
 
     def update_camera(self):
         """Update camera position to follow player"""
+        # World pixels the view covers at this zoom (the same at every render scale)
+        view_width, view_height = self.view.get_size()
+        view_width *= self.zoom * self.render_scale
+        view_height *= self.zoom * self.render_scale
+
         # Center camera on player
-        target_x = self.player.x + self.player.width // 2 - SCREEN_WIDTH // 2
-        target_y = self.player.y + self.player.height // 2 - SCREEN_HEIGHT // 2
+        target_x = self.player.x + self.player.width // 2 - view_width // 2
+        target_y = self.player.y + self.player.height // 2 - view_height // 2
 
-        # Clamp camera to world bounds
-        max_camera_x = self.world.width * TILE_SIZE - SCREEN_WIDTH
-        max_camera_y = self.world.height * TILE_SIZE - SCREEN_HEIGHT
+        # Clamp camera to world bounds (centering the world when it is smaller than the view)
+        max_camera_x = self.world.width * TILE_SIZE - view_width
+        max_camera_y = self.world.height * TILE_SIZE - view_height
 
-        self.camera_x = max(0, min(target_x, max_camera_x))
-        self.camera_y = max(0, min(target_y, max_camera_y))
+        self.camera_x = max(0, min(target_x, max_camera_x)) if max_camera_x >= 0 else max_camera_x // 2
+        self.camera_y = max(0, min(target_y, max_camera_y)) if max_camera_y >= 0 else max_camera_y // 2
 
     def draw(self):
-        """Draw everything"""
+        """Draw everything and present what changed"""
+        if self.state == STATE_PLAYING:
+            # Everything moves while playing: draw and present whole frames
+            self.draw_scene(crosshair=True)
+            self.scene = None
+            self.presented_state = self.state
+            pygame.display.flip()
+            return
+
+        # Other screens are static: redraw only what was invalidated
+        if self.state != self.presented_state:
+            self.presented_state = self.state
+            self.invalidate()
+        if not self.dirty_rects:
+            return
+
         if self.state == STATE_MENU:
             self.ui.draw_menu(self.screen)
 
-        elif self.state in [STATE_PLAYING, STATE_PAUSED, STATE_INVENTORY, STATE_CRAFTING]:
-            # Clear screen with background color (changes based on level and time)
-            bg_color = self.world.get_background_color(self.player.current_level, self.game_time)
-            self.screen.fill(bg_color)
-
-            # Draw world for current level
-            self.world.draw(self.screen, self.camera_x, self.camera_y, self.player.current_level)
-
-            # Draw enemies on current level
-            self.enemy_manager.draw(self.screen, self.camera_x, self.camera_y, self.player.current_level)
-
-            # Draw player
-            self.player.draw(self.screen, self.camera_x, self.camera_y)
-
-            # Draw HUD
-            self.ui.draw_hud(self.screen, self.player, self.game_time)
-
-            # Draw crosshair when mining
-            if pygame.mouse.get_focused():
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                self.ui.draw_crosshair(self.screen, mouse_x, mouse_y,
-                                      self.camera_x, self.camera_y)
+        elif self.state in [STATE_PAUSED, STATE_INVENTORY, STATE_CRAFTING]:
+            # The world behind the overlays is drawn once and reused
+            if self.scene is None:
+                self.draw_scene(crosshair=False)
+                self.scene = self.screen.copy()
+            else:
+                self.screen.blit(self.scene, (0, 0))
 
             # Draw overlays based on state
             if self.state == STATE_PAUSED:
@@ -249,8 +408,57 @@ class Game:
         elif self.state == STATE_DEAD:
             self.ui.draw_death(self.screen)
 
-        # Update display
-        pygame.display.flip()
+        # Update just the changed parts of the display
+        pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
+
+    def draw_scene(self, crosshair):
+        """Draw the world, entities and HUD onto the screen"""
+        # Clear screen with background color (changes based on level and time)
+        bg_color = self.world.get_background_color(self.player.current_level, self.game_time)
+        self.view.fill(bg_color)
+
+        # Draw world for current level
+        self.world.draw(self.view, self.camera_x, self.camera_y, self.player.current_level,
+                        self.game_time, self.zoom, self.render_scale)
+
+        # World pixels per view pixel, for everything drawn into the view
+        view_zoom = self.zoom * self.render_scale
+
+        # Draw enemies on current level
+        self.enemy_manager.draw(self.view, self.camera_x, self.camera_y, self.player.current_level, view_zoom)
+
+        # Draw player
+        self.player.draw(self.view, self.camera_x, self.camera_y, view_zoom)
+
+        # Darken the cave outside the light of the player, the portal and ores
+        if self.player.current_level == LEVEL_CAVE:
+            self.world.draw_lighting(self.view, self.camera_x, self.camera_y, self.player.get_tile(), view_zoom)
+
+        # Draw crosshair when mining
+        if crosshair and pygame.mouse.get_focused():
+            mouse_x, mouse_y = pygame.mouse.get_pos()
+            self.ui.draw_crosshair(self.view, mouse_x // self.render_scale,
+                                   mouse_y // self.render_scale,
+                                   self.camera_x, self.camera_y, view_zoom)
+
+        # Upscale a low-resolution view to the window in one nearest-neighbour pass
+        if self.view is not self.screen:
+            pygame.transform.scale(self.view, self.screen.get_size(), self.screen)
+
+        # Draw HUD
+        with self.profiler.section("hud"):
+            self.ui.draw_hud(self.screen, self.player, self.game_time, self.world, self.enemy_manager.enemies)
+
+        # Frame-time overlay
+        if self.show_profile:
+            if not self.profile_lines or self.game_time % (FPS // 2) == 0:
+                self.profile_lines = self.profiler.report()
+            self.ui.draw_profile(self.screen, self.profile_lines)
+
+    def invalidate(self, rect=None):
+        """Mark a screen region (by default all of it) to be redrawn on static screens"""
+        self.dirty_rects.append(pygame.Rect(rect) if rect else self.screen.get_rect())
 
 
 def main():
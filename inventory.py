@@ -0,0 +1,141 @@
+"""
+Slot-based inventory with stack limits and running item totals
+"""
+
+from constants import *
+
+
+class Inventory:
+    """A fixed number of slots, each holding one stack of an item type
+
+    counts keeps the total of every item type over all slots, so lookups do
+    not scan the slots. version goes up on every change; views of the
+    inventory (HUD, crafting, saves) compare it to skip work when nothing
+    changed.
+    """
+
+    def __init__(self, size=INVENTORY_SIZE):
+        self.items = [None] * size  # Item type in each slot (None = empty)
+        self.quantities = [0] * size
+        self.counts = {}  # {item_type: total quantity}
+        self.version = 0
+
+    def count(self, item_type):
+        """Total quantity of an item type"""
+        return self.counts.get(item_type, 0)
+
+    def __contains__(self, item_type):
+        return item_type in self.counts
+
+    def slots(self):
+        """(item_type, quantity) of every slot, (None, 0) for empty ones"""
+        return zip(self.items, self.quantities)
+
+    def room(self, item_type):
+        """How many more of an item type fit"""
+        limit = STACK_LIMITS.get(item_type, STACK_LIMIT)
+        room = 0
+        for item, quantity in zip(self.items, self.quantities):
+            if item is None:
+                room += limit
+            elif item == item_type:
+                room += limit - quantity
+        return room
+
+    def add(self, item_type, quantity):
+        """Add items, topping up existing stacks first; returns how many did not fit"""
+        left = self._put(item_type, quantity)
+        if left != quantity:
+            self.version += 1
+        return left
+
+    def remove(self, item_type, quantity):
+        """Remove items (all or nothing), from the last stacks first"""
+        if self.counts.get(item_type, 0) < quantity:
+            return False
+        self._take(item_type, quantity)
+        self.version += 1
+        return True
+
+    def set_slot(self, slot, item_type, quantity):
+        """Replace what a slot holds (None = empty it); returns the quantity over the stack limit, not stored"""
+        old_item, old_quantity = self.items[slot], self.quantities[slot]
+        if old_item is not None:
+            total = self.counts[old_item] - old_quantity
+            if total:
+                self.counts[old_item] = total
+            else:
+                del self.counts[old_item]
+
+        stored = min(quantity, STACK_LIMITS.get(item_type, STACK_LIMIT)) if item_type is not None else 0
+        if stored:
+            self.items[slot], self.quantities[slot] = item_type, stored
+            self.counts[item_type] = self.counts.get(item_type, 0) + stored
+        else:
+            self.items[slot], self.quantities[slot] = None, 0
+        self.version += 1
+        return quantity - stored if item_type is not None else 0
+
+    def apply(self, changes):
+        """Apply {item_type: quantity change} as one change; nothing happens unless all of it fits"""
+        saved = (self.items[:], self.quantities[:], dict(self.counts))
+        if self._change(changes):
+            self.version += 1
+            return True
+        self.items, self.quantities, self.counts = saved
+        return False
+
+    def fits(self, changes):
+        """Check whether apply(changes) would succeed, without changing anything"""
+        saved = (self.items[:], self.quantities[:], dict(self.counts))
+        fits = self._change(changes)
+        self.items, self.quantities, self.counts = saved
+        return fits
+
+    def _change(self, changes):
+        """Take the removals, then put the additions; False (part done) when something is missing or does not fit"""
+        for item_type, change in changes.items():
+            if change < 0:
+                if self.counts.get(item_type, 0) < -change:
+                    return False
+                self._take(item_type, -change)
+        return all(self._put(item_type, change) == 0 for item_type, change in changes.items() if change > 0)
+
+    def _put(self, item_type, quantity):
+        """Fill existing stacks, then empty slots; returns the quantity left over"""
+        items, quantities = self.items, self.quantities
+        limit = STACK_LIMITS.get(item_type, STACK_LIMIT)
+        left = quantity
+        for stacking in (True, False):
+            for i, item in enumerate(items):
+                if left == 0:
+                    break
+                if item == item_type if stacking else item is None:
+                    moved = min(left, limit - quantities[i])
+                    items[i] = item_type
+                    quantities[i] += moved
+                    left -= moved
+        if left != quantity:
+            self.counts[item_type] = self.counts.get(item_type, 0) + quantity - left
+        return left
+
+    def _take(self, item_type, quantity):
+        """Take a quantity the slots are known to hold, emptying stacks from the end"""
+        if quantity == 0:
+            return
+        items, quantities = self.items, self.quantities
+        left = quantity
+        for i in range(len(items) - 1, -1, -1):
+            if left == 0:
+                break
+            if items[i] == item_type:
+                moved = min(left, quantities[i])
+                quantities[i] -= moved
+                left -= moved
+                if quantities[i] == 0:
+                    items[i] = None
+        total = self.counts[item_type] - quantity
+        if total:
+            self.counts[item_type] = total
+        else:
+            del self.counts[item_type]
@@ -0,0 +1,204 @@
+"""
+Tile-resolution lightmap for the cave
+Light spreads from emitters (the player, the exit portal and ores) one level
+per tile, through open tiles only, and is kept up to date incrementally
+"""
+
+from constants import *
+
+REACH = max(LIGHT_EMITTERS.values())  # How far outside a chunk an emitter can light it
+
+
+class Lightmap:
+    """Light levels and explored tiles of one level, updated as the player moves and tiles change
+
+    Light from the fixed emitters is computed per chunk the first time the
+    chunk is looked at, treating chunks that are not loaded yet as solid
+    and dark, and patched when they load; the player's light is recomputed only when the player
+    crosses into another tile. Solid tiles are lit but do not pass light on,
+    unless they emit it themselves. Tiles whose brightness may have changed
+    are collected for take_changes.
+    """
+
+    def __init__(self, world, level=LEVEL_CAVE):
+        self.world = world
+        self.level = level
+        self.static = {}  # {(chunk_x, chunk_y): bytearray of light from the fixed emitters}
+        self.explored = {}  # {(chunk_x, chunk_y): bytearray, 1 where the player's light has been}
+        self.player_tile = None
+        self.player_light = {}  # {(tile_x, tile_y): light} from the player
+        self.changed = set()  # Tiles to redraw
+
+    def light(self, tile_x, tile_y):
+        """Light level of a tile (0 = unlit)"""
+        if not (0 <= tile_x < self.world.width and 0 <= tile_y < self.world.height):
+            return 0
+        static = self._static_chunk(tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE)
+        value = static[(tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE]
+        return max(value, self.player_light.get((tile_x, tile_y), 0))
+
+    def is_explored(self, tile_x, tile_y):
+        """Check whether the player's light has ever reached a tile"""
+        explored = self.explored.get((tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE))
+        return explored is not None and explored[(tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE] == 1
+
+    def row_brightness(self, tile_y, x0, x1):
+        """Brightness (0-255) of the tiles x0 <= x < x1 of a row"""
+        world = self.world
+        if not 0 <= tile_y < world.height:
+            return [0] * (x1 - x0)
+
+        row = []
+        chunk_y, local_y = divmod(tile_y, CHUNK_SIZE)
+        player_light = self.player_light
+        tile_x = x0
+        while tile_x < x1:
+            if not 0 <= tile_x < world.width:
+                row.append(0)
+                tile_x += 1
+                continue
+            chunk_x = tile_x // CHUNK_SIZE
+            end = min(x1, (chunk_x + 1) * CHUNK_SIZE, world.width)
+            static = self._static_chunk(chunk_x, chunk_y)
+            explored = self.explored.get((chunk_x, chunk_y))
+            offset = local_y * CHUNK_SIZE - chunk_x * CHUNK_SIZE
+            for x in range(tile_x, end):
+                brightness = LIGHT_BRIGHTNESS[max(static[offset + x], player_light.get((x, tile_y), 0))]
+                if brightness < CAVE_FOG_BRIGHTNESS and explored is not None and explored[offset + x]:
+                    brightness = CAVE_FOG_BRIGHTNESS
+                row.append(brightness)
+            tile_x = end
+        return row
+
+    def move_player(self, tile_x, tile_y):
+        """Follow the player to a tile (only does work when it is a different tile)"""
+        if (tile_x, tile_y) != self.player_tile:
+            self._relight_player(tile_x, tile_y)
+
+    def tile_changed(self, tile_x, tile_y):
+        """Update the light around a tile whose type (opacity or emission) changed"""
+        self._recompute_static(tile_x - REACH, tile_y - REACH, tile_x + REACH, tile_y + REACH)
+
+        if self.player_tile is not None:
+            player_x, player_y = self.player_tile
+            if abs(tile_x - player_x) + abs(tile_y - player_y) < PLAYER_LIGHT:
+                self._relight_player(player_x, player_y)
+
+    def chunk_loaded(self, chunk_x, chunk_y):
+        """Update the light of the chunks within REACH of a chunk that was just loaded"""
+        left, top = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+        self._recompute_static(left - REACH, top - REACH,
+                               left + CHUNK_SIZE - 1 + REACH, top + CHUNK_SIZE - 1 + REACH)
+
+    def _recompute_static(self, x0, y0, x1, y1):
+        """Recompute the computed static chunks overlapping tiles x0..x1, y0..y1 (inclusive), collecting changes"""
+        for chunk_y in range(y0 // CHUNK_SIZE, y1 // CHUNK_SIZE + 1):
+            for chunk_x in range(x0 // CHUNK_SIZE, x1 // CHUNK_SIZE + 1):
+                old = self.static.get((chunk_x, chunk_y))
+                if old is None:
+                    continue
+                new = self._compute_static(chunk_x, chunk_y)
+                self.static[(chunk_x, chunk_y)] = new
+                for i in range(len(new)):
+                    if new[i] != old[i]:
+                        self.changed.add((chunk_x * CHUNK_SIZE + i % CHUNK_SIZE,
+                                          chunk_y * CHUNK_SIZE + i // CHUNK_SIZE))
+
+    def take_changes(self):
+        """Tiles whose brightness may have changed since the last call"""
+        changed = self.changed
+        self.changed = set()
+        return changed
+
+    def _relight_player(self, tile_x, tile_y):
+        """Recompute the player's light (bounded breadth-first spread) and mark what it reaches explored"""
+        world = self.world
+        is_solid = world.is_solid
+        light = {(tile_x, tile_y): PLAYER_LIGHT}
+        frontier = [(tile_x, tile_y)]
+        for value in range(PLAYER_LIGHT - 1, 0, -1):
+            next_frontier = []
+            for x, y in frontier:
+                for neighbor in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                    if neighbor not in light:
+                        light[neighbor] = value
+                        if not is_solid(neighbor[0], neighbor[1], self.level):
+                            next_frontier.append(neighbor)
+            frontier = next_frontier
+
+        for x, y in light:
+            if 0 <= x < world.width and 0 <= y < world.height:
+                key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+                explored = self.explored.get(key)
+                if explored is None:
+                    explored = self.explored[key] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+                explored[(y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE] = 1
+
+        self.changed.update(self.player_light)
+        self.changed.update(light)
+        self.player_light = light
+        self.player_tile = (tile_x, tile_y)
+
+    def _static_chunk(self, chunk_x, chunk_y):
+        """Light from the fixed emitters over a chunk, computed on first use"""
+        static = self.static.get((chunk_x, chunk_y))
+        if static is None:
+            static = self.static[(chunk_x, chunk_y)] = self._compute_static(chunk_x, chunk_y)
+        return static
+
+    def _compute_static(self, chunk_x, chunk_y):
+        """Spread the emitters within REACH of a chunk over a window around it"""
+        size = CHUNK_SIZE + 2 * REACH
+        left, top = chunk_x * CHUNK_SIZE - REACH, chunk_y * CHUNK_SIZE - REACH
+        solid = bytearray(b"\x01") * (size * size)  # Outside the world is solid
+        emit = bytearray(size * size)
+
+        # Copy the window's rows out of the loaded chunks' solidity masks and tiles
+        world = self.world
+        for window_y in range(size):
+            tile_y = top + window_y
+            if not 0 <= tile_y < world.height:
+                continue
+            row_chunk_y, local_y = divmod(tile_y, CHUNK_SIZE)
+            tile_x, end = max(0, left), min(left + size, world.width)
+            while tile_x < end:
+                row_chunk_x, local_x = divmod(tile_x, CHUNK_SIZE)
+                count = min(end, (row_chunk_x + 1) * CHUNK_SIZE) - tile_x
+                chunk = world.peek_chunk(self.level, row_chunk_x, row_chunk_y)
+                if chunk is not None:
+                    source = local_y * CHUNK_SIZE + local_x
+                    target = window_y * size + tile_x - left
+                    solid[target:target + count] = chunk.solid[source:source + count]
+                    emit[target:target + count] = chunk.tiles[source:source + count].translate(EMIT_TABLE)
+                tile_x += count
+
+        # Breadth-first spread, brightest first: a tile's light is final when its bucket comes up
+        light = bytearray(size * size)
+        buckets = [[] for _ in range(REACH + 1)]
+        for value in set(LIGHT_EMITTERS.values()):
+            i = emit.find(value)
+            while i != -1:
+                light[i] = value
+                buckets[value].append(i)
+                i = emit.find(value, i + 1)
+
+        for value in range(REACH, 1, -1):
+            next_value = value - 1
+            next_bucket = buckets[next_value]
+            for i in buckets[value]:
+                if solid[i]:
+                    if emit[i] != value:
+                        continue  # Lit, but opaque
+                elif light[i] != value:
+                    continue  # Already reached by brighter light
+                x = i % size
+                for neighbor in (i - size, i + size, i - 1 if x else -1, i + 1 if x < size - 1 else -1):
+                    if 0 <= neighbor < size * size and light[neighbor] < next_value:
+                        light[neighbor] = next_value
+                        next_bucket.append(neighbor)
+
+        static = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        for local_y in range(CHUNK_SIZE):
+            start = (REACH + local_y) * size + REACH
+            static[local_y * CHUNK_SIZE:(local_y + 1) * CHUNK_SIZE] = light[start:start + CHUNK_SIZE]
+        return static
@@ -4,6 +4,7 @@ Player class with top-down movement and game mechanics
 
 import pygame
 from constants import *
+from inventory import Inventory
 
 class Player:
     """Player character with top-down movement, inventory, and stats"""
@@ -30,7 +31,7 @@ class Player:
         self.max_hunger = PLAYER_MAX_HUNGER
 
         # Inventory
-        self.inventory = {}  # {item_type: quantity}
+        self.inventory = Inventory()
         self.selected_slot = 0
         self.current_tool = TOOL_NONE
 
@@ -116,46 +117,37 @@ class Player:
     def _check_collisions(self, world, axis):
         """Check and resolve collisions with solid tiles"""
         rect = self.get_rect()
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
 
-        # Get nearby tiles
-        start_x = int(rect.left // TILE_SIZE) - 1
-        end_x = int(rect.right // TILE_SIZE) + 2
-        start_y = int(rect.top // TILE_SIZE) - 1
-        end_y = int(rect.bottom // TILE_SIZE) + 2
+        # Only the tiles the rectangle overlaps can collide
+        start_x = left // TILE_SIZE
+        end_x = (right - 1) // TILE_SIZE + 1
+        start_y = top // TILE_SIZE
+        end_y = (bottom - 1) // TILE_SIZE + 1
 
         for tile_x in range(start_x, end_x):
             for tile_y in range(start_y, end_y):
-                tile = world.get_tile(tile_x, tile_y, self.current_level)
-
-                # Check if tile is solid
-                if self._is_solid_tile(tile):
-                    tile_rect = pygame.Rect(tile_x * TILE_SIZE, tile_y * TILE_SIZE,
-                                           TILE_SIZE, TILE_SIZE)
-                    if rect.colliderect(tile_rect):
+                # Check the world's solidity mask
+                if world.is_solid(tile_x, tile_y, self.current_level):
+                    tile_left = tile_x * TILE_SIZE
+                    tile_top = tile_y * TILE_SIZE
+                    if (left < tile_left + TILE_SIZE and right > tile_left and
+                            top < tile_top + TILE_SIZE and bottom > tile_top):
                         # Resolve collision
                         if axis == 'x':
                             if self.velocity_x > 0:  # Moving right
-                                self.x = tile_rect.left - self.width
+                                self.x = tile_left - self.width
                             elif self.velocity_x < 0:  # Moving left
-                                self.x = tile_rect.right
+                                self.x = tile_left + TILE_SIZE
                         elif axis == 'y':
                             if self.velocity_y > 0:  # Moving down
-                                self.y = tile_rect.top - self.height
+                                self.y = tile_top - self.height
                             elif self.velocity_y < 0:  # Moving up
-                                self.y = tile_rect.bottom
-
-    def _is_solid_tile(self, tile_type):
-        """Check if a tile type is solid (blocks movement)"""
-        solid_tiles = {
-            TILE_TREE, TILE_WATER,  # Jungle
-            TILE_CAVE_WALL, TILE_STONE, TILE_IRON_ORE, TILE_DIAMOND_ORE  # Cave
-        }
-        return tile_type in solid_tiles
+                                self.y = tile_top + TILE_SIZE
 
     def _check_portals(self, world):
         """Check if player is on a portal tile and switch levels"""
-        tile_x = int((self.x + self.width // 2) // TILE_SIZE)
-        tile_y = int((self.y + self.height // 2) // TILE_SIZE)
+        tile_x, tile_y = self.get_tile()
 
         tile = world.get_tile(tile_x, tile_y, self.current_level)
 
@@ -190,9 +182,15 @@ class Player:
         if self.mining_progress >= mining_time_needed:
             # Mining complete!
             tile = world.get_tile(tile_x, tile_y, self.current_level)
+            resource = self._get_resource_from_tile(tile)
+            if resource and self.inventory.room(resource) == 0:
+                # Inventory full: leave the tile where it is
+                self.mining_target = None
+                self.mining_progress = 0
+                return False
+
             if self._can_mine_tile(tile):
                 # Get the resource
-                resource = self._get_resource_from_tile(tile)
                 if resource:
                     self.add_to_inventory(resource, 1)
 
@@ -211,11 +209,7 @@ class Player:
 
     def _can_mine_tile(self, tile_type):
         """Check if a tile can be mined"""
-        minable_tiles = {
-            TILE_TREE, TILE_BUSH,  # Jungle
-            TILE_STONE, TILE_IRON_ORE, TILE_DIAMOND_ORE  # Cave
-        }
-        return tile_type in minable_tiles
+        return bool(TILE_PROPERTIES.get(tile_type, 0) & TILE_FLAG_MINABLE)
 
     def _get_resource_from_tile(self, tile_type):
         """Get the resource item from a tile type"""
@@ -229,24 +223,20 @@ class Player:
         return tile_to_resource.get(tile_type)
 
     def add_to_inventory(self, item_type, quantity):
-        """Add items to inventory"""
-        if item_type in self.inventory:
-            self.inventory[item_type] += quantity
-        else:
-            self.inventory[item_type] = quantity
+        """Add items to inventory, returning how many did not fit"""
+        return self.inventory.add(item_type, quantity)
 
     def remove_from_inventory(self, item_type, quantity):
-        """Remove items from inventory"""
-        if item_type in self.inventory:
-            self.inventory[item_type] -= quantity
-            if self.inventory[item_type] <= 0:
-                del self.inventory[item_type]
-            return True
-        return False
+        """Remove items from inventory (nothing is removed unless there are enough)"""
+        return self.inventory.remove(item_type, quantity)
+
+    def change_inventory(self, changes):
+        """Apply several {item_type: quantity change} at once, as a single inventory change"""
+        return self.inventory.apply(changes)
 
     def has_items(self, item_type, quantity):
         """Check if player has enough of an item"""
-        return self.inventory.get(item_type, 0) >= quantity
+        return self.inventory.count(item_type) >= quantity
 
     def eat_food(self, food_type):
         """Consume food to restore hunger"""
@@ -277,14 +267,20 @@ class Player:
         """Get collision rectangle"""
         return pygame.Rect(self.x, self.y, self.width, self.height)
 
-    def draw(self, screen, camera_x, camera_y):
-        """Draw player sprite"""
+    def get_tile(self):
+        """Get the tile under the player's centre"""
+        return (int((self.x + self.width // 2) // TILE_SIZE),
+                int((self.y + self.height // 2) // TILE_SIZE))
+
+    def draw(self, screen, camera_x, camera_y, zoom=1):
+        """Draw player sprite (zoom is world pixels per screen pixel)"""
         # Get current sprite based on direction and movement
         is_moving = self.animation_frame != 0 or self.animation_timer != 0
         sprite = self.sprite_manager.get_player_sprite(self.direction, is_moving, self.animation_frame)
 
         # Draw at camera-relative position
-        screen.blit(sprite, (self.x - camera_x, self.y - camera_y))
+        screen.blit(self.sprite_manager.zoomed(sprite, zoom),
+                    ((self.x - camera_x) / zoom, (self.y - camera_y) / zoom))
 
         # Draw mining progress
         if self.mining_target:
@@ -294,10 +290,10 @@ class Player:
             progress = self.mining_progress / mining_time_needed
 
             # Draw progress bar
-            bar_x = tile_x * TILE_SIZE - camera_x
-            bar_y = tile_y * TILE_SIZE - camera_y - 5
-            bar_width = TILE_SIZE
-            bar_height = 3
+            bar_x = (tile_x * TILE_SIZE - camera_x) / zoom
+            bar_y = (tile_y * TILE_SIZE - camera_y - 5) / zoom
+            bar_width = TILE_SIZE / zoom
+            bar_height = max(1, 3 // zoom)
 
             pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, bar_width, bar_height))
             pygame.draw.rect(screen, (0, 255, 0), (bar_x, bar_y, bar_width * progress, bar_height))
@@ -0,0 +1,70 @@
+"""
+Frame-time instrumentation for the main loop
+"""
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from constants import *
+
+FRAME_BUDGET_MS = 1000 / FPS
+
+
+class FrameProfiler:
+    """Rolling per-frame timings for the whole frame and named sections"""
+
+    def __init__(self, window=FPS * 10):
+        self.window = window
+        self.frame_times = deque(maxlen=window)  # Milliseconds of work per frame
+        self.sections = {}  # {name: deque of milliseconds per frame}
+        self._frame_start = None
+        self._current = {}
+
+    def begin_frame(self):
+        """Start timing a frame"""
+        self._frame_start = time.perf_counter()
+        self._current = {}
+
+    def end_frame(self):
+        """Finish timing a frame (time spent waiting on the clock is excluded)"""
+        if self._frame_start is None:
+            return
+        self.frame_times.append((time.perf_counter() - self._frame_start) * 1000)
+        for name, times in self.sections.items():
+            times.append(self._current.get(name, 0.0))
+        self._frame_start = None
+
+    @contextmanager
+    def section(self, name):
+        """Time a named part of the current frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def record(self, name, ms):
+        """Add an externally measured duration to a section of the current frame"""
+        if name not in self.sections:
+            self.sections[name] = deque(maxlen=self.window)
+        self._current[name] = self._current.get(name, 0.0) + ms
+
+    def stats(self, name=None):
+        """Average, worst and hitch count (frames over budget) for the frame or a section"""
+        times = self.frame_times if name is None else self.sections.get(name, ())
+        if not times:
+            return {"avg_ms": 0.0, "max_ms": 0.0, "hitches": 0}
+        return {
+            "avg_ms": sum(times) / len(times),
+            "max_ms": max(times),
+            "hitches": sum(1 for t in times if t > FRAME_BUDGET_MS),
+        }
+
+    def report(self):
+        """One line of stats for the whole frame, then one per section"""
+        lines = []
+        for name in [None] + sorted(self.sections):
+            stats = self.stats(name)
+            lines.append(f"{name or 'frame':<9} avg {stats['avg_ms']:6.2f} ms  "
+                         f"max {stats['max_ms']:6.2f} ms  hitches {stats['hitches']}")
+        return lines
@@ -0,0 +1,348 @@
+"""
+Rendering caches for the world
+Chunks are drawn once into off-screen surfaces and reused every frame
+"""
+
+from collections import OrderedDict
+import pygame
+from constants import *
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the minimap copies chunks in with blits instead
+    np = None
+
+
+class ChunkSurfaceCache:
+    """LRU cache of pre-rendered chunk surfaces, bounded by memory use"""
+
+    def __init__(self, sprite_manager, max_bytes=CHUNK_SURFACE_CACHE_BYTES):
+        self.sprite_manager = sprite_manager
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()  # {(level, light, zoom, scale, chunk_x, chunk_y): Surface}, oldest first
+        self.size = 0  # Bytes held by the cached surfaces
+        self.renders = 0  # Chunks rendered so far (misses)
+
+    def get(self, world, level, chunk_x, chunk_y, target, light=LIGHT_LEVELS - 1, zoom=1, scale=1):
+        """Surface of a chunk at a light level, zoom and render scale, rendering it in target's pixel format if needed
+
+        Zoomed-out surfaces are mipmaps: each zoom level is the one below it
+        shrunk to half size, so drawing them costs the same blits at any zoom.
+        A render scale then shrinks the zoom's surface by nearest neighbour,
+        keeping pixel-art tiles sharp once the view is upscaled again.
+        """
+        key = (level, light, zoom, scale, chunk_x, chunk_y)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        if scale != 1:
+            source = self.get(world, level, chunk_x, chunk_y, target, light, zoom)
+            surface = pygame.transform.scale(source, (source.get_width() // scale, source.get_height() // scale))
+        elif zoom == 1:
+            surface = self._render(world, level, chunk_x, chunk_y, target, light)
+        else:
+            surface = self._shrink(self.get(world, level, chunk_x, chunk_y, target, light, zoom // 2))
+        self.surfaces[key] = surface
+        self.size += self._bytes(surface)
+        self.renders += 1
+
+        # Evict least recently used chunks, but never the one just rendered
+        while self.size > self.max_bytes and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.size -= self._bytes(old)
+        return surface
+
+    def invalidate(self, level, chunk_x, chunk_y):
+        """Drop a chunk's surfaces so it is rendered again when next drawn"""
+        for light in range(LIGHT_LEVELS):
+            for zoom in ZOOM_LEVELS:
+                for scale in RENDER_SCALES:
+                    surface = self.surfaces.pop((level, light, zoom, scale, chunk_x, chunk_y), None)
+                    if surface is not None:
+                        self.size -= self._bytes(surface)
+
+    def clear(self):
+        """Drop every cached surface"""
+        self.surfaces.clear()
+        self.size = 0
+
+    def _render(self, world, level, chunk_x, chunk_y, target, light):
+        """Draw the in-world part of a chunk into a new surface"""
+        width = min(CHUNK_SIZE, world.width - chunk_x * CHUNK_SIZE)
+        height = min(CHUNK_SIZE, world.height - chunk_y * CHUNK_SIZE)
+        surface = pygame.Surface((width * TILE_SIZE, height * TILE_SIZE), 0, target)
+
+        tiles = world.get_chunk(level, chunk_x, chunk_y).tiles
+        edges = world.tile_edges(level, chunk_x, chunk_y)
+        tile_source = self.sprite_manager.tile_source
+        sources = {}  # {tile type | edges << EDGE_SHIFT: (surface, area)}
+        batch = []
+        columns = range(0, width * TILE_SIZE, TILE_SIZE)
+        for local_y in range(height):
+            row = local_y * CHUNK_SIZE
+            screen_y = local_y * TILE_SIZE
+            for screen_x, tile, edge in zip(columns, tiles[row:row + width], edges[row:row + width]):
+                tile |= edge << EDGE_SHIFT
+                source = sources.get(tile)
+                if source is None:
+                    source = sources[tile] = tile_source(tile, light)
+                batch.append((source[0], (screen_x, screen_y), source[1]))
+
+        # One batched call instead of a blit per tile
+        surface.blits(batch, doreturn=False)
+        return surface
+
+    def _shrink(self, surface):
+        """Half-size copy of a chunk surface, averaging each 2x2 block where the format allows"""
+        size = (surface.get_width() // 2, surface.get_height() // 2)
+        if surface.get_bytesize() >= 3:
+            return pygame.transform.smoothscale(surface, size)
+        return pygame.transform.scale(surface, size)
+
+    def _bytes(self, surface):
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class ScrollingLayer:
+    """Persistent buffer of world pixels (at the layer's zoom) around the view
+
+    The buffer covers the view plus a margin on each side. Camera moves within
+    the margin only change which part of it is shown; beyond that the buffer
+    is scrolled in place and just the newly exposed strips are drawn.
+    Subclasses draw the buffer's contents in _draw.
+    """
+
+    def __init__(self, margin=WORLD_LAYER_MARGIN):
+        self.margin = margin
+        self.surface = None
+        self.key = None  # What the buffer shows; a different key starts it over
+        self.origin_x = 0  # World pixel at the buffer's top-left
+        self.origin_y = 0
+        self.dirty_rects = []  # World-pixel rects to redraw
+        self.redrawn_pixels = 0  # Buffer pixels redrawn by the last update
+
+    def update(self, world, key, camera_x, camera_y, target):
+        """Bring the buffer up to date for a view the size of target; returns the view rect"""
+        view_x, view_y = int(camera_x), int(camera_y)
+        view_width, view_height = target.get_size()
+        buffer_size = (view_width + 2 * self.margin, view_height + 2 * self.margin)
+        self.redrawn_pixels = 0
+
+        if self.surface is None or self.key != key or self.surface.get_size() != buffer_size:
+            # Start over: new contents or view size
+            self.surface = pygame.Surface(buffer_size, 0, target)
+            self.key = key
+            self.dirty_rects = []
+            self.origin_x, self.origin_y = view_x - self.margin, view_y - self.margin
+            self._redraw(world, pygame.Rect(self.origin_x, self.origin_y, *buffer_size))
+        else:
+            buffered = pygame.Rect(self.origin_x, self.origin_y, *buffer_size)
+            if not buffered.contains((view_x, view_y, view_width, view_height)):
+                self._scroll(world, view_x - self.margin, view_y - self.margin)
+
+            for rect in self.dirty_rects:
+                self._redraw(world, rect)
+            self.dirty_rects = []
+        return pygame.Rect(view_x, view_y, view_width, view_height)
+
+    def invalidate_rect(self, rect):
+        """Redraw a world-pixel rect on the next update"""
+        self.dirty_rects.append(rect)
+
+    def _scroll(self, world, origin_x, origin_y):
+        """Move the buffer's origin, keeping the pixels that stay in it"""
+        dx, dy = self.origin_x - origin_x, self.origin_y - origin_y
+        self.origin_x, self.origin_y = origin_x, origin_y
+        width, height = self.surface.get_size()
+        if abs(dx) >= width or abs(dy) >= height:
+            self._redraw(world, pygame.Rect(origin_x, origin_y, width, height))
+            return
+
+        self.surface.scroll(dx, dy)
+        # Newly exposed columns, then rows
+        if dx > 0:
+            self._redraw(world, pygame.Rect(origin_x, origin_y, dx, height))
+        elif dx < 0:
+            self._redraw(world, pygame.Rect(origin_x + width + dx, origin_y, -dx, height))
+        if dy > 0:
+            self._redraw(world, pygame.Rect(origin_x, origin_y, width, dy))
+        elif dy < 0:
+            self._redraw(world, pygame.Rect(origin_x, origin_y + height + dy, width, -dy))
+
+    def _redraw(self, world, rect):
+        """Draw a world-pixel rect of the buffer"""
+        rect = rect.clip(pygame.Rect(self.origin_x, self.origin_y, *self.surface.get_size()))
+        if not (rect.width and rect.height):
+            return
+        self.redrawn_pixels += rect.width * rect.height
+        self.surface.set_clip(rect.move(-self.origin_x, -self.origin_y))
+        self._draw(world, rect)
+        self.surface.set_clip(None)
+
+    def _draw(self, world, rect):
+        """Draw a world-pixel rect into the buffer (clipped to it)"""
+        raise NotImplementedError
+
+
+class WorldLayer(ScrollingLayer):
+    """Scrolling framebuffer of the world's tiles, drawn from pre-rendered chunks"""
+
+    def __init__(self, chunk_cache, margin=WORLD_LAYER_MARGIN):
+        super().__init__(margin)
+        self.chunk_cache = chunk_cache
+        self.level = None
+        self.light = None
+        self.zoom = 1
+        self.scale = 1
+
+    def invalidate_tile(self, level, tile_x, tile_y):
+        """Redraw a tile on the next draw (if it is on the buffered level)"""
+        if level == self.level:
+            size = TILE_SIZE // (self.zoom * self.scale)
+            self.invalidate_rect(pygame.Rect(tile_x * size, tile_y * size, size, size))
+
+    def draw(self, world, level, camera_x, camera_y, target, light=LIGHT_LEVELS - 1, zoom=1, scale=1):
+        """Bring the buffer up to date and copy the view (camera in world pixels) onto target
+
+        Each target pixel shows zoom * scale world pixels.
+        """
+        self.level, self.light, self.zoom, self.scale = level, light, zoom, scale
+        pixel = zoom * scale
+        view = self.update(world, (level, light, zoom, scale), camera_x / pixel, camera_y / pixel, target)
+
+        # Copy the in-world part of the view; the rest keeps target's background
+        size = TILE_SIZE // pixel
+        visible = view.clip((0, 0, world.width * size, world.height * size))
+        if visible.width and visible.height:
+            target.blit(self.surface, (visible.x - view.x, visible.y - view.y),
+                        visible.move(-self.origin_x, -self.origin_y))
+
+    def prefetch(self, world, level, camera_x, camera_y, view_size, light, zoom=1, scale=1):
+        """Render one chunk the buffer will need at another light level, if any is missing
+
+        Called every frame ahead of a light change, this spreads the work of
+        rendering the new tile set over many frames instead of one.
+        """
+        pixel = zoom * scale
+        span = CHUNK_SIZE * TILE_SIZE // pixel
+        left, top = int(camera_x / pixel) - self.margin, int(camera_y / pixel) - self.margin
+        right = left + view_size[0] + 2 * self.margin
+        bottom = top + view_size[1] + 2 * self.margin
+        for chunk_y in range(max(0, top // span), min(world.chunks_y, (bottom - 1) // span + 1)):
+            for chunk_x in range(max(0, left // span), min(world.chunks_x, (right - 1) // span + 1)):
+                if (level, light, zoom, scale, chunk_x, chunk_y) not in self.chunk_cache.surfaces:
+                    self.chunk_cache.get(world, level, chunk_x, chunk_y, self.surface, light, zoom, scale)
+                    return
+
+    def _draw(self, world, rect):
+        """Draw from the chunk surfaces"""
+        span = CHUNK_SIZE * TILE_SIZE // (self.zoom * self.scale)
+        keys = [(chunk_x, chunk_y)
+                for chunk_y in range(max(0, rect.top // span), min(world.chunks_y, (rect.bottom - 1) // span + 1))
+                for chunk_x in range(max(0, rect.left // span), min(world.chunks_x, (rect.right - 1) // span + 1))]
+
+        # Load them all first, so edges between them are known before any is rendered
+        for chunk_x, chunk_y in keys:
+            world.get_chunk(self.level, chunk_x, chunk_y)
+        for chunk_x, chunk_y in keys:
+            surface = self.chunk_cache.get(world, self.level, chunk_x, chunk_y, self.surface,
+                                           self.light, self.zoom, self.scale)
+            self.surface.blit(surface, (chunk_x * span - self.origin_x, chunk_y * span - self.origin_y))
+
+
+class LightLayer(ScrollingLayer):
+    """Scrolling buffer of a lightmap's brightness, multiplied into the view"""
+
+    def __init__(self, lightmap, margin=WORLD_LAYER_MARGIN):
+        super().__init__(margin)
+        self.lightmap = lightmap
+        self.palette = [(value, value, value) for value in range(256)]  # Brightness as gray
+        self.tile_size = TILE_SIZE  # Tile size in buffer pixels, at the current zoom
+
+    def draw(self, world, camera_x, camera_y, target, zoom=1):
+        """Darken target by the light of every tile it shows"""
+        self.tile_size = size = TILE_SIZE // zoom
+
+        # Changes are local (around the player or a mined tile): redraw their bounds in one go
+        changed = self.lightmap.take_changes()
+        if changed:
+            xs = [tile_x for tile_x, _ in changed]
+            ys = [tile_y for _, tile_y in changed]
+            self.invalidate_rect(pygame.Rect(min(xs) * size, min(ys) * size,
+                                             (max(xs) - min(xs) + 1) * size,
+                                             (max(ys) - min(ys) + 1) * size))
+        view = self.update(world, (self.lightmap, zoom), camera_x / zoom, camera_y / zoom, target)
+        target.blit(self.surface, (0, 0), view.move(-self.origin_x, -self.origin_y),
+                    special_flags=pygame.BLEND_RGB_MULT)
+
+    def _draw(self, world, rect):
+        """Draw the tiles at one pixel per tile, then scale them up in one go"""
+        size = self.tile_size
+        x0, x1 = rect.left // size, (rect.right - 1) // size + 1
+        y0, y1 = rect.top // size, (rect.bottom - 1) // size + 1
+        pixels = bytearray()
+        for tile_y in range(y0, y1):
+            pixels += bytes(self.lightmap.row_brightness(tile_y, x0, x1))
+        tiles = pygame.image.frombuffer(pixels, (x1 - x0, y1 - y0), "P")
+        tiles.set_palette(self.palette)
+        self.surface.blit(pygame.transform.scale(tiles, ((x1 - x0) * size, (y1 - y0) * size)),
+                          (x0 * size - self.origin_x, y0 * size - self.origin_y))
+
+
+class Minimap:
+    """One pixel per tile picture of a level, kept in step with its tiles
+
+    The picture is an 8-bit surface holding tile types, with a palette mapping
+    them to colours: filling it is a copy of the tile bytes, and the colour
+    lookup happens in SDL when it is scaled and blitted. Chunks are copied in
+    as they load and set_tile patches single pixels.
+    """
+
+    def __init__(self, world, level, size=MINIMAP_SIZE):
+        self.world = world
+        self.level = level
+        self.surface = pygame.Surface((world.width, world.height), 0, 8)
+        self.surface.set_palette([MINIMAP_COLORS.get(tile, BLACK) for tile in range(256)])
+        self.surface.fill(TILE_AIR)
+        self.loaded = set()  # Chunks copied in so far
+        self.scale = min(size / world.width, size / world.height)  # Minimap pixels per tile
+        self.scaled = None  # The picture at display size, rebuilt after changes
+
+    def set_tile(self, tile_x, tile_y, tile_type):
+        """Patch one tile (chunks not copied in yet pick the change up when they are)"""
+        if (tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE) in self.loaded:
+            self.surface.set_at((tile_x, tile_y), tile_type)
+            self.scaled = None
+
+    def image(self):
+        """The minimap at display size, bringing in newly loaded chunks first"""
+        chunks = self.world.chunks[self.level]
+        if len(chunks) != len(self.loaded):
+            for key, chunk in chunks.items():
+                if key not in self.loaded:
+                    self._copy_chunk(chunk)
+                    self.loaded.add(key)
+            self.scaled = None
+        if self.scaled is None:
+            size = (round(self.world.width * self.scale), round(self.world.height * self.scale))
+            self.scaled = pygame.transform.scale(self.surface, size)
+            if pygame.display.get_surface() is not None:
+                self.scaled = self.scaled.convert()  # No palette lookup on every blit
+        return self.scaled
+
+    def _copy_chunk(self, chunk):
+        """Copy a chunk's tile bytes into the picture"""
+        x, y = chunk.chunk_x * CHUNK_SIZE, chunk.chunk_y * CHUNK_SIZE
+        width = min(CHUNK_SIZE, self.world.width - x)
+        height = min(CHUNK_SIZE, self.world.height - y)
+        if np is not None:
+            tiles = np.frombuffer(chunk.tiles, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+            pixels = pygame.surfarray.pixels2d(self.surface)  # Indexed [x, y]
+            pixels[x:x + width, y:y + height] = tiles[:height, :width].T
+            del pixels  # Unlock the surface
+        else:
+            tiles = pygame.image.frombuffer(bytes(chunk.tiles), (CHUNK_SIZE, CHUNK_SIZE), "P")
+            tiles.set_palette(self.surface.get_palette())
+            self.surface.blit(tiles, (x, y), (0, 0, width, height))
@@ -0,0 +1,491 @@
+"""
+Binary save format for worlds, the player and live enemies
+
+A save file is a fixed header, a sequence of records (tile chunks and one
+game state record), an index of the latest record for every chunk and a
+footer pointing at that index. Tile chunks are stored as raw CHUNK_SIZE^2
+byte planes, or zlib-compressed per chunk. Loading memory-maps the file and
+only reads a chunk when the world first touches it.
+"""
+
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from constants import *
+from player import Player
+from enemy import Enemy, EnemyManager
+from world import World
+
+SAVE_MAGIC = b"VCWS"
+SAVE_END_MAGIC = b"VCWE"
+SAVE_VERSION = 2
+
+# Record kinds and chunk codecs
+RECORD_CHUNK = 1
+RECORD_STATE = 2
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+
+LEVEL_IDS = {LEVEL_JUNGLE: 0, LEVEL_CAVE: 1}
+LEVELS_BY_ID = {level_id: level for level, level_id in LEVEL_IDS.items()}
+DIRECTIONS = ["down", "up", "left", "right"]
+
+# magic, version, flags, seed, width, height, chunk size, jungle portal, cave portal, spawn
+HEADER = struct.Struct("<4sHHqIIH6i")
+# kind, level, chunk_x, chunk_y, codec, payload length (followed by the payload)
+RECORD = struct.Struct("<BBiiBI")
+# kind, level, chunk_x, chunk_y, codec, payload offset, payload length
+INDEX_ENTRY = struct.Struct("<BBiiBQI")
+# index offset, index entry count, end magic
+FOOTER = struct.Struct("<QI4s")
+# game time, x, y, level, direction, health, max health, hunger, max hunger, tool, selected slot
+PLAYER_STATE = struct.Struct("<QddBBddddBB")
+# level, x, y, health
+ENEMY_STATE = struct.Struct("<Bddd")
+
+
+class SaveFormatError(ValueError):
+    """Raised when a file is not a save file this version can read"""
+
+
+def _pack_str(text):
+    data = text.encode("utf-8")
+    return struct.pack("<B", len(data)) + data
+
+
+def _unpack_str(data, offset):
+    length = data[offset]
+    return data[offset + 1:offset + 1 + length].decode("utf-8"), offset + 1 + length
+
+
+def pack_inventory(inventory):
+    """Slot count, then every slot's item type ("" = empty) and quantity"""
+    parts = [struct.pack("<H", len(inventory.items))]
+    for item_type, quantity in inventory.slots():
+        parts.append(_pack_str(item_type or "") + struct.pack("<I", quantity))
+    return b"".join(parts)
+
+
+def encode_state(player, enemy_manager, game_time, inventory_data=None):
+    """Pack the player, their inventory (inventory_data if already packed) and the live enemies into a state record"""
+    parts = [PLAYER_STATE.pack(
+        game_time, player.x, player.y, LEVEL_IDS[player.current_level],
+        DIRECTIONS.index(player.direction), player.health, player.max_health,
+        player.hunger, player.max_hunger, player.current_tool, player.selected_slot)]
+
+    parts.append(inventory_data if inventory_data is not None else pack_inventory(player.inventory))
+
+    enemies = enemy_manager.enemies if enemy_manager else []
+    parts.append(struct.pack("<H", len(enemies)))
+    for enemy in enemies:
+        parts.append(_pack_str(enemy.enemy_type) +
+                     ENEMY_STATE.pack(LEVEL_IDS[enemy.level], enemy.x, enemy.y, enemy.health))
+    return b"".join(parts)
+
+
+def decode_state(data, sprite_manager):
+    """Rebuild (player, enemy_manager, game_time) from a state record"""
+    (game_time, x, y, level_id, direction, health, max_health,
+     hunger, max_hunger, tool, selected_slot) = PLAYER_STATE.unpack_from(data, 0)
+    offset = PLAYER_STATE.size
+
+    player = Player(x, y, sprite_manager)
+    player.current_level = LEVELS_BY_ID[level_id]
+    player.direction = DIRECTIONS[direction]
+    player.health = health
+    player.max_health = max_health
+    player.hunger = hunger
+    player.max_hunger = max_hunger
+    player.current_tool = tool
+    player.selected_slot = selected_slot
+
+    (slot_count,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    inventory = player.inventory
+    for slot in range(slot_count):
+        item_type, offset = _unpack_str(data, offset)
+        (quantity,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        if not item_type:
+            continue
+        if slot < len(inventory.items):
+            quantity = inventory.set_slot(slot, item_type, quantity)
+        if quantity:
+            inventory.add(item_type, quantity)  # Over a stack or slot limit that shrank since the save
+
+    enemy_manager = EnemyManager(sprite_manager)
+    (enemy_count,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    for _ in range(enemy_count):
+        enemy_type, offset = _unpack_str(data, offset)
+        level_id, enemy_x, enemy_y, enemy_health = ENEMY_STATE.unpack_from(data, offset)
+        offset += ENEMY_STATE.size
+        enemy = Enemy(enemy_x, enemy_y, enemy_type, sprite_manager, LEVELS_BY_ID[level_id])
+        enemy.health = enemy_health
+        enemy_manager.enemies.append(enemy)
+
+    return player, enemy_manager, game_time
+
+
+def encode_chunk(tiles, compress):
+    """Pick the codec for one chunk: zlib only when asked for and actually smaller"""
+    if compress:
+        packed = zlib.compress(bytes(tiles), 6)
+        if len(packed) < len(tiles):
+            return CODEC_ZLIB, packed
+    return CODEC_RAW, bytes(tiles)
+
+
+class SaveFile:
+    """A save file opened for reading, with its records memory-mapped"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SaveFormatError(f"{path} is empty")
+
+        data = self._mmap
+        if len(data) < HEADER.size + FOOTER.size:
+            self.close()
+            raise SaveFormatError(f"{path} is truncated")
+
+        (magic, version, _flags, self.seed, self.width, self.height, chunk_size,
+         jungle_x, jungle_y, cave_x, cave_y, spawn_x, spawn_y) = HEADER.unpack_from(data, 0)
+        if magic != SAVE_MAGIC:
+            self.close()
+            raise SaveFormatError(f"{path} is not a save file")
+        if version != SAVE_VERSION or chunk_size != CHUNK_SIZE:
+            self.close()
+            raise SaveFormatError(f"{path} uses unsupported save version {version}")
+        try:
+            entries, _end = _find_index(data, path)
+        except SaveFormatError:
+            self.close()
+            raise
+
+        self.jungle_portal = (jungle_x, jungle_y)
+        self.cave_portal = (cave_x, cave_y)
+        self.spawn = (spawn_x, spawn_y)
+
+        # Later entries win, so appended records replace older copies
+        self.chunk_index = {}  # {(level, chunk_x, chunk_y): (codec, offset, length)}
+        self.state_entry = None
+        for kind, level_id, chunk_x, chunk_y, codec, offset, length in entries:
+            if kind == RECORD_CHUNK:
+                self.chunk_index[(LEVELS_BY_ID[level_id], chunk_x, chunk_y)] = (codec, offset, length)
+            elif kind == RECORD_STATE:
+                self.state_entry = (offset, length)
+
+    def read(self, level, chunk_x, chunk_y):
+        """Tiles of a saved chunk as a fresh bytearray, or None if it isn't saved"""
+        entry = self.chunk_index.get((level, chunk_x, chunk_y))
+        if entry is None:
+            return None
+        codec, payload = self.read_raw(level, chunk_x, chunk_y)
+        try:
+            tiles = bytearray(zlib.decompress(payload) if codec == CODEC_ZLIB else payload)
+        except zlib.error as e:
+            raise SaveFormatError(f"{self.path} has a corrupt chunk {(level, chunk_x, chunk_y)}: {e}")
+        if codec not in (CODEC_RAW, CODEC_ZLIB) or len(tiles) != CHUNK_SIZE * CHUNK_SIZE:
+            raise SaveFormatError(f"{self.path} has a corrupt chunk {(level, chunk_x, chunk_y)}")
+        return tiles
+
+    def read_raw(self, level, chunk_x, chunk_y):
+        """(codec, payload bytes) of a saved chunk, without decoding it"""
+        codec, offset, length = self.chunk_index[(level, chunk_x, chunk_y)]
+        return codec, self._mmap[offset:offset + length]
+
+    def read_state(self, sprite_manager):
+        """Rebuild (player, enemy_manager, game_time), or None if there is no state"""
+        if self.state_entry is None:
+            return None
+        offset, length = self.state_entry
+        try:
+            return decode_state(self._mmap[offset:offset + length], sprite_manager)
+        except (struct.error, UnicodeDecodeError, IndexError, KeyError, ValueError) as e:
+            raise SaveFormatError(f"{self.path} has a corrupt game state: {e}")
+
+    def close(self):
+        """Unmap and close the file"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+class WorldSnapshot:
+    """Immutable copy of everything a save needs, safe to hand to another thread"""
+
+    def __init__(self, header, chunks, state=None):
+        self.header = header  # (seed, width, height, jungle portal, cave portal, spawn)
+        self.chunks = chunks  # [(level, chunk_x, chunk_y, tiles bytes)]
+        self.state = state  # Encoded player/enemy record, or None
+
+
+def world_header(world):
+    """The header fields of a save file for world"""
+    return (world.seed, world.width, world.height, world.jungle_portal,
+            world.cave_portal, (world.spawn_x, world.spawn_y))
+
+
+def snapshot_game(world, player, enemy_manager, game_time, chunk_keys=None, inventory_data=None):
+    """Copy the given chunks (all loaded ones by default) and the game state"""
+    if chunk_keys is None:
+        chunk_keys = [(level, chunk_x, chunk_y)
+                      for level, chunks in world.chunks.items()
+                      for chunk_x, chunk_y in chunks]
+    chunks = [(level, chunk_x, chunk_y, bytes(world.chunks[level][(chunk_x, chunk_y)].tiles))
+              for level, chunk_x, chunk_y in chunk_keys]
+    return WorldSnapshot(world_header(world), chunks,
+                         encode_state(player, enemy_manager, game_time, inventory_data))
+
+
+def _write_record(out, kind, level, chunk_x, chunk_y, codec, payload, index):
+    out.write(RECORD.pack(kind, LEVEL_IDS.get(level, 0), chunk_x, chunk_y, codec, len(payload)))
+    index.append((kind, LEVEL_IDS.get(level, 0), chunk_x, chunk_y, codec, out.tell(), len(payload)))
+    out.write(payload)
+
+
+def _write_index(out, index, durable=False):
+    """Write the index and footer; durable puts everything before the footer on disk first"""
+    index_offset = out.tell()
+    for entry in index:
+        out.write(INDEX_ENTRY.pack(*entry))
+    if durable:
+        out.flush()
+        os.fsync(out.fileno())
+    out.write(FOOTER.pack(index_offset, len(index), SAVE_END_MAGIC))
+
+
+def _find_index(data, path):
+    """(index entries, end of footer) of the last intact footer in a save file's bytes
+
+    A crash while appending can leave a torn tail after the last good
+    footer, so footers are tried from the end back until one has a whole
+    index, sitting right before it, whose records all lie inside the file.
+    """
+    end = len(data)
+    while True:
+        magic_at = data.rfind(SAVE_END_MAGIC, HEADER.size, end)
+        if magic_at < 0:
+            raise SaveFormatError(f"{path} has no intact index")
+        end = magic_at + len(SAVE_END_MAGIC) - 1  # Look before this one next time
+        footer_at = magic_at + len(SAVE_END_MAGIC) - FOOTER.size
+        if footer_at < HEADER.size:
+            continue
+        index_offset, entry_count, _magic = FOOTER.unpack_from(data, footer_at)
+        if index_offset < HEADER.size or index_offset + entry_count * INDEX_ENTRY.size != footer_at:
+            continue
+        entries = [INDEX_ENTRY.unpack_from(data, index_offset + i * INDEX_ENTRY.size)
+                   for i in range(entry_count)]
+        if all(kind in (RECORD_CHUNK, RECORD_STATE) and level_id in LEVELS_BY_ID and
+               HEADER.size <= offset and offset + length <= index_offset
+               for kind, level_id, _x, _y, _codec, offset, length in entries):
+            return entries, footer_at + FOOTER.size
+
+
+def write_snapshot(path, snapshot, compress=False, source=None):
+    """Write a snapshot as a complete save file at path
+
+    Chunks that are only present in source (a SaveFile) are copied over as-is.
+    """
+    seed, width, height, jungle_portal, cave_portal, spawn = snapshot.header
+    index = []
+    with open(path, "wb") as out:
+        out.write(HEADER.pack(SAVE_MAGIC, SAVE_VERSION, 0, seed, width, height,
+                              CHUNK_SIZE, *jungle_portal, *cave_portal, *spawn))
+
+        written = set()
+        for level, chunk_x, chunk_y, tiles in snapshot.chunks:
+            codec, payload = encode_chunk(tiles, compress)
+            _write_record(out, RECORD_CHUNK, level, chunk_x, chunk_y, codec, payload, index)
+            written.add((level, chunk_x, chunk_y))
+
+        if source is not None:
+            for key in source.chunk_index:
+                if key not in written:
+                    codec, payload = source.read_raw(*key)
+                    _write_record(out, RECORD_CHUNK, *key, codec, payload, index)
+
+        if snapshot.state is not None:
+            _write_record(out, RECORD_STATE, None, 0, 0, CODEC_RAW, snapshot.state, index)
+        _write_index(out, index)
+
+
+def append_snapshot(path, snapshot, compress=False):
+    """Append a snapshot's chunks and state to an existing save file
+
+    The new records, a merged index and a new footer go after the old footer,
+    so readers that already mapped the file keep seeing a consistent version.
+    The footer is only written once the rest is on disk; if the append is cut
+    short, loading falls back to the previous footer.
+    """
+    with open(path, "r+b") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                old_entries, end = _find_index(data, path)
+        except ValueError:
+            raise SaveFormatError(f"{path} is empty")
+        entries = {}
+        for entry in old_entries:
+            entries[entry[:4]] = entry
+
+        # Drop anything a crashed append left after the last good footer
+        f.truncate(end)
+        f.seek(end)
+        index = []
+        for level, chunk_x, chunk_y, tiles in snapshot.chunks:
+            codec, payload = encode_chunk(tiles, compress)
+            _write_record(f, RECORD_CHUNK, level, chunk_x, chunk_y, codec, payload, index)
+        if snapshot.state is not None:
+            _write_record(f, RECORD_STATE, None, 0, 0, CODEC_RAW, snapshot.state, index)
+
+        for entry in index:
+            entries[entry[:4]] = entry
+        _write_index(f, list(entries.values()), durable=True)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def save_game(path, world, player, enemy_manager, game_time, compress=False):
+    """Write a complete save file (atomically replacing any existing one)
+
+    Every chunk the world has loaded is written, plus any chunk still only
+    present in the file the world was loaded from.
+    """
+    source = world.chunk_source if isinstance(world.chunk_source, SaveFile) else None
+    temp_path = path + ".tmp"
+    write_snapshot(temp_path, snapshot_game(world, player, enemy_manager, game_time),
+                   compress, source)
+    world.dirty_chunks.clear()
+
+    # The old file may still be mapped by the world; swap the mapping over too
+    reopen = source is not None and os.path.abspath(source.path) == os.path.abspath(path)
+    if reopen:
+        source.close()
+    os.replace(temp_path, path)
+    if reopen:
+        world.chunk_source = SaveFile(path)
+
+
+class Autosaver:
+    """Periodically saves the game on a background thread
+
+    The main thread only copies the chunks that set_tile marked dirty, plus a
+    small player/enemy record, into a WorldSnapshot; encoding and disk writes
+    happen on the worker. The first autosave of a world writes a full file and
+    later ones append to it.
+    """
+
+    def __init__(self, path, interval=AUTOSAVE_INTERVAL, compress=False):
+        self.path = path
+        self.interval = interval  # In frames
+        self.compress = compress
+        self.frames_since_save = 0
+        self.last_snapshot_ms = 0.0
+        self.last_write_ms = 0.0
+        self.saves = 0
+        self.error = None
+
+        self._base_world = None  # World whose full save already exists at path
+        self._packed_inventory = (None, None, b"")  # (inventory, version, bytes), repacked when the version moves
+        self._jobs = queue.Queue(maxsize=1)
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+
+    def attach(self, world):
+        """Mark world as already fully saved at path, so autosaves append to it"""
+        self.wait()
+        self._base_world = world
+        self.frames_since_save = 0
+
+    def update(self, world, player, enemy_manager, game_time):
+        """Call once per frame; takes a snapshot whenever the interval elapses"""
+        self.frames_since_save += 1
+        if self.frames_since_save < self.interval or not self._idle.is_set():
+            return False
+        self.frames_since_save = 0
+        self.save_now(world, player, enemy_manager, game_time)
+        return True
+
+    def save_now(self, world, player, enemy_manager, game_time):
+        """Snapshot the game on this thread and queue it for the worker"""
+        start = time.perf_counter()
+        inventory = player.inventory
+        packed_for, version, inventory_data = self._packed_inventory
+        if packed_for is not inventory or version != inventory.version:
+            inventory_data = pack_inventory(inventory)
+            self._packed_inventory = (inventory, inventory.version, inventory_data)
+
+        full = self._base_world is not world
+        # A full save also copies the chunks only present in the file the world was loaded from
+        source = world.chunk_source if full and isinstance(world.chunk_source, SaveFile) else None
+        chunk_keys = None if full else sorted(world.dirty_chunks)
+        snapshot = snapshot_game(world, player, enemy_manager, game_time, chunk_keys, inventory_data)
+        world.dirty_chunks.clear()
+        self._base_world = world
+        self.last_snapshot_ms = (time.perf_counter() - start) * 1000
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+            self._thread.start()
+        self._idle.clear()
+        self._jobs.put((snapshot, full, source))
+
+    def wait(self, timeout=None):
+        """Block until any queued autosave has been written"""
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            snapshot, full, source = self._jobs.get()
+            start = time.perf_counter()
+            try:
+                if full or not os.path.exists(self.path):
+                    temp_path = self.path + ".tmp"
+                    write_snapshot(temp_path, snapshot, self.compress, source)
+                    os.replace(temp_path, self.path)
+                else:
+                    append_snapshot(self.path, snapshot, self.compress)
+                self.saves += 1
+                self.error = None
+            except (OSError, SaveFormatError) as e:
+                # Force a full save next time rather than appending to a bad file
+                self.error = e
+                self._base_world = None
+            self.last_write_ms = (time.perf_counter() - start) * 1000
+            self._idle.set()
+
+
+def load_game(path, sprite_manager, cache=None):
+    """Open a save file, returning (world, player, enemy_manager, game_time)
+
+    The world keeps the file mapped and pages chunks in as they are touched;
+    chunks that were never saved come from the world cache or the generator.
+    """
+    save = SaveFile(path)
+    if (save.width, save.height) != (WORLD_WIDTH, WORLD_HEIGHT):
+        save.close()
+        raise SaveFormatError(f"{path} was saved for a {save.width}x{save.height} world")
+
+    world = World(sprite_manager, seed=save.seed, chunk_source=save, cache=cache)
+    world.spawn_x, world.spawn_y = save.spawn
+    try:
+        state = save.read_state(sprite_manager)
+    except SaveFormatError:
+        world.close()
+        raise
+    if state is None:
+        player = Player(world.spawn_x, world.spawn_y, sprite_manager)
+        return world, player, EnemyManager(sprite_manager), 0
+    player, enemy_manager, game_time = state
+    return world, player, enemy_manager, game_time
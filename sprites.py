@@ -6,6 +6,8 @@ Top-down view
 import pygame
 from constants import *
 
+ATLAS_COLUMNS = 16  # Sprites per atlas page row
+
 class SpriteManager:
     """Manages all game sprites and textures"""
 
@@ -14,11 +16,24 @@ class SpriteManager:
         self.player_sprites = {}
         self.enemy_sprites = {}
         self.item_sprites = {}
+        self.tile_sets = []  # Tinted tiles per light level: tile_sets[light][tile_type]
         self._generate_all_sprites()
 
+        # Atlas pages and each sprite's (page, rect) in them, set up by build_atlas
+        self.atlas_pages = []
+        self.atlas_rects = {}
+
+        # Shrunk copies of entity sprites for zoomed-out views: {(sprite, zoom): Surface}
+        self.zoomed_sprites = {}
+
+        # Item icons scaled for the UI, one atlas page per size: {size: (page, {item_type: rect})}
+        self.icon_atlases = {}
+
     def _generate_all_sprites(self):
         """Generate all game sprites"""
         self._generate_tile_sprites()
+        self._generate_tile_variants()
+        self._generate_tinted_tiles()
         self._generate_player_sprites()
         self._generate_enemy_sprites()
         self._generate_item_sprites()
@@ -151,6 +166,52 @@ class SpriteManager:
         air.set_colorkey((0, 0, 0))
         self.tiles[TILE_AIR] = air
 
+    def _generate_tile_variants(self):
+        """Generate the edge variants of autotiled tiles (keyed tile_type | edges << EDGE_SHIFT)"""
+        # Rock gets a lit rim and water a foam line along open sides; tree canopies are outlined and rounded
+        edge_styles = {
+            TILE_CAVE_WALL: ((90, 90, 90), 2, None),
+            TILE_STONE: ((150, 150, 150), 2, None),
+            TILE_WATER: ((170, 215, 255), 2, None),
+            TILE_TREE: (JUNGLE_GREEN, 1, GRASS_GREEN),
+        }
+        for tile_type, (color, width, corner) in edge_styles.items():
+            sides = {
+                EDGE_NORTH: (0, 0, TILE_SIZE, width),
+                EDGE_EAST: (TILE_SIZE - width, 0, width, TILE_SIZE),
+                EDGE_SOUTH: (0, TILE_SIZE - width, TILE_SIZE, width),
+                EDGE_WEST: (0, 0, width, TILE_SIZE),
+            }
+            for edges in range(1, 16):
+                sprite = self.tiles[tile_type].copy()
+                for side, rect in sides.items():
+                    if edges & side:
+                        sprite.fill(color, rect)
+
+                # Cut the outer corners where two open sides meet
+                if corner is not None:
+                    for vertical, horizontal, x, y in ((EDGE_NORTH, EDGE_WEST, 0, 0),
+                                                       (EDGE_NORTH, EDGE_EAST, TILE_SIZE - 3, 0),
+                                                       (EDGE_SOUTH, EDGE_WEST, 0, TILE_SIZE - 3),
+                                                       (EDGE_SOUTH, EDGE_EAST, TILE_SIZE - 3, TILE_SIZE - 3)):
+                        if edges & vertical and edges & horizontal:
+                            sprite.fill(corner, (x, y, 3, 3))
+                self.tiles[tile_type | edges << EDGE_SHIFT] = sprite
+
+    def _generate_tinted_tiles(self):
+        """Precompute the tile sprites at every day/night light level"""
+        self.tile_sets = []
+        for light, tint in enumerate(LIGHT_TINTS):
+            if light == LIGHT_LEVELS - 1:
+                self.tile_sets.append(self.tiles)  # Full daylight is untinted
+                continue
+            tiles = {}
+            for tile_type, sprite in self.tiles.items():
+                tinted = sprite.copy()
+                tinted.fill(tint, special_flags=pygame.BLEND_RGB_MULT)
+                tiles[tile_type] = tinted
+            self.tile_sets.append(tiles)
+
     def _generate_player_sprites(self):
         """Generate player sprites for top-down view (4 directions)"""
         # For each direction, create idle and walking sprites
@@ -296,9 +357,85 @@ class SpriteManager:
         dirt.fill(DIRT_BROWN)
         self.item_sprites[ITEM_DIRT] = dirt
 
-    def get_tile(self, tile_type):
-        """Get tile sprite by type"""
-        return self.tiles.get(tile_type, self.tiles[TILE_AIR])
+    def build_atlas(self, rle=False):
+        """Convert every sprite to the display format and pack them into atlas pages
+
+        Needs the display to exist. A surface has a single colourkey, so opaque
+        sprites share one page and colourkeyed sprites one page per key. The
+        individual sprites are converted as well. RLE acceleration of colourkeyed
+        surfaces is optional: for 16x16 sprites it measured slower (see
+        benchmark_sprites.py).
+        """
+        groups = {}  # {colourkey or None: [(key, sprite)]}
+        tinted = [(("tiles", light), tiles) for light, tiles in enumerate(self.tile_sets[:-1])]
+        for group_name, sprites in [("tiles", self.tiles), ("player", self.player_sprites),
+                                    ("enemies", self.enemy_sprites), ("items", self.item_sprites)] + tinted:
+            for name, sprite in sprites.items():
+                if isinstance(sprite, list):
+                    sprites[name] = frames = [self._convert(frame, rle) for frame in sprite]
+                    for i, frame in enumerate(frames):
+                        groups.setdefault(frame.get_colorkey(), []).append(((group_name, name, i), frame))
+                else:
+                    sprites[name] = sprite = self._convert(sprite, rle)
+                    groups.setdefault(sprite.get_colorkey(), []).append(((group_name, name), sprite))
+
+        self.atlas_pages = []
+        self.atlas_rects = {}
+        for colorkey, members in groups.items():
+            cell_width = max(sprite.get_width() for _, sprite in members)
+            cell_height = max(sprite.get_height() for _, sprite in members)
+            rows = (len(members) + ATLAS_COLUMNS - 1) // ATLAS_COLUMNS
+            page = pygame.Surface((ATLAS_COLUMNS * cell_width, rows * cell_height)).convert()
+            if colorkey is not None:
+                page.fill(colorkey)
+
+            for n, (key, sprite) in enumerate(members):
+                rect = pygame.Rect((n % ATLAS_COLUMNS) * cell_width, (n // ATLAS_COLUMNS) * cell_height,
+                                   sprite.get_width(), sprite.get_height())
+                page.blit(sprite, rect)
+                self.atlas_rects[key] = (page, rect)
+
+            if colorkey is not None:
+                page.set_colorkey(colorkey, pygame.RLEACCEL if rle else 0)
+            self.atlas_pages.append(page)
+
+    def _convert(self, sprite, rle):
+        """Display-format copy of a sprite, keeping its colourkey"""
+        colorkey = sprite.get_colorkey()
+        converted = sprite.convert()
+        if colorkey is not None:
+            converted.set_colorkey(colorkey, pygame.RLEACCEL if rle else 0)
+        return converted
+
+    def tile_source(self, tile_type, light=LIGHT_LEVELS - 1):
+        """(surface, area) to blit a tile (or edge variant) from: its atlas page, or its own sprite without an atlas"""
+        group = "tiles" if light == LIGHT_LEVELS - 1 else ("tiles", light)
+        entry = self.atlas_rects.get((group, tile_type)) or self.atlas_rects.get((group, TILE_AIR))
+        if entry is None:
+            return self.get_tile(tile_type, light), None
+        return entry
+
+    def enemy_source(self, enemy_type):
+        """(surface, area) to blit an enemy from: its atlas page, or its own sprite without an atlas"""
+        entry = self.atlas_rects.get(("enemies", enemy_type)) or self.atlas_rects.get(("enemies", "tiger"))
+        if entry is None:
+            return self.get_enemy_sprite(enemy_type), None
+        return entry
+
+    def zoomed(self, sprite, zoom):
+        """A sprite shrunk to 1/zoom size, made once per sprite and zoom"""
+        if zoom == 1:
+            return sprite
+        zoomed = self.zoomed_sprites.get((sprite, zoom))
+        if zoomed is None:
+            size = (max(1, sprite.get_width() // zoom), max(1, sprite.get_height() // zoom))
+            zoomed = self.zoomed_sprites[(sprite, zoom)] = pygame.transform.scale(sprite, size)
+        return zoomed
+
+    def get_tile(self, tile_type, light=LIGHT_LEVELS - 1):
+        """Get tile sprite by type, tinted for a light level"""
+        tiles = self.tile_sets[light]
+        return tiles.get(tile_type, tiles[TILE_AIR])
 
     def get_player_sprite(self, direction, is_moving, frame=0):
         """Get player sprite by direction and movement state"""
@@ -312,6 +449,28 @@ class SpriteManager:
         """Get enemy sprite by type"""
         return self.enemy_sprites.get(enemy_type, self.enemy_sprites.get("tiger"))
 
+    def icon_source(self, item_type, size):
+        """(surface, area) to blit an item icon scaled to size x size from
+
+        Every item is scaled into that size's atlas page the first time the
+        size is asked for. Black is the page's colourkey, as for the item sprites.
+        """
+        atlas = self.icon_atlases.get(size)
+        if atlas is None:
+            rows = (len(self.item_sprites) + ATLAS_COLUMNS - 1) // ATLAS_COLUMNS
+            page = pygame.Surface((ATLAS_COLUMNS * size, rows * size))
+            if pygame.display.get_surface() is not None:
+                page = page.convert()
+            page.fill(BLACK)
+            rects = {}
+            for n, (name, sprite) in enumerate(self.item_sprites.items()):
+                rects[name] = pygame.Rect((n % ATLAS_COLUMNS) * size, (n // ATLAS_COLUMNS) * size, size, size)
+                page.blit(pygame.transform.scale(sprite, (size, size)), rects[name])
+            page.set_colorkey(BLACK)
+            atlas = self.icon_atlases[size] = (page, rects)
+        page, rects = atlas
+        return page, rects.get(item_type, rects[ITEM_STONE])
+
     def get_item_sprite(self, item_type):
         """Get item sprite by type"""
         return self.item_sprites.get(item_type, self.item_sprites[ITEM_STONE])
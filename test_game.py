@@ -2,16 +2,25 @@
 Test script to verify game initialization without display
 """
 
+import math
 import os
+import random
+import tempfile
 os.environ['SDL_VIDEODRIVER'] = 'dummy'  # Use dummy video driver for headless testing
 
 import pygame
+import worldgen
+import savegame
+from worldcache import WorldCache
 from constants import *
 from sprites import SpriteManager
 from player import Player
 from world import World
+from lighting import Lightmap
 from enemy import EnemyManager
 from ui import UI
+from crafting import CraftingBook
+from inventory import Inventory
 
 def test_initialization():
     """Test that all game components initialize correctly"""
@@ -56,14 +65,14 @@ def test_initialization():
     # Test inventory
     player.add_to_inventory("wood", 5)
     player.add_to_inventory("stone", 3)
-    print(f"✓ Inventory works: {player.inventory}")
+    print(f"✓ Inventory works: {player.inventory.counts}")
 
     # Test mining
     # Find a solid block near player
     tile_x = int(player.x // TILE_SIZE)
     tile_y = int((player.y + player.height) // TILE_SIZE) + 1  # Block below player
 
-    original_tile = world.get_tile(tile_x, tile_y)
+    original_tile = world.get_tile(tile_x, tile_y, player.current_level)
     print(f"✓ Found tile type {original_tile} at ({tile_x}, {tile_y})")
 
     # Mine it multiple times
@@ -71,25 +80,25 @@ def test_initialization():
         if player.mine_tile(tile_x, tile_y, world):
             break
 
-    new_tile = world.get_tile(tile_x, tile_y)
+    new_tile = world.get_tile(tile_x, tile_y, player.current_level)
     print(f"✓ Mining works (tile changed from {original_tile} to {new_tile})")
 
     # Test crafting
     player.add_to_inventory("wood", 10)
-    old_wood = player.inventory.get("wood", 0)
+    old_wood = player.inventory.count("wood")
     ui.craft_item("wooden_pickaxe", player)
-    new_wood = player.inventory.get("wood", 0)
-    has_pickaxe = player.inventory.get("wooden_pickaxe", 0)
+    new_wood = player.inventory.count("wood")
+    has_pickaxe = player.inventory.count("wooden_pickaxe")
     print(f"✓ Crafting works (wood: {old_wood} -> {new_wood}, pickaxe: {has_pickaxe})")
 
     # Test enemy spawning
     from enemy import Enemy
-    enemy = Enemy(100, 100, "zombie", sprite_manager)
+    enemy = Enemy(100, 100, "zombie", sprite_manager, LEVEL_JUNGLE)
     print(f"✓ Enemy created: {enemy.enemy_type} with {enemy.health} HP")
 
     # Test day/night cycle
-    sky_day = world.get_sky_color(0)
-    sky_night = world.get_sky_color(DAY_LENGTH + 100)
+    sky_day = world.get_background_color(LEVEL_JUNGLE, 0)
+    sky_night = world.get_background_color(LEVEL_JUNGLE, DAY_LENGTH + 100)
     is_night = world.is_night(DAY_LENGTH + 100)
     print(f"✓ Day/night cycle works (day: {sky_day}, night: {sky_night}, is_night: {is_night})")
 
@@ -99,5 +108,1008 @@ def test_initialization():
     print("\nThe game is ready to run!")
     print("Run with: python game.py")
 
-if __name__ == "__main__":
-    test_initialization()
+def test_tile_buffers():
+    """Test that chunk tile buffers are kept in sync with get/set_tile"""
+    pygame.init()
+    world = World(SpriteManager(), seed=12345)
+
+    chunk = world.get_chunk(LEVEL_CAVE, 0, 0)
+    assert isinstance(chunk.tiles, bytearray)
+    assert len(chunk.tiles) == CHUNK_SIZE * CHUNK_SIZE
+
+    world.set_tile(3, 7, TILE_IRON_ORE, LEVEL_CAVE)
+    assert chunk.tiles[7 * CHUNK_SIZE + 3] == TILE_IRON_ORE
+    assert world.get_tile(3, 7, LEVEL_CAVE) == TILE_IRON_ORE
+
+    # The solidity mask follows set_tile
+    assert chunk.solid == chunk.tiles.translate(SOLID_TABLE)
+    assert world.is_solid(3, 7, LEVEL_CAVE)
+    world.set_tile(3, 7, TILE_CAVE_FLOOR, LEVEL_CAVE)
+    assert not world.is_solid(3, 7, LEVEL_CAVE)
+    assert world.is_solid(-1, 0, LEVEL_CAVE)
+
+    # Out of bounds reads return the level's impassable border tile
+    assert world.get_tile(-1, 0, LEVEL_CAVE) == TILE_CAVE_WALL
+    assert world.get_tile(0, world.height, LEVEL_JUNGLE) == TILE_WATER
+    print("✓ Tile buffers and solidity mask work")
+
+def test_lazy_chunks_are_deterministic():
+    """Test that chunks are generated on demand and don't depend on access order"""
+    first = World(None, seed=777)
+    second = World(None, seed=777)
+    assert first.loaded_chunk_count() < first.chunks_x * first.chunks_y
+
+    coords = [(cx, cy) for cy in range(first.chunks_y) for cx in range(first.chunks_x)]
+    for level in (LEVEL_JUNGLE, LEVEL_CAVE):
+        for cx, cy in coords:
+            first.get_chunk(level, cx, cy)
+        for cx, cy in reversed(coords):
+            second.get_chunk(level, cx, cy)
+        for cx, cy in coords:
+            assert first.get_chunk(level, cx, cy).tiles == second.get_chunk(level, cx, cy).tiles
+
+    portal_x, portal_y = first.cave_portal
+    assert first.get_tile(portal_x, portal_y, LEVEL_CAVE) == TILE_CAVE_EXIT
+    portal_x, portal_y = first.jungle_portal
+    assert first.get_tile(portal_x, portal_y, LEVEL_JUNGLE) == TILE_CAVE_ENTRANCE
+    print("✓ Lazy chunk generation is deterministic")
+
+def test_cave_walls_numpy_matches_python():
+    """Test that the NumPy cave smoothing produces the same walls as the Python loops"""
+    if worldgen.np is None:
+        print("- NumPy not installed, skipping")
+        return
+
+    numpy_tiles = worldgen.generate_cave_chunk(4242, 2, 1, WORLD_WIDTH, WORLD_HEIGHT)
+    worldgen.np, np = None, worldgen.np
+    try:
+        python_tiles = worldgen.generate_cave_chunk(4242, 2, 1, WORLD_WIDTH, WORLD_HEIGHT)
+    finally:
+        worldgen.np = np
+
+    assert numpy_tiles == python_tiles
+    print("✓ NumPy cave generation matches the Python path")
+
+def test_parallel_generation_matches_serial():
+    """Test that pregenerating over a process pool gives the same world as one worker"""
+    serial = World(None, seed=2024)
+    serial.pregenerate(workers=1)
+    parallel = World(None, seed=2024)
+    parallel.pregenerate(workers=2)
+
+    for level in (LEVEL_JUNGLE, LEVEL_CAVE):
+        assert serial.loaded_chunk_count(level) == serial.chunks_x * serial.chunks_y
+        for coords, chunk in serial.chunks[level].items():
+            assert parallel.chunks[level][coords].tiles == chunk.tiles
+    assert (serial.spawn_x, serial.spawn_y) == (parallel.spawn_x, parallel.spawn_y)
+    print("✓ Parallel generation matches serial generation")
+
+def test_save_and_load_round_trip():
+    """Test that a saved game restores mined tiles, the player and enemies"""
+    pygame.init()
+    sprite_manager = SpriteManager()
+    from enemy import Enemy
+
+    for compress in (False, True):
+        world = World(sprite_manager, seed=31337)
+        player = Player(world.spawn_x, world.spawn_y, sprite_manager)
+        player.add_to_inventory("wood", 7)
+        player.current_tool = TOOL_STONE_PICKAXE
+        player.health = 42
+        enemy_manager = EnemyManager(sprite_manager)
+        enemy_manager.enemies.append(Enemy(64, 80, "bat", sprite_manager, LEVEL_CAVE))
+        world.set_tile(5, 6, TILE_CAVE_FLOOR, LEVEL_CAVE)
+        world.set_tile(100, 120, TILE_DIRT, LEVEL_JUNGLE)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "world.vcw")
+            savegame.save_game(path, world, player, enemy_manager, 1234, compress=compress)
+            loaded_world, loaded_player, loaded_enemies, game_time = savegame.load_game(path, sprite_manager)
+
+            # Chunks are only read from the mapped file once they are touched
+            assert loaded_world.loaded_chunk_count() < world.loaded_chunk_count()
+            assert loaded_world.get_tile(5, 6, LEVEL_CAVE) == TILE_CAVE_FLOOR
+            assert loaded_world.get_tile(100, 120, LEVEL_JUNGLE) == TILE_DIRT
+            assert loaded_world.cave_portal == world.cave_portal
+            assert game_time == 1234
+            assert (loaded_player.x, loaded_player.y) == (player.x, player.y)
+            assert loaded_player.inventory.counts == {"wood": 7}
+            assert loaded_player.inventory.items == player.inventory.items
+            assert loaded_player.current_tool == TOOL_STONE_PICKAXE
+            assert loaded_player.health == 42
+            assert [(e.enemy_type, e.level, e.x, e.y) for e in loaded_enemies.enemies] == \
+                [("bat", LEVEL_CAVE, 64, 80)]
+
+            # Saving over the mapped file keeps unread chunks intact
+            savegame.save_game(path, loaded_world, loaded_player, loaded_enemies, 1300)
+            assert loaded_world.get_tile(100, 120, LEVEL_JUNGLE) == TILE_DIRT
+            loaded_world.close()
+
+    # Damaged files fail with SaveFormatError, and the game just refuses to load them
+    import game as game_module
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "world.vcw")
+        savegame.save_game(path, world, player, enemy_manager, 1234)
+        with open(path, "rb") as f:
+            data = f.read()
+        footer = savegame.FOOTER
+        index_offset, entry_count, _ = footer.unpack_from(data, len(data) - footer.size)
+        source = savegame.SaveFile(path)
+        state_offset, state_length = source.state_entry
+        source.close()
+        damaged = {
+            "index past the end": data[:-footer.size] + footer.pack(len(data) * 2, entry_count, savegame.SAVE_END_MAGIC),
+            "record past the end": data[:-footer.size] + footer.pack(index_offset, entry_count + 1, savegame.SAVE_END_MAGIC),
+            "garbled state": data[:state_offset] + b"\xff" * state_length + data[state_offset + state_length:],
+        }
+        for name, corrupt in damaged.items():
+            with open(path, "wb") as f:
+                f.write(corrupt)
+            try:
+                savegame.load_game(path, sprite_manager)
+                assert False, name
+            except savegame.SaveFormatError:
+                pass
+
+        game_module.SAVE_FILE, saved_path = path, game_module.SAVE_FILE
+        try:
+            game = game_module.Game()
+            game.world_cache = WorldCache(os.path.join(directory, "cache"))
+            assert not game.load_game()
+            assert game.state == STATE_MENU
+
+            # Replacing a loaded world closes the file it had mapped
+            savegame.save_game(path, world, player, enemy_manager, 1234)
+            assert game.load_game()
+            loaded_world, save = game.world, game.world.chunk_source
+            game.new_game()
+            assert game.world is not loaded_world
+            assert save._mmap is None and loaded_world.chunk_source is None
+        finally:
+            game_module.SAVE_FILE = saved_path
+            pygame.display.quit()
+    print("✓ Save and load round trip works")
+
+def test_incremental_autosave():
+    """Test that autosaves append only dirty chunks and stay loadable"""
+    pygame.init()
+    sprite_manager = SpriteManager()
+    world = World(sprite_manager, seed=99)
+    player = Player(world.spawn_x, world.spawn_y, sprite_manager)
+    enemy_manager = EnemyManager(sprite_manager)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "auto.vcw")
+        autosaver = savegame.Autosaver(path, interval=2)
+
+        # First autosave of a world is a full save
+        world.set_tile(10, 10, TILE_DIRT, LEVEL_JUNGLE)
+        assert not autosaver.update(world, player, enemy_manager, 1)
+        assert autosaver.update(world, player, enemy_manager, 2)
+        assert not world.dirty_chunks
+        autosaver.wait()
+        full_size = os.path.getsize(path)
+
+        # Later ones only append the chunks set_tile touched
+        world.set_tile(40, 40, TILE_CAVE_FLOOR, LEVEL_CAVE)
+        assert world.dirty_chunks == {(LEVEL_CAVE, 1, 1)}
+        autosaver.save_now(world, player, enemy_manager, 3)
+        autosaver.wait()
+        assert autosaver.error is None and autosaver.saves == 2
+        assert os.path.getsize(path) - full_size < 2 * CHUNK_SIZE * CHUNK_SIZE
+        assert autosaver.last_snapshot_ms < 5
+
+        loaded_world, _, _, game_time = savegame.load_game(path, sprite_manager)
+        assert game_time == 3
+        assert loaded_world.get_tile(10, 10, LEVEL_JUNGLE) == TILE_DIRT
+        assert loaded_world.get_tile(40, 40, LEVEL_CAVE) == TILE_CAVE_FLOOR
+        loaded_world.close()
+
+        # An append cut short falls back to the previous footer, and the next one replaces the torn tail
+        good_size = os.path.getsize(path)
+        world.set_tile(70, 70, TILE_CAVE_FLOOR, LEVEL_CAVE)
+        autosaver.save_now(world, player, enemy_manager, 4)
+        autosaver.wait()
+        for cut in (good_size + 10, os.path.getsize(path) - 3):
+            with open(path, "r+b") as f:
+                f.truncate(cut)
+            loaded_world, _, _, game_time = savegame.load_game(path, sprite_manager)
+            assert game_time == 3
+            loaded_world.close()
+        world.set_tile(140, 140, TILE_DIRT, LEVEL_JUNGLE)
+        autosaver.save_now(world, player, enemy_manager, 5)
+        autosaver.wait()
+        assert autosaver.error is None
+        loaded_world, _, _, game_time = savegame.load_game(path, sprite_manager)
+        assert game_time == 5
+        assert loaded_world.get_tile(40, 40, LEVEL_CAVE) == TILE_CAVE_FLOOR
+
+        # A full autosave of a loaded world keeps the saved chunks it never touched
+        fresh = savegame.Autosaver(os.path.join(directory, "full.vcw"))
+        loaded_world.set_tile(100, 100, TILE_DIRT, LEVEL_JUNGLE)
+        fresh.save_now(loaded_world, player, enemy_manager, 6)
+        fresh.wait()
+        assert (140 // CHUNK_SIZE, 140 // CHUNK_SIZE) not in loaded_world.chunks[LEVEL_JUNGLE]
+        loaded_world.close()
+        full_world, _, _, _ = savegame.load_game(fresh.path, sprite_manager)
+        assert full_world.get_tile(140, 140, LEVEL_JUNGLE) == TILE_DIRT
+        assert full_world.get_tile(40, 40, LEVEL_CAVE) == TILE_CAVE_FLOOR
+        assert full_world.get_tile(100, 100, LEVEL_JUNGLE) == TILE_DIRT
+        full_world.close()
+    print("✓ Incremental autosave works")
+
+def test_world_cache_hits_and_eviction():
+    """Test that cached worlds are reused, kept pristine and evicted LRU-first"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = WorldCache(directory)
+        world = World(None, seed=12345, cache=cache)
+        assert cache.misses == 1 and world.generated_chunks
+        world.set_tile(world.spawn_x // TILE_SIZE, world.spawn_y // TILE_SIZE, TILE_DIRT, LEVEL_JUNGLE)
+        generated = sorted(world.generated_chunks)
+        assert cache.store(world)
+
+        cached = World(None, seed=12345, cache=cache)
+        assert cache.hits == 1
+        assert (cached.spawn_x, cached.spawn_y) == (world.spawn_x, world.spawn_y)
+        for level, chunk_x, chunk_y in generated:
+            pristine = worldgen.generate_chunk(12345, level, chunk_x, chunk_y, WORLD_WIDTH, WORLD_HEIGHT)
+            assert cached.get_chunk(level, chunk_x, chunk_y).tiles == pristine
+        assert not cached.generated_chunks
+
+        # Entries from another generator version are dropped; the rest are LRU-bounded
+        stale = os.path.join(directory, "0000000000000000-stale.vcw")
+        open(stale, "wb").close()
+        cache.warm(1)
+        cache.warm(2)
+        assert not os.path.exists(stale)
+        assert len(cache.entries()) == 3
+        cache.max_bytes = os.path.getsize(cache.path_for(2, WORLD_WIDTH, WORLD_HEIGHT))
+        cache.evict()
+        assert [path for path, _, _ in cache.entries()] == [cache.path_for(2, WORLD_WIDTH, WORLD_HEIGHT)]
+    print("✓ World cache works")
+
+def test_walkable_spawn_sampling():
+    """Test that spawn sampling only returns walkable tiles in range, tracking set_tile"""
+    world = World(None, seed=12345)
+    rng = random.Random(1)
+    center_x, center_y = 75 * TILE_SIZE, 75 * TILE_SIZE
+    for level in (LEVEL_JUNGLE, LEVEL_CAVE):
+        for _ in range(500):
+            x, y = world.sample_walkable_near(level, center_x, center_y, 300, 500, rng)
+            assert not world.is_solid(x, y, level)
+            assert 300 <= math.hypot(x * TILE_SIZE - center_x, y * TILE_SIZE - center_y) <= 500
+
+    # The index follows set_tile both ways
+    chunk_tiles = [(x, y) for y in range(CHUNK_SIZE) for x in range(CHUNK_SIZE)]
+    walkable = [tile for tile in chunk_tiles if not world.is_solid(*tile, LEVEL_CAVE)]
+    count = world.walkable_count(LEVEL_CAVE, 0, 0)
+    assert count == len(walkable)
+    for x, y in walkable[1:]:
+        world.set_tile(x, y, TILE_STONE, LEVEL_CAVE)
+    assert world.sample_walkable(LEVEL_CAVE, rng, chunks=[(0, 0)]) == walkable[0]
+    world.set_tile(5, 5, TILE_CAVE_FLOOR, LEVEL_CAVE)
+    assert world.walkable_count(LEVEL_CAVE, 0, 0) == (1 if walkable[0] == (5, 5) else 2)
+    print("✓ Walkable spawn sampling works")
+
+def test_region_labels():
+    """Test that region labels match a flood fill and follow opened walls"""
+    world = World(None, seed=12345)
+    level = LEVEL_CAVE
+
+    # A query labels the loaded chunks only, without generating the rest of the level
+    assert world.region_id(level, *world.cave_portal) is not None
+    assert world.loaded_chunk_count(level) < world.chunks_x * world.chunks_y
+
+    # Flood fill from the portal and compare
+    start = world.cave_portal
+    reached = {start}
+    stack = [start]
+    while stack:
+        x, y = stack.pop()
+        for n in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if n not in reached and not world.is_solid(*n, level):
+                reached.add(n)
+                stack.append(n)
+    portal_region = world.region_id(level, *start)
+    for y in range(world.height):
+        for x in range(world.width):
+            assert ((x, y) in reached) == (world.region_id(level, x, y) == portal_region)
+            assert (world.region_id(level, x, y) is None) == world.is_solid(x, y, level)
+
+    # Dig a tunnel from a sealed pocket to the portal region
+    pocket = next(((x, y) for y in range(world.height) for x in range(world.width)
+                   if not world.is_solid(x, y, level) and (x, y) not in reached), None)
+    if pocket is not None:
+        x, y = pocket
+        target = min(reached, key=lambda tile: abs(tile[0] - x) + abs(tile[1] - y))
+        assert not world.same_region((level, x, y), (level, *target))
+        while x != target[0]:
+            x += 1 if target[0] > x else -1
+            world.set_tile(x, y, TILE_CAVE_FLOOR, level)
+        while y != target[1]:
+            y += 1 if target[1] > y else -1
+            world.set_tile(x, y, TILE_CAVE_FLOOR, level)
+        assert world.same_region((level, *pocket), (level, *target))
+
+    # Closing a tile forces a relabel, which stays consistent
+    world.set_tile(start[0], start[1], TILE_STONE, level)
+    assert world.region_id(level, *start) is None
+    assert world.same_region((level, *start), (level, *start)) is False
+
+    # Relabelling chunks over and over doesn't pile up stale labels
+    parent = world.region_parents[level]
+    walls = [(x, y) for y in range(1, world.height - 1) for x in range(1, world.width - 1)
+             if world.is_solid(x, y, level)]
+    for x, y in walls[::7][:500]:
+        world.set_tile(x, y, TILE_CAVE_FLOOR, level)
+        live = {label for chunk in world.chunks[level].values() for label in chunk.region_labels if label >= 0}
+        assert len(parent) <= 2 * len(live)
+    x, y = walls[0]
+    assert world.same_region((level, x, y), (level, x + 1, y)) == (not world.is_solid(x + 1, y, level))
+    print("✓ Region labels work")
+
+def test_chunk_surface_cache():
+    """Test that chunk surfaces are reused, redrawn after set_tile and memory-bounded"""
+    pygame.init()
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    sprites = SpriteManager()
+    world = World(sprites, seed=12345)
+    world.draw(screen, 0, 0, LEVEL_JUNGLE)
+    cache = world.surface_cache
+    renders = cache.renders
+    assert renders > 0
+    world.draw(screen, 0, 0, LEVEL_JUNGLE)
+    assert cache.renders == renders
+
+    # Mining a tile redraws just its chunk
+    world.set_tile(40, 3, TILE_DIRT, LEVEL_JUNGLE)
+    world.draw(screen, 0, 0, LEVEL_JUNGLE)
+    assert cache.renders == renders + 1
+    assert screen.get_at((40 * TILE_SIZE + 1, 3 * TILE_SIZE + 1)) == sprites.get_tile(TILE_DIRT).get_at((1, 1))
+
+    # The least recently used chunks go once the cap is reached
+    cache.max_bytes = cache.size // 2
+    world.draw(screen, 0, 0, LEVEL_CAVE)
+    assert cache.size <= cache.max_bytes
+    assert all(key[0] == LEVEL_CAVE for key in list(cache.surfaces)[-2:])
+    print("✓ Chunk surface cache works")
+
+def test_world_layer_scrolling():
+    """Test that the scrolling world layer redraws only exposed strips and stays exact"""
+    pygame.init()
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    world = World(SpriteManager(), seed=12345)
+    world.draw(screen, 500, 500, LEVEL_JUNGLE)
+
+    # Small moves stay inside the margin; bigger ones redraw a strip
+    world.draw(screen, 510, 495, LEVEL_JUNGLE)
+    assert world.layer.redrawn_pixels == 0
+    world.draw(screen, 600, 495, LEVEL_JUNGLE)
+    assert 0 < world.layer.redrawn_pixels < SCREEN_WIDTH * SCREEN_HEIGHT // 4
+
+    world.set_tile(45, 40, TILE_DIRT, LEVEL_JUNGLE)
+    world.draw(screen, 600, 495, LEVEL_JUNGLE)
+    assert world.layer.redrawn_pixels == TILE_SIZE * TILE_SIZE
+
+    # Matches a fresh world drawn straight at the final camera position
+    fresh = World(SpriteManager(), seed=12345)
+    fresh.set_tile(45, 40, TILE_DIRT, LEVEL_JUNGLE)
+    expected = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    fresh.draw(expected, 600, 495, LEVEL_JUNGLE)
+    assert pygame.image.tobytes(screen, "RGB") == pygame.image.tobytes(expected, "RGB")
+    print("✓ World layer scrolling works")
+
+def test_sprite_atlas():
+    """Test that atlas source rects hold the same pixels as the separate sprites"""
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    plain = SpriteManager()
+    atlas = SpriteManager()
+    atlas.build_atlas()
+    for tile in (TILE_GRASS, TILE_STONE, TILE_CAVE_EXIT):
+        page, rect = atlas.tile_source(tile)
+        assert page in atlas.atlas_pages
+        copy = pygame.Surface(rect.size)
+        copy.blit(page, (0, 0), rect)
+        assert pygame.image.tobytes(copy, "RGB") == pygame.image.tobytes(plain.get_tile(tile), "RGB")
+    page, rect = atlas.enemy_source("bat")
+    assert page.get_colorkey() is not None
+
+    # Chunks render the same through the atlas
+    expected = World(plain, seed=12345)
+    world = World(atlas, seed=12345)
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    other = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    world.draw(screen, 0, 0, LEVEL_CAVE)
+    expected.draw(other, 0, 0, LEVEL_CAVE)
+    assert pygame.image.tobytes(screen, "RGB") == pygame.image.tobytes(other, "RGB")
+    pygame.display.quit()
+    print("✓ Sprite atlas works")
+
+def test_low_resolution_render_mode():
+    """Test that the low-resolution view is upscaled and mouse positions map to its tiles"""
+    from game import Game
+    game = Game(render_scale=2)
+    with tempfile.TemporaryDirectory() as directory:
+        game.world_cache = WorldCache(directory)
+        game.new_game()
+        assert game.view.get_size() == (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+
+        # The window shows as much of the world as at full resolution, so its centre is the same tile
+        game.update_camera()
+        tile = game.mouse_to_tile((SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+        assert tile == (int((game.camera_x + SCREEN_WIDTH // 2) // TILE_SIZE),
+                        int((game.camera_y + SCREEN_HEIGHT // 2) // TILE_SIZE))
+        camera = (game.camera_x, game.camera_y)
+        game.set_render_scale(1)
+        assert (game.camera_x, game.camera_y) == camera
+        game.set_render_scale(2)
+
+        # Every view pixel becomes a 2x2 block of the window
+        game.draw()
+        for x, y in ((100, 100), (321, 181), (500, 250)):
+            assert game.screen.get_at((2 * x + 1, 2 * y + 1)) == game.view.get_at((x, y))
+
+        # Tiles are shrunk by nearest neighbour: each view pixel is a pixel of the tile sprite
+        level = game.player.current_level
+        tile_x, tile_y = game.mouse_to_tile((200, 200))
+        tile_type = game.world.get_tile(tile_x, tile_y, level)
+        sprite = game.sprite_manager.get_tile(tile_type | game.world._edge_mask(level, tile_x, tile_y) << EDGE_SHIFT,
+                                              game.world.light_level(level, game.game_time))
+        left, top = (tile_x * TILE_SIZE - game.camera_x) // 2, (tile_y * TILE_SIZE - game.camera_y) // 2
+        for x in range(TILE_SIZE // 2):
+            assert game.view.get_at((left + x, top + x))[:3] == sprite.get_at((2 * x, 2 * x))[:3]
+
+        # Zooming out as far as tiles still cover a view pixel
+        game.set_render_scale(4)
+        game.set_zoom(8)
+        assert game.zoom == TILE_SIZE // 4
+        game.draw()
+    pygame.display.quit()
+    print("✓ Low-resolution render mode works")
+
+def test_static_screens_skip_presentation():
+    """Test that static screens are drawn once and then skipped until invalidated"""
+    from game import Game
+    game = Game()
+    with tempfile.TemporaryDirectory() as directory:
+        game.world_cache = WorldCache(directory)
+        game.draw()  # Menu
+        assert not game.dirty_rects and game.presented_state == STATE_MENU
+
+        game.new_game()
+        game.draw()
+        assert game.scene is None
+        game.state = STATE_PAUSED
+        game.draw()
+        assert game.scene is not None
+        frame = pygame.image.tobytes(game.screen, "RGB")
+
+        # Nothing changes, so nothing is drawn (the world moving would show otherwise)
+        game.screen.fill(BLACK)
+        game.draw()
+        assert pygame.image.tobytes(game.screen, "RGB") != frame
+        game.invalidate()
+        game.draw()
+        assert pygame.image.tobytes(game.screen, "RGB") == frame
+
+        # Crafting something redraws the scene behind the overlay
+        game.state = STATE_CRAFTING
+        game.player.add_to_inventory(ITEM_WOOD, 3)
+        game.draw()
+        scene = game.scene
+        game.handle_mousedown(1, (110, 125))
+        assert game.scene is None and game.dirty_rects
+        # Only the clicked row, rows it changed the colour of and the hotbar are presented
+        screen_area = SCREEN_WIDTH * SCREEN_HEIGHT
+        assert game.ui.crafting_row_rect(0) in game.dirty_rects
+        assert game.ui.hotbar_rect() in game.dirty_rects
+        assert sum(rect.width * rect.height for rect in game.dirty_rects) < screen_area // 4
+        game.draw()
+        assert game.scene is not scene
+
+        # Moving the mouse between rows redraws just those two
+        game.ui.set_crafting_hover((110, 125))
+        pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, pos=(110, 125 + 35), rel=(0, 35), buttons=(0, 0, 0)))
+        game.handle_events()
+        assert game.dirty_rects == [game.ui.crafting_row_rect(0), game.ui.crafting_row_rect(1)]
+        game.draw()
+    pygame.display.quit()
+    print("✓ Static screens skip presentation")
+
+def test_day_night_tile_sets():
+    """Test the light levels along the day/night cycle and the tinted tile sets"""
+    pygame.init()
+    sprites = SpriteManager()
+    world = World(sprites, seed=12345)
+    day, night = LIGHT_LEVELS - 1, 0
+    assert world.light_level(LEVEL_JUNGLE, 0) == day
+    assert world.light_level(LEVEL_JUNGLE, DAY_LENGTH + NIGHT_LENGTH // 2) == night
+    assert world.light_level(LEVEL_CAVE, DAY_LENGTH + NIGHT_LENGTH // 2) == day
+    sunset = [world.light_level(LEVEL_JUNGLE, t) for t in range(DAY_LENGTH, DAY_LENGTH + NIGHT_LENGTH // 10)]
+    assert sunset == sorted(sunset, reverse=True) and len(set(sunset)) == LIGHT_LEVELS
+    assert world.get_background_color(LEVEL_JUNGLE, 0) == SKY_BLUE
+    assert world.get_background_color(LEVEL_JUNGLE, DAY_LENGTH + NIGHT_LENGTH // 2) == NIGHT_SKY
+
+    # Night tiles are the day tiles multiplied by the night tint
+    grass = sprites.get_tile(TILE_GRASS).get_at((0, 0))
+    dark = sprites.get_tile(TILE_GRASS, night).get_at((0, 0))
+    assert all(abs(d - c * t / 255) <= 1 for d, c, t in zip(tuple(dark)[:3], tuple(grass)[:3], NIGHT_TINT))
+
+    # Prefetched chunks for the coming light level draw the same as fresh ones
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    for t in range(DAY_LENGTH - LIGHT_PREFETCH_FRAMES, DAY_LENGTH + 1):
+        world.draw(screen, 300, 300, LEVEL_JUNGLE, t)
+    fresh = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    World(sprites, seed=12345).draw(fresh, 300, 300, LEVEL_JUNGLE, DAY_LENGTH)
+    assert pygame.image.tobytes(screen, "RGB") == pygame.image.tobytes(fresh, "RGB")
+    print("✓ Day/night tile sets work")
+
+
+def test_cave_lightmap():
+    """Test light spreading from the cave's emitters and its incremental updates"""
+    pygame.init()
+    sprites = SpriteManager()
+    world = World(sprites, seed=12345)
+    portal_x, portal_y = world.cave_portal
+    chunk_x, chunk_y = portal_x // CHUNK_SIZE, portal_y // CHUNK_SIZE
+
+    def expected(tile_x, tile_y):
+        # Brightest emitter by shortest open path (opaque tiles are lit but pass nothing on)
+        best = 0
+        for y in range(tile_y - PLAYER_LIGHT, tile_y + PLAYER_LIGHT + 1):
+            for x in range(tile_x - PLAYER_LIGHT, tile_x + PLAYER_LIGHT + 1):
+                value = LIGHT_EMITTERS.get(world.get_tile(x, y, LEVEL_CAVE), 0)
+                if value <= best:
+                    continue
+                distances, frontier = {(x, y): 0}, [(x, y)]
+                for step in range(1, value):
+                    reached = []
+                    for fx, fy in frontier:
+                        if (fx, fy) != (x, y) and world.is_solid(fx, fy, LEVEL_CAVE):
+                            continue
+                        for n in ((fx - 1, fy), (fx + 1, fy), (fx, fy - 1), (fx, fy + 1)):
+                            if n not in distances:
+                                distances[n] = step
+                                reached.append(n)
+                    frontier = reached
+                if (tile_x, tile_y) in distances:
+                    best = max(best, value - distances[(tile_x, tile_y)])
+        return best
+
+    # Chunks that aren't loaded yet are dark walls to the lightmap, and it catches up when they load
+    world.lightmap = lazy = Lightmap(world)
+    keys = [(x, y) for y in range(world.chunks_y) for x in range(world.chunks_x)]
+    assert not any(any(lazy._static_chunk(*key)) for key in keys)
+    assert world.loaded_chunk_count(LEVEL_CAVE) == 0
+    world.pregenerate((LEVEL_CAVE,))
+    assert lazy.take_changes()
+    lightmap = Lightmap(world)
+    assert all(lazy.static[key] == lightmap._static_chunk(*key) for key in keys)
+    world.lightmap = None
+
+    area = [(chunk_x * CHUNK_SIZE + x, chunk_y * CHUNK_SIZE + y)
+            for y in range(0, CHUNK_SIZE, 3) for x in range(0, CHUNK_SIZE, 3)]
+    area += [(portal_x + dx, portal_y + dy) for dx in range(-7, 8) for dy in range(-7, 8)]
+    assert all(lightmap.light(x, y) == expected(x, y) for x, y in area)
+    assert lightmap.light(portal_x, portal_y) == LIGHT_EMITTERS[TILE_CAVE_EXIT]
+
+    # The player's light follows it and marks tiles explored; they stay dimly visible
+    lightmap.move_player(portal_x, portal_y)
+    assert lightmap.light(portal_x, portal_y) == PLAYER_LIGHT
+    assert lightmap.is_explored(portal_x, portal_y)
+    lightmap.move_player(5, 5)
+    assert lightmap.row_brightness(portal_y, portal_x, portal_x + 1) == [
+        max(CAVE_FOG_BRIGHTNESS, LIGHT_BRIGHTNESS[LIGHT_EMITTERS[TILE_CAVE_EXIT]])]
+
+    # The darkness layer multiplies the view by each tile's brightness
+    view = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    view.fill(WHITE)
+    camera_x, camera_y = portal_x * TILE_SIZE - 640, portal_y * TILE_SIZE - 360
+    world.draw_lighting(view, camera_x, camera_y, (portal_x, portal_y))
+    assert view.get_at((640 + 8, 360 + 8))[:3] == (255, 255, 255)
+    far = world.lightmap.row_brightness(portal_y - 20, portal_x - 38, portal_x - 37)[0]
+    assert view.get_at((640 - 38 * TILE_SIZE + 8, 360 - 20 * TILE_SIZE + 8))[0] == far
+
+    # Opening or closing tiles updates the light around them like a fresh lightmap
+    world.lightmap.take_changes()
+    world.set_tile(portal_x + 1, portal_y, TILE_CAVE_WALL, LEVEL_CAVE)
+    world.set_tile(portal_x, portal_y + 2, TILE_IRON_ORE, LEVEL_CAVE)
+    assert world.lightmap.take_changes()
+    fresh = Lightmap(world)
+    fresh.move_player(portal_x, portal_y)
+    nearby = [(portal_x + dx, portal_y + dy) for dx in range(-12, 13) for dy in range(-12, 13)]
+    assert all(world.lightmap.light(x, y) == fresh.light(x, y) for x, y in nearby)
+    print("✓ Cave lightmap works")
+
+
+def test_autotile_edges():
+    """Test edge masks next to the tiles, their updates from set_tile and the variant sprites"""
+    pygame.init()
+    sprites = SpriteManager()
+    world = World(sprites, seed=12345)
+    assert all(tile | edges << EDGE_SHIFT in sprites.tiles for tile in AUTOTILED for edges in range(16))
+
+    # Neighbours that aren't loaded yet get no edges drawn against them until they load
+    edges = world.tile_edges(LEVEL_CAVE, 1, 2)
+    assert world.loaded_chunk_count(LEVEL_CAVE) == 1
+    stale = bytes(edges)
+    world.pregenerate((LEVEL_CAVE,))
+    assert bytes(edges) != stale
+    assert all(edges[i] == world._edge_mask(LEVEL_CAVE, CHUNK_SIZE + i % CHUNK_SIZE, 2 * CHUNK_SIZE + i // CHUNK_SIZE)
+               for i in range(CHUNK_SIZE * CHUNK_SIZE))
+
+    # Chunk masks (including tiles on chunk borders) match a neighbour-by-neighbour scan
+    for chunk_x, chunk_y in ((0, 0), (1, 2), (world.chunks_x - 1, world.chunks_y - 1)):
+        edges = world.tile_edges(LEVEL_CAVE, chunk_x, chunk_y)
+        for i in range(0, CHUNK_SIZE * CHUNK_SIZE, 7):
+            x, y = chunk_x * CHUNK_SIZE + i % CHUNK_SIZE, chunk_y * CHUNK_SIZE + i // CHUNK_SIZE
+            assert edges[i] == world._edge_mask(LEVEL_CAVE, x, y)
+
+    # Digging out a tile on a chunk border updates its neighbours' masks and drawing
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    world.draw(screen, 0, 0, LEVEL_CAVE)
+    x, y = CHUNK_SIZE - 1, 10
+    for tile_x in range(x - 1, x + 3):
+        world.set_tile(tile_x, y - 1, TILE_CAVE_WALL, LEVEL_CAVE)
+        world.set_tile(tile_x, y, TILE_CAVE_WALL, LEVEL_CAVE)
+    world.set_tile(x, y, TILE_CAVE_FLOOR, LEVEL_CAVE)
+    assert world.tile_edges(LEVEL_CAVE, 1, 0)[y * CHUNK_SIZE] & EDGE_WEST
+    assert world.tile_edges(LEVEL_CAVE, 0, 0)[(y - 1) * CHUNK_SIZE + x] & EDGE_SOUTH
+    world.draw(screen, 0, 0, LEVEL_CAVE)
+    wall = sprites.get_tile(TILE_CAVE_WALL | world._edge_mask(LEVEL_CAVE, x + 1, y) << EDGE_SHIFT)
+    drawn = screen.subsurface(((x + 1) * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+    assert pygame.image.tobytes(drawn, "RGB") == pygame.image.tobytes(wall, "RGB")
+    print("✓ Autotile edges work")
+
+
+def test_minimap():
+    """Test the minimap picture, its set_tile patches and the blit fallback without NumPy"""
+    import render
+    pygame.init()
+    sprites = SpriteManager()
+    world = World(sprites, seed=12345)
+    world.get_chunk(LEVEL_CAVE, 0, 0)
+    minimap = world.get_minimap(LEVEL_CAVE)
+    image = minimap.image()
+    assert image.get_size() == (MINIMAP_SIZE, MINIMAP_SIZE)
+    assert minimap.surface.get_at((3, 3))[:3] == MINIMAP_COLORS[world.get_tile(3, 3, LEVEL_CAVE)]
+    assert minimap.surface.get_at((100, 100))[:3] == BLACK  # Not loaded yet
+
+    # Loading chunks and set_tile bring the picture up to date
+    world.set_tile(3, 3, TILE_DIAMOND_ORE, LEVEL_CAVE)
+    world.set_tile(100, 100, TILE_STONE, LEVEL_CAVE)
+    assert minimap.image() is not image
+    assert minimap.surface.get_at((3, 3))[:3] == DIAMOND_CYAN
+    assert minimap.surface.get_at((100, 100))[:3] == STONE_GRAY
+    image = minimap.image()
+    assert minimap.image() is image
+
+    # Copying chunks with blits gives the same picture
+    saved_np, render.np = render.np, None
+    try:
+        fallback = render.Minimap(world, LEVEL_CAVE)
+        fallback.image()
+    finally:
+        render.np = saved_np
+    assert pygame.image.tobytes(fallback.surface, "P") == pygame.image.tobytes(minimap.surface, "P")
+
+    # The HUD draws the picture and the player's marker
+    ui = UI(sprites)
+    ui.init_fonts()
+    player = Player(100 * TILE_SIZE, 100 * TILE_SIZE, sprites)
+    player.current_level = LEVEL_CAVE
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    ui.draw_hud(screen, player, 0, world, [])
+    marker = (SCREEN_WIDTH - 20 - MINIMAP_SIZE + int(100 * minimap.scale), 80 + int(100 * minimap.scale))
+    assert screen.get_at(marker)[:3] == WHITE
+    print("✓ Minimap works")
+
+
+def test_zoom_levels():
+    """Test zoomed-out views: mipmapped chunks, invalidation, mouse mapping and enemies"""
+    from game import Game
+    from enemy import Enemy
+    game = Game()
+    with tempfile.TemporaryDirectory() as directory:
+        game.world_cache = WorldCache(directory)
+        game.new_game()
+        game.set_zoom(4)
+        game.draw()
+        world, cache = game.world, game.world.surface_cache
+
+        # Each zoom level is the one below shrunk to half size
+        full = cache.get(world, LEVEL_JUNGLE, 1, 1, game.screen)
+        quarter = cache.get(world, LEVEL_JUNGLE, 1, 1, game.screen, zoom=4)
+        assert quarter.get_size() == (full.get_width() // 4, full.get_height() // 4)
+        assert (LEVEL_JUNGLE, LIGHT_LEVELS - 1, 2, 1, 1, 1) in cache.surfaces
+        world.set_tile(40, 40, TILE_WATER, LEVEL_JUNGLE)
+        assert not any(key[4:] == (1, 1) for key in cache.surfaces)
+
+        # The mouse maps through the zoom, and the crosshair tile matches
+        tile = game.mouse_to_tile((100, 60))
+        assert tile == (int((game.camera_x + 400) // TILE_SIZE), int((game.camera_y + 240) // TILE_SIZE))
+
+        # Enemies are drawn shrunk at their zoomed position
+        enemy = Enemy(game.camera_x + 800, game.camera_y + 400, "bat", game.sprite_manager, LEVEL_JUNGLE)
+        game.enemy_manager.enemies = [enemy]
+        view = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        game.enemy_manager.draw(view, game.camera_x, game.camera_y, LEVEL_JUNGLE, 4)
+        sprite = game.sprite_manager.zoomed(game.sprite_manager.get_enemy_sprite("bat"), 4)
+        assert sprite.get_size() == (TILE_SIZE // 4, TILE_SIZE // 4)
+        drawn = view.subsurface((200, 100) + sprite.get_size())
+        assert pygame.image.tobytes(drawn, "RGB") == pygame.image.tobytes(sprite, "RGB")
+
+        # Zoomed all the way out, the small world is centred
+        game.set_zoom(8)
+        assert game.camera_x == (world.width * TILE_SIZE - SCREEN_WIDTH * 8) // 2
+        game.draw()
+    pygame.display.quit()
+    print("✓ Zoom levels work")
+
+
+def test_text_cache():
+    """Test the shared font registry and the LRU text-surface cache"""
+    from ui import TextCache, get_font
+    pygame.init()
+    assert get_font(72) is get_font(72)
+    cache = TextCache(max_entries=2)
+    font = get_font(24)
+    first = cache.render(font, "Day", True, WHITE)
+    assert cache.render(font, "Day", True, WHITE) is first
+    assert cache.render(font, "Day", True, HEALTH_RED) is not first
+    cache.render(font, "Night", True, WHITE)
+    assert cache.stats() == {"hits": 1, "misses": 3, "hit_rate": 0.25, "entries": 2}
+    assert cache.render(font, "Day", True, WHITE) is not first  # Evicted as least recently used
+
+    # A steady HUD renders no text after the first frame
+    sprites = SpriteManager()
+    ui = UI(sprites)
+    ui.init_fonts()
+    player = Player(0, 0, sprites)
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    ui.draw_hud(screen, player, 0)
+    misses = ui.text.misses
+    ui.draw_hud(screen, player, 1)
+    ui.draw_pause(screen)
+    ui.draw_pause(screen)
+    assert ui.text.misses == misses + 3 and ui.text.hits > 0
+    print("✓ Text cache works")
+
+
+def test_item_icon_atlas():
+    """Test that item icons are scaled once per size into an atlas page"""
+    pygame.init()
+    sprites = SpriteManager()
+    page, area = sprites.icon_source(ITEM_WOOD, 40)
+    assert area.size == (40, 40)
+    icon = pygame.Surface((40, 40))
+    icon.blit(page, (0, 0), area)
+    expected = pygame.transform.scale(sprites.get_item_sprite(ITEM_WOOD), (40, 40))
+    assert pygame.image.tobytes(icon, "RGB") == pygame.image.tobytes(expected, "RGB")
+    assert sprites.icon_source(ITEM_APPLE, 40)[0] is page
+    assert sprites.icon_source("wooden_pickaxe", 40)[1] == sprites.icon_source(ITEM_STONE, 40)[1]
+    assert page.get_at(sprites.icon_source(ITEM_APPLE, 40)[1].topleft)[:3] == BLACK  # Colourkeyed background
+
+    # Drawing the inventory and hotbar scales nothing
+    ui = UI(sprites)
+    ui.init_fonts()
+    player = Player(0, 0, sprites)
+    for item_type, quantity in ((ITEM_WOOD, 3), (ITEM_STONE, 5), (ITEM_MEAT, 1)):
+        player.add_to_inventory(item_type, quantity)
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    ui.draw_inventory(screen, player)
+    ui.draw_hud(screen, player, 0)
+    scale = pygame.transform.scale
+    calls = []
+    pygame.transform.scale = lambda *args: calls.append(args) or scale(*args)
+    try:
+        ui.draw_inventory(screen, player)
+        ui.draw_hud(screen, player, 0)
+    finally:
+        pygame.transform.scale = scale
+    assert not calls
+    print("✓ Item icon atlas works")
+
+
+def test_retained_hud():
+    """Test that the HUD layer is rebuilt only when a value it shows changes"""
+    pygame.init()
+    sprites = SpriteManager()
+    ui = UI(sprites)
+    ui.init_fonts()
+    player = Player(0, 0, sprites)
+    player.add_to_inventory(ITEM_WOOD, 2)
+    player.hunger = 50.5
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    screen.fill(SKY_BLUE)
+    ui.draw_hud(screen, player, 0)
+    assert ui.hud_rebuilds == 1
+    assert screen.get_at((21 + 150, 30))[:3] == HEALTH_RED
+    assert screen.get_at((SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))[:3] == SKY_BLUE
+
+    # Steady frames and fractional changes reuse it
+    player.hunger -= 0.25
+    for time in range(1, 10):
+        ui.draw_hud(screen, player, time)
+    assert ui.hud_rebuilds == 1
+
+    # Each watched value brings it up to date
+    changes = [
+        lambda: setattr(player, "hunger", player.hunger - 1),
+        lambda: setattr(player, "health", player.health / 2),
+        lambda: player.add_to_inventory(ITEM_STONE, 1),
+        lambda: setattr(player, "selected_slot", 1),
+        lambda: setattr(player, "current_level", LEVEL_CAVE),
+    ]
+    for rebuilds, change in enumerate(changes, start=2):
+        change()
+        ui.draw_hud(screen, player, 0)
+        assert ui.hud_rebuilds == rebuilds
+    ui.draw_hud(screen, player, DAY_LENGTH)
+    assert ui.hud_rebuilds == len(changes) + 2
+
+    # Half health shows through: the empty part of the bar is drawn over the old fill
+    screen.fill(SKY_BLUE)
+    ui.draw_hud(screen, player, DAY_LENGTH)
+    assert screen.get_at((21 + 150, 30))[:3] == DARK_GRAY
+    print("✓ Retained HUD works")
+
+
+def test_crafting_book():
+    """Test the craftability index, batched crafting and multi-step plans"""
+    sprites = SpriteManager()
+    player = Player(0, 0, sprites)
+    book = CraftingBook()
+    player.add_to_inventory(ITEM_WOOD, 7)
+    player.add_to_inventory(ITEM_STONE, 3)
+    assert book.craftable(player, "wooden_pickaxe") == 2
+    assert book.craftable(player, "stone_pickaxe") == 1
+    assert book.craftable(player, "furnace") == 0
+
+    # Only recipes using the items that changed are recounted
+    recounts = book.recounts
+    book.craftable(player, "wall")
+    assert book.recounts == recounts
+    player.add_to_inventory(ITEM_STONE, 5)
+    assert book.craftable(player, "furnace") == 1
+    assert book.recounts - recounts == len(book.users[ITEM_STONE])
+
+    # Craft N and craft max are one inventory change each
+    version = player.inventory.version
+    assert book.craft(player, "door", 2) == 2
+    assert player.inventory.version == version + 1
+    assert player.inventory.count(ITEM_WOOD) == 3 and player.inventory.count("door") == 2
+    assert book.craft(player, "wall", None) == 8
+    assert ITEM_STONE not in player.inventory and player.inventory.count("wall") == 8
+    assert book.craft(player, "furnace", 1) == 0
+
+    # Intermediate products are planned and crafted on the way
+    recipes = {
+        "plank": {ITEM_WOOD: 1},
+        "stick": {"plank": 1},
+        "handle": {"stick": 2, "plank": 1},
+        "diamond_pickaxe": {"handle": 1, ITEM_DIAMOND: 3},
+    }
+    book = CraftingBook(recipes)
+    player = Player(0, 0, sprites)
+    player.change_inventory({ITEM_WOOD: 7, "stick": 1, ITEM_DIAMOND: 6})
+    assert book.craftable(player, "diamond_pickaxe") == 0
+    assert book.plan(player, "diamond_pickaxe") == [("plank", 1), ("stick", 1), ("plank", 1),
+                                                   ("handle", 1), ("diamond_pickaxe", 1)]
+    assert book.plan(player, "diamond_pickaxe") is book.plan(player, "diamond_pickaxe")  # Memoized
+    assert book.max_craftable(player, "diamond_pickaxe") == 2
+    assert book.plan(player, "diamond_pickaxe", 3) is None
+    assert book.craft(player, "diamond_pickaxe", None) == 2
+    assert player.inventory.counts == {ITEM_WOOD: 2, "diamond_pickaxe": 2}
+
+    # Craft max stops at what the inventory can hold
+    player = Player(0, 0, sprites)
+    player.add_to_inventory(ITEM_WOOD, 3 * STACK_LIMIT)
+    book = CraftingBook()
+    assert book.craftable(player, "wooden_pickaxe") == STACK_LIMIT
+    assert book.max_craftable(player, "wooden_pickaxe") == INVENTORY_SIZE - 3  # The wood left fills 3 slots
+    assert book.craft(player, "wooden_pickaxe", None) == INVENTORY_SIZE - 3
+    assert player.inventory.room("wooden_pickaxe") == 0
+    assert not book.can_craft(player, "wooden_pickaxe") and not book.can_craft(player, "door")
+
+    # Recipe cycles cannot be crafted from nothing
+    book = CraftingBook({"a": {"b": 1}, "b": {"a": 1}})
+    assert not book.can_craft(player, "a")
+    print("✓ Crafting book works")
+
+
+def test_slot_inventory():
+    """Test inventory slots, stack limits, running totals and the version counter"""
+    inventory = Inventory(4)
+    assert inventory.add(ITEM_WOOD, STACK_LIMIT + 10) == 0
+    assert inventory.add(ITEM_STONE, 5) == 0
+    assert list(inventory.slots()) == [(ITEM_WOOD, STACK_LIMIT), (ITEM_WOOD, 10), (ITEM_STONE, 5), (None, 0)]
+    assert inventory.count(ITEM_WOOD) == STACK_LIMIT + 10
+
+    # Stacks are topped up before empty slots are used; what does not fit is returned
+    assert inventory.add(ITEM_WOOD, 3) == 0
+    assert inventory.quantities[1] == 13
+    assert inventory.add("wooden_pickaxe", 2) == 1
+    assert inventory.room(ITEM_STONE) == STACK_LIMIT - 5
+
+    # Removing empties the last stacks first and keeps the other slots in place
+    version = inventory.version
+    assert not inventory.remove(ITEM_STONE, 6)
+    assert inventory.version == version
+    assert inventory.remove(ITEM_WOOD, 13)
+    assert inventory.remove(ITEM_STONE, 5)
+    assert inventory.items == [ITEM_WOOD, None, None, "wooden_pickaxe"]
+    assert inventory.version == version + 2
+    assert ITEM_STONE not in inventory
+
+    # A batch is one change, and changes nothing unless all of it fits
+    assert not inventory.apply({ITEM_WOOD: -1, ITEM_APPLE: 3 * STACK_LIMIT})
+    assert inventory.count(ITEM_WOOD) == STACK_LIMIT and inventory.version == version + 2
+    assert inventory.apply({ITEM_WOOD: -STACK_LIMIT, ITEM_APPLE: 2 * STACK_LIMIT})
+    assert inventory.counts == {ITEM_APPLE: 2 * STACK_LIMIT, "wooden_pickaxe": 1}
+    assert inventory.version == version + 3
+
+    # Restoring a slot keeps to the stack limit and counts as a change
+    version = inventory.version
+    assert inventory.set_slot(3, "stone_sword", 3) == 2
+    assert inventory.counts == {ITEM_APPLE: 2 * STACK_LIMIT, "stone_sword": 1}
+    assert inventory.version == version + 1
+
+    # Eating goes through the same counter
+    player = Player(0, 0, SpriteManager())
+    player.add_to_inventory(ITEM_APPLE, 1)
+    version = player.inventory.version
+    player.hunger = 50
+    assert player.eat_food(ITEM_APPLE)
+    assert player.inventory.version == version + 1 and ITEM_APPLE not in player.inventory
+
+    # Mining with a full inventory leaves the tile in place
+    world = World(player.sprite_manager, seed=7)
+    player.current_level = LEVEL_CAVE
+    world.set_tile(5, 5, TILE_DIAMOND_ORE, LEVEL_CAVE)
+    for slot in range(INVENTORY_SIZE):
+        player.inventory.add(f"filler{slot}", STACK_LIMIT)
+    for _ in range(int(MINING_BASE_TIME) + 1):
+        assert not player.mine_tile(5, 5, world)
+    assert world.get_tile(5, 5, LEVEL_CAVE) == TILE_DIAMOND_ORE
+    assert ITEM_DIAMOND not in player.inventory
+
+    player.remove_from_inventory("filler0", STACK_LIMIT)
+    for _ in range(int(MINING_BASE_TIME) + 1):
+        if player.mine_tile(5, 5, world):
+            break
+    assert world.get_tile(5, 5, LEVEL_CAVE) == TILE_CAVE_FLOOR
+    assert player.inventory.count(ITEM_DIAMOND) == 1
+    print("✓ Slot inventory works")
+
+
+def test_frame_profiler_with_autosaves():
+    """Test that autosaves in the running loop stay inside the frame budget"""
+    from game import Game
+    from profiler import FRAME_BUDGET_MS
+    game = Game()
+    with tempfile.TemporaryDirectory() as directory:
+        game.world_cache = WorldCache(directory)
+        game.autosaver = savegame.Autosaver(os.path.join(directory, "auto.vcw"), interval=10)
+        game.new_game()
+        game.show_profile = True
+        for frame in range(60):
+            if frame % 7 == 0:
+                tile_x, tile_y = game.player.get_tile()
+                game.world.set_tile(tile_x + 3, tile_y, TILE_DIRT, LEVEL_JUNGLE)
+            game.profiler.begin_frame()
+            game.update()
+            game.draw()
+            game.profiler.end_frame()
+        game.autosaver.wait()
+
+        assert game.autosaver.saves >= 5 and game.autosaver.error is None
+        autosave = game.profiler.stats("autosave")
+        assert autosave["max_ms"] < FRAME_BUDGET_MS and autosave["hitches"] == 0
+        assert len(game.profiler.frame_times) == 60
+        lines = game.profiler.report()
+        assert lines[0].startswith("frame") and any(line.startswith("autosave") for line in lines)
+        assert game.profile_lines
+    pygame.display.quit()
+    print(f"✓ Frame profiler works (autosave max {autosave['max_ms']:.2f} ms)")
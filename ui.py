@@ -2,8 +2,56 @@
 UI system for HUD, inventory, crafting, and menus
 """
 
+from collections import OrderedDict
 import pygame
 from constants import *
+from crafting import CraftingBook
+
+_fonts = {}  # Shared font registry: {(name, size): Font}
+
+
+def get_font(size, name=None):
+    """Shared Font of a file name (None for the default font) and size, loaded once"""
+    font = _fonts.get((name, size))
+    if font is None:
+        font = _fonts[(name, size)] = pygame.font.Font(name, size)
+    return font
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (font, text, colour, antialias)"""
+
+    def __init__(self, max_entries=TEXT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()  # Oldest first
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        """Same as font.render(text, antialias, color), rendering each distinct text once"""
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        """Hit and miss counts, hit rate and number of cached surfaces"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.surfaces),
+        }
+
 
 class UI:
     """User interface manager"""
@@ -12,40 +60,102 @@ class UI:
         self.sprite_manager = sprite_manager
         self.font = None
         self.small_font = None
+        self.title_font = None
+        self.text = TextCache()  # Every label is drawn through this
+        self.crafting = CraftingBook()
+        self.crafting_hover = None  # Index of the recipe row under the mouse
+
+        # Retained HUD layer, the values it was drawn for and the areas it covers
+        self.hud = pygame.Surface((0, 0))
+        self.hud_key = None
+        self.hud_blits = []  # [(layer, position, area)]
+        self.hud_rebuilds = 0
 
     def init_fonts(self):
         """Initialize fonts (must be called after pygame.init())"""
-        self.font = pygame.font.Font(None, 24)
-        self.small_font = pygame.font.Font(None, 18)
+        self.font = get_font(24)
+        self.small_font = get_font(18)
+        self.title_font = get_font(72)
+
+    def draw_hud(self, screen, player, time, world=None, enemies=()):
+        """Draw the main HUD (health, hunger, inventory bar, and the minimap with a world)
+
+        All but the minimap is kept in a retained layer that is rebuilt only
+        when a value it shows changes, so most frames it is a single blits
+        call copying the areas the layer has drawn in.
+        """
+        is_night = time % DAY_CYCLE_LENGTH >= DAY_LENGTH
+        key = (int(player.health), int(player.max_health), int(player.hunger), int(player.max_hunger),
+               player.current_level, is_night, player.inventory.version, player.selected_slot)
+        if key != self.hud_key or self.hud.get_size() != screen.get_size():
+            self._build_hud(screen, player, is_night)
+            self.hud_key = key
+        screen.blits(self.hud_blits, doreturn=False)
+
+        # Minimap (top right, under the level and time)
+        if world is not None:
+            self._draw_minimap(screen, world, player, enemies)
+
+    def _build_hud(self, screen, player, is_night):
+        """Redraw the retained HUD layer (transparent where it shows the world)"""
+        hud = self.hud
+        if hud.get_size() != screen.get_size():
+            self.hud = hud = pygame.Surface(screen.get_size(), 0, screen)
+            hud.fill(HUD_COLORKEY)
+            hud.set_colorkey(HUD_COLORKEY)
+        else:
+            for _, _, area in self.hud_blits:
+                hud.fill(HUD_COLORKEY, area)
+        self.hud_rebuilds += 1
+        areas = []
 
-    def draw_hud(self, screen, player, time):
-        """Draw the main HUD (health, hunger, inventory bar)"""
         # Health bar
-        self._draw_bar(screen, 20, 20, 200, 20, player.health, player.max_health,
-                      HEALTH_RED, "Health")
+        areas.append(self._draw_bar(hud, 20, 20, 200, 20, player.health, player.max_health,
+                                    HEALTH_RED, "Health"))
 
         # Hunger bar
-        self._draw_bar(screen, 20, 50, 200, 20, player.hunger, player.max_hunger,
-                      HUNGER_ORANGE, "Hunger")
+        areas.append(self._draw_bar(hud, 20, 50, 200, 20, player.hunger, player.max_hunger,
+                                    HUNGER_ORANGE, "Hunger"))
 
         # Current level display
         level_name = "JUNGLE" if player.current_level == LEVEL_JUNGLE else "CAVE"
-        level_surface = self.font.render(f"Level: {level_name}", True, WHITE)
-        screen.blit(level_surface, (SCREEN_WIDTH - 150, 20))
+        level_surface = self.text.render(self.font, f"Level: {level_name}", True, WHITE)
+        areas.append(hud.blit(level_surface, (SCREEN_WIDTH - 150, 20)))
 
         # Time display (only in jungle)
         if player.current_level == LEVEL_JUNGLE:
-            cycle_time = time % DAY_CYCLE_LENGTH
-            is_night = cycle_time >= DAY_LENGTH
             time_text = "Night" if is_night else "Day"
-            time_surface = self.font.render(time_text, True, WHITE)
-            screen.blit(time_surface, (SCREEN_WIDTH - 150, 50))
+            time_surface = self.text.render(self.font, time_text, True, WHITE)
+            areas.append(hud.blit(time_surface, (SCREEN_WIDTH - 150, 50)))
 
         # Quick inventory (bottom of screen)
-        self._draw_quick_inventory(screen, player)
+        areas.append(self._draw_quick_inventory(hud, player))
+
+        # The HUD covers a few small areas: copying just those is far cheaper than the whole layer
+        self.hud_blits = [(hud, area.topleft, area) for area in areas]
+
+    def _draw_minimap(self, screen, world, player, enemies):
+        """Draw the cached minimap picture with markers for the player and nearby enemies"""
+        minimap = world.get_minimap(player.current_level)
+        image = minimap.image()
+        x, y = SCREEN_WIDTH - 20 - image.get_width(), 80
+        screen.blit(image, (x, y))
+
+        # Markers are the only per-frame drawing
+        portal_x, portal_y = world.cave_portal if player.current_level == LEVEL_CAVE else world.jungle_portal
+        screen.fill(PORTAL_PURPLE, (x + int(portal_x * minimap.scale) - 1, y + int(portal_y * minimap.scale) - 1, 3, 3))
+        player_x, player_y = player.get_tile()
+        for enemy in enemies:
+            enemy_x, enemy_y = int(enemy.x // TILE_SIZE), int(enemy.y // TILE_SIZE)
+            if (enemy.level == player.current_level and abs(enemy_x - player_x) <= MINIMAP_ENEMY_RANGE
+                    and abs(enemy_y - player_y) <= MINIMAP_ENEMY_RANGE):
+                screen.fill(HEALTH_RED, (x + int(enemy_x * minimap.scale) - 1,
+                                         y + int(enemy_y * minimap.scale) - 1, 3, 3))
+        screen.fill(WHITE, (x + int(player_x * minimap.scale) - 1, y + int(player_y * minimap.scale) - 1, 3, 3))
+        pygame.draw.rect(screen, WHITE, (x - 1, y - 1, image.get_width() + 2, image.get_height() + 2), 1)
 
     def _draw_bar(self, screen, x, y, width, height, value, max_value, color, label):
-        """Draw a status bar with label"""
+        """Draw a status bar with label, returning the area drawn"""
         # Background
         pygame.draw.rect(screen, DARK_GRAY, (x, y, width, height))
 
@@ -57,18 +167,26 @@ class UI:
         pygame.draw.rect(screen, WHITE, (x, y, width, height), 2)
 
         # Label
-        text = self.small_font.render(f"{label}: {int(value)}/{int(max_value)}", True, WHITE)
-        screen.blit(text, (x + 5, y + 2))
+        text = self.text.render(self.small_font, f"{label}: {int(value)}/{int(max_value)}", True, WHITE)
+        return screen.blit(text, (x + 5, y + 2)).union((x, y, width, height))
 
-    def _draw_quick_inventory(self, screen, player):
-        """Draw quick inventory bar at bottom of screen"""
+    def hotbar_rect(self):
+        """Screen area of the quick inventory bar"""
         slot_size = 50
-        slots = 8
-        start_x = (SCREEN_WIDTH - (slot_size * slots)) // 2
-        start_y = SCREEN_HEIGHT - slot_size - 20
+        return pygame.Rect((SCREEN_WIDTH - slot_size * HOTBAR_SLOTS) // 2, SCREEN_HEIGHT - slot_size - 20,
+                           slot_size * HOTBAR_SLOTS, slot_size)
 
-        # Get first 8 items from inventory
-        items = list(player.inventory.items())[:slots]
+    def _draw_quick_inventory(self, screen, player):
+        """Draw quick inventory bar at bottom of screen, returning the area drawn"""
+        area = self.hotbar_rect()
+        slot_size = area.height
+        slots = HOTBAR_SLOTS
+        start_x, start_y = area.topleft
+
+        # The hotbar shows the first slots of the inventory
+        items = player.inventory.items
+        quantities = player.inventory.quantities
+        icons = []  # Icons and quantities, blitted together after the slots
 
         for i in range(slots):
             x = start_x + i * slot_size
@@ -83,17 +201,17 @@ class UI:
             # Draw border
             pygame.draw.rect(screen, WHITE, (x, y, slot_size, slot_size), 2)
 
-            # Draw item if present
-            if i < len(items):
-                item_type, quantity = items[i]
-                sprite = self.sprite_manager.get_item_sprite(item_type)
-                # Scale sprite to fit slot
-                scaled_sprite = pygame.transform.scale(sprite, (slot_size - 10, slot_size - 10))
-                screen.blit(scaled_sprite, (x + 5, y + 5))
+            # Draw item if present (icon pre-scaled to fit the slot)
+            if items[i] is not None:
+                page, area = self.sprite_manager.icon_source(items[i], slot_size - 10)
+                icons.append((page, (x + 5, y + 5), area))
 
                 # Draw quantity
-                qty_text = self.small_font.render(str(quantity), True, WHITE)
-                screen.blit(qty_text, (x + slot_size - 20, y + slot_size - 20))
+                qty_text = self.text.render(self.small_font, str(quantities[i]), True, WHITE)
+                icons.append((qty_text, (x + slot_size - 20, y + slot_size - 20)))
+
+        screen.blits(icons, doreturn=False)
+        return area
 
     def draw_inventory(self, screen, player):
         """Draw full inventory screen"""
@@ -104,7 +222,7 @@ class UI:
         screen.blit(overlay, (0, 0))
 
         # Title
-        title = self.font.render("Inventory", True, WHITE)
+        title = self.text.render(self.font, "Inventory", True, WHITE)
         screen.blit(title, (SCREEN_WIDTH // 2 - 50, 50))
 
         # Draw inventory grid
@@ -113,9 +231,12 @@ class UI:
         start_x = 100
         start_y = 100
 
-        items = list(player.inventory.items())
+        icons = []  # Icons and labels, blitted together after the slots
+
+        for i, (item_type, quantity) in enumerate(player.inventory.slots()):
+            if item_type is None:
+                continue
 
-        for i, (item_type, quantity) in enumerate(items):
             row = i // slots_per_row
             col = i % slots_per_row
 
@@ -126,23 +247,37 @@ class UI:
             pygame.draw.rect(screen, (60, 60, 60), (x, y, slot_size, slot_size))
             pygame.draw.rect(screen, WHITE, (x, y, slot_size, slot_size), 2)
 
-            # Draw item sprite
-            sprite = self.sprite_manager.get_item_sprite(item_type)
-            scaled_sprite = pygame.transform.scale(sprite, (slot_size - 10, slot_size - 10))
-            screen.blit(scaled_sprite, (x + 5, y + 5))
+            # Draw item icon (pre-scaled to fit the slot)
+            page, area = self.sprite_manager.icon_source(item_type, slot_size - 10)
+            icons.append((page, (x + 5, y + 5), area))
 
             # Draw quantity
-            qty_text = self.small_font.render(str(quantity), True, WHITE)
-            screen.blit(qty_text, (x + slot_size - 20, y + slot_size - 20))
+            qty_text = self.text.render(self.small_font, str(quantity), True, WHITE)
+            icons.append((qty_text, (x + slot_size - 20, y + slot_size - 20)))
 
             # Draw item name
-            name_text = self.small_font.render(item_type, True, WHITE)
-            screen.blit(name_text, (x, y + slot_size + 2))
+            name_text = self.text.render(self.small_font, item_type, True, WHITE)
+            icons.append((name_text, (x, y + slot_size + 2)))
+
+        screen.blits(icons, doreturn=False)
 
         # Instructions
-        instruction = self.small_font.render("Press I or ESC to close", True, WHITE)
+        instruction = self.text.render(self.small_font, "Press I or ESC to close", True, WHITE)
         screen.blit(instruction, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 50))
 
+    def draw_profile(self, screen, lines):
+        """Draw the frame-time overlay in the top right corner"""
+        width = 360
+        x = SCREEN_WIDTH - width - 10
+        y = 100 + MINIMAP_SIZE  # Below the minimap
+        panel = pygame.Surface((width, len(lines) * 20 + 10))
+        panel.set_alpha(180)
+        panel.fill(BLACK)
+        screen.blit(panel, (x, y))
+        for i, line in enumerate(lines):
+            # Rendered directly: the numbers change too often to be worth caching
+            screen.blit(self.small_font.render(line, True, WHITE), (x + 5, y + 5 + i * 20))
+
     def draw_crafting(self, screen, player):
         """Draw crafting screen"""
         # Semi-transparent background
@@ -152,54 +287,51 @@ class UI:
         screen.blit(overlay, (0, 0))
 
         # Title
-        title = self.font.render("Crafting", True, WHITE)
+        title = self.text.render(self.font, "Crafting", True, WHITE)
         screen.blit(title, (SCREEN_WIDTH // 2 - 50, 50))
 
         # Draw available recipes
-        y = 120
-        for item_name, ingredients in RECIPES.items():
-            # Check if player can craft
-            can_craft = True
-            for ingredient, amount in ingredients.items():
-                if not player.has_items(ingredient, amount):
-                    can_craft = False
-                    break
+        for i, (item_name, ingredients) in enumerate(RECIPES.items()):
+            y = self.crafting_row_rect(i).y
+            if i == self.crafting_hover:
+                pygame.draw.rect(screen, (60, 60, 60), (90, y - 2, 520, 30))
+
+            # Green when it can be made, crafting missing parts on the way
+            can_craft = self.crafting.can_craft(player, item_name)
 
             # Draw recipe
             color = (0, 255, 0) if can_craft else (255, 100, 100)
-            recipe_text = self.font.render(f"{item_name}: ", True, color)
+            recipe_text = self.text.render(self.font, f"{item_name}: ", True, color)
             screen.blit(recipe_text, (100, y))
 
             # Draw ingredients
             ingredients_text = ", ".join([f"{amount}x {ingredient}" for ingredient, amount in ingredients.items()])
-            ing_surface = self.small_font.render(ingredients_text, True, WHITE)
+            ing_surface = self.text.render(self.small_font, ingredients_text, True, WHITE)
             screen.blit(ing_surface, (250, y + 3))
 
-            y += 35
-
         # Instructions
-        instruction = self.small_font.render("Press C or ESC to close", True, WHITE)
+        instruction = self.text.render(self.small_font, "Press C or ESC to close", True, WHITE)
         screen.blit(instruction, (SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 50))
 
-        instruction2 = self.small_font.render("Click on item to craft (green = can craft)", True, WHITE)
-        screen.blit(instruction2, (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT - 30))
+        instruction2 = self.text.render(self.small_font, "Click on item to craft, Shift+click to craft max (green = can craft)", True, WHITE)
+        screen.blit(instruction2, (SCREEN_WIDTH // 2 - instruction2.get_width() // 2, SCREEN_HEIGHT - 30))
 
     def draw_menu(self, screen):
         """Draw main menu"""
         screen.fill(BLACK)
 
         # Title
-        title_font = pygame.font.Font(None, 72)
-        title = title_font.render("Vampire Cave Crawler", True, PLAYER_RED)
+        title = self.text.render(self.title_font, "Vampire Cave Crawler", True, PLAYER_RED)
         screen.blit(title, (SCREEN_WIDTH // 2 - 350, 150))
 
         # Subtitle
-        subtitle = self.font.render("A Pixel Art Survival Game", True, WHITE)
+        subtitle = self.text.render(self.font, "A Pixel Art Survival Game", True, WHITE)
         screen.blit(subtitle, (SCREEN_WIDTH // 2 - 150, 230))
 
         # Instructions
         instructions = [
             "Press SPACE to Start",
+            "Press L to Load saved game",
             "",
             "Controls:",
             "WASD / Arrow Keys - Move",
@@ -215,7 +347,7 @@ class UI:
 
         y = 300
         for line in instructions:
-            text = self.small_font.render(line, True, WHITE)
+            text = self.text.render(self.small_font, line, True, WHITE)
             screen.blit(text, (SCREEN_WIDTH // 2 - 150, y))
             y += 25
 
@@ -228,69 +360,60 @@ class UI:
         screen.blit(overlay, (0, 0))
 
         # Pause text
-        pause_font = pygame.font.Font(None, 72)
-        pause_text = pause_font.render("PAUSED", True, WHITE)
+        pause_text = self.text.render(self.title_font, "PAUSED", True, WHITE)
         screen.blit(pause_text, (SCREEN_WIDTH // 2 - 120, SCREEN_HEIGHT // 2 - 50))
 
         # Instructions
-        instruction = self.font.render("Press ESC to resume", True, WHITE)
+        instruction = self.text.render(self.font, "Press ESC to resume", True, WHITE)
         screen.blit(instruction, (SCREEN_WIDTH // 2 - 120, SCREEN_HEIGHT // 2 + 20))
 
+        save_instruction = self.text.render(self.font, "Press S to save", True, WHITE)
+        screen.blit(save_instruction, (SCREEN_WIDTH // 2 - 120, SCREEN_HEIGHT // 2 + 50))
+
     def draw_death(self, screen):
         """Draw death screen"""
         screen.fill(BLACK)
 
         # Death text
-        death_font = pygame.font.Font(None, 72)
-        death_text = death_font.render("YOU DIED", True, HEALTH_RED)
+        death_text = self.text.render(self.title_font, "YOU DIED", True, HEALTH_RED)
         screen.blit(death_text, (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 - 100))
 
         # Instructions
-        instruction = self.font.render("Press R to Respawn", True, WHITE)
+        instruction = self.text.render(self.font, "Press R to Respawn", True, WHITE)
         screen.blit(instruction, (SCREEN_WIDTH // 2 - 120, SCREEN_HEIGHT // 2))
 
-        menu_instruction = self.font.render("Press ESC for Menu", True, WHITE)
+        menu_instruction = self.text.render(self.font, "Press ESC for Menu", True, WHITE)
         screen.blit(menu_instruction, (SCREEN_WIDTH // 2 - 120, SCREEN_HEIGHT // 2 + 40))
 
-    def draw_crosshair(self, screen, mouse_x, mouse_y, camera_x, camera_y):
-        """Draw mining crosshair"""
+    def draw_crosshair(self, screen, mouse_x, mouse_y, camera_x, camera_y, zoom=1):
+        """Draw mining crosshair (zoom is world pixels per screen pixel)"""
         # Convert mouse position to tile coordinates
-        world_x = mouse_x + camera_x
-        world_y = mouse_y + camera_y
+        world_x = mouse_x * zoom + camera_x
+        world_y = mouse_y * zoom + camera_y
         tile_x = int(world_x // TILE_SIZE)
         tile_y = int(world_y // TILE_SIZE)
 
         # Draw highlight on tile
-        screen_x = tile_x * TILE_SIZE - camera_x
-        screen_y = tile_y * TILE_SIZE - camera_y
+        size = TILE_SIZE // zoom
+        screen_x = (tile_x * TILE_SIZE - camera_x) / zoom
+        screen_y = (tile_y * TILE_SIZE - camera_y) / zoom
 
         # Semi-transparent white square
-        highlight = pygame.Surface((TILE_SIZE, TILE_SIZE))
+        highlight = pygame.Surface((size, size))
         highlight.set_alpha(100)
         highlight.fill(WHITE)
         screen.blit(highlight, (screen_x, screen_y))
 
         # Border
-        pygame.draw.rect(screen, WHITE, (screen_x, screen_y, TILE_SIZE, TILE_SIZE), 2)
+        pygame.draw.rect(screen, WHITE, (screen_x, screen_y, size, size), 1 if zoom > 1 else 2)
 
-    def craft_item(self, item_name, player):
-        """Attempt to craft an item"""
+    def craft_item(self, item_name, player, quantity=1):
+        """Attempt to craft quantity of an item (None = as many as possible), with any missing parts"""
         if item_name not in RECIPES:
             return False
 
-        recipe = RECIPES[item_name]
-
-        # Check if player has all ingredients
-        for ingredient, amount in recipe.items():
-            if not player.has_items(ingredient, amount):
-                return False
-
-        # Remove ingredients
-        for ingredient, amount in recipe.items():
-            player.remove_from_inventory(ingredient, amount)
-
-        # Add crafted item
-        player.add_to_inventory(item_name, 1)
+        if not self.crafting.craft(player, item_name, quantity):
+            return False
 
         # Update player tool if it's a pickaxe
         if "pickaxe" in item_name:
@@ -305,18 +428,38 @@ class UI:
 
         return True
 
-    def handle_crafting_click(self, mouse_pos, player):
-        """Handle mouse click on crafting screen"""
-        mouse_x, mouse_y = mouse_pos
-
-        # Calculate which recipe was clicked
-        y = 120
-        recipe_height = 35
+    def crafting_row_rect(self, index):
+        """Screen area of a recipe row on the crafting screen"""
+        return pygame.Rect(0, 120 + index * 35, SCREEN_WIDTH, 35)
 
-        for i, (item_name, ingredients) in enumerate(RECIPES.items()):
-            if 100 <= mouse_x <= 600 and y <= mouse_y <= y + recipe_height:
-                # Clicked on this recipe
-                return self.craft_item(item_name, player)
-            y += recipe_height
-
-        return False
+    def crafting_row_at(self, mouse_pos):
+        """Index of the recipe row under a screen position, or None"""
+        mouse_x, mouse_y = mouse_pos
+        if not (100 <= mouse_x <= 600 and mouse_y >= 120):
+            return None
+        index = (mouse_y - 120) // 35
+        return index if index < len(RECIPES) else None
+
+    def set_crafting_hover(self, mouse_pos):
+        """Highlight the recipe row under the mouse, returning the screen areas that changed"""
+        index = self.crafting_row_at(mouse_pos)
+        if index == self.crafting_hover:
+            return []
+        rows = [row for row in (self.crafting_hover, index) if row is not None]
+        self.crafting_hover = index
+        return [self.crafting_row_rect(row) for row in rows]
+
+    def handle_crafting_click(self, mouse_pos, player, quantity=1):
+        """Handle mouse click on crafting screen, returning the screen areas that changed (none if nothing was made)"""
+        index = self.crafting_row_at(mouse_pos)
+        if index is None:
+            return []
+
+        # Rows whose colour the new inventory changes, and the hotbar, need redrawing too
+        names = list(RECIPES)
+        before = [self.crafting.can_craft(player, item_name) for item_name in names]
+        if not self.craft_item(names[index], player, quantity):
+            return []
+        changed = [self.crafting_row_rect(i) for i, item_name in enumerate(names)
+                   if i == index or self.crafting.can_craft(player, item_name) != before[i]]
+        return changed + [self.hotbar_rect()]
@@ -6,263 +6,265 @@ Generates two levels: Jungle and Cave
 import random
 import pygame
 from constants import *
+from lighting import Lightmap
+from render import ChunkSurfaceCache, LightLayer, Minimap, WorldLayer
+from worldgen import (generate_chunk, generate_chunks, stage_rng,
+                      jungle_portal_position, cave_portal_position)
+
+# Walkable-tile buckets per chunk row (and column)
+BUCKETS_PER_ROW = CHUNK_SIZE // WALKABLE_BUCKET_SIZE
+
+
+def _bucket_index(i):
+    """Walkable bucket of a chunk-local tile index"""
+    local_x, local_y = i % CHUNK_SIZE, i // CHUNK_SIZE
+    return (local_y // WALKABLE_BUCKET_SIZE) * BUCKETS_PER_ROW + local_x // WALKABLE_BUCKET_SIZE
+
+
+def _daylight(cycle_time):
+    """Brightness (0 to 1) of the jungle at a point of the day/night cycle"""
+    if cycle_time < DAY_LENGTH:
+        return 1.0
+    progress = (cycle_time - DAY_LENGTH) / NIGHT_LENGTH
+    if progress < 0.1:
+        return 1.0 - progress / 0.1  # Sunset
+    if progress > 0.9:
+        return (progress - 0.9) / 0.1  # Sunrise
+    return 0.0
+
+
+def _lerp_color(color1, color2, t):
+    """Linear interpolation between two colors"""
+    return tuple(int(a + (b - a) * t) for a, b in zip(color1, color2))
+
+
+# Light level for every frame of the day/night cycle, and the sky at each level
+LIGHT_CYCLE = bytes(round(_daylight(cycle_time) * (LIGHT_LEVELS - 1))
+                    for cycle_time in range(DAY_CYCLE_LENGTH))
+SKY_COLORS = [_lerp_color(NIGHT_SKY, SKY_BLUE, light / (LIGHT_LEVELS - 1))
+              for light in range(LIGHT_LEVELS)]
+
+
+def _find_region(parent, label):
+    """Root of a region label in a union-find parent list (with path halving)"""
+    while parent[label] != label:
+        parent[label] = parent[parent[label]]
+        label = parent[label]
+    return label
+
+
+def _union_regions(parent, a, b):
+    """Merge the regions of two labels, keeping the smaller root"""
+    a, b = _find_region(parent, a), _find_region(parent, b)
+    if a != b:
+        parent[max(a, b)] = min(a, b)
+
+
+class Chunk:
+    """A CHUNK_SIZE x CHUNK_SIZE block of tiles, stored as a flat row-major buffer"""
+
+    def __init__(self, chunk_x, chunk_y, tiles):
+        self.chunk_x = chunk_x
+        self.chunk_y = chunk_y
+        self.tiles = tiles  # bytearray, indexed by local_y * CHUNK_SIZE + local_x
+        self.solid = tiles.translate(SOLID_TABLE)  # 1 where the tile blocks movement, same layout
+        self.modified = False  # Set once set_tile changes anything in the chunk
+
+        # Walkable-tile index, built by World on first use: a list of local
+        # indices per bucket, and each tile's position in its bucket (-1 if solid)
+        self.walkable = None
+        self.walkable_slot = None
+
+        # Region label of each tile (-1 if not walkable), set by World.region_id
+        # once the chunk is loaded; labels are the chunk's own connected parts
+        self.region_labels = None
+        self.region_count = 0  # How many labels region_labels uses
+
+        # Edge mask of each autotiled tile (EDGE_* bits for sides facing another
+        # tile group, 0 elsewhere), set by World.tile_edges
+        self.edges = None
+
 
 class World:
     """Procedurally generated tile-based world with multiple levels"""
 
-    def __init__(self, sprite_manager, seed=None):
+    def __init__(self, sprite_manager, seed=None, chunk_source=None, cache=None):
         self.sprite_manager = sprite_manager
         self.seed = seed if seed else random.randint(0, 999999)
-        random.seed(self.seed)
 
-        # Create world grids for each level
+        # Optional store of previously saved chunks (anything with a
+        # read(level, chunk_x, chunk_y) method returning tiles or None)
+        self.chunk_source = chunk_source
+
+        # World size in tiles, and in chunks
         self.width = WORLD_WIDTH
         self.height = WORLD_HEIGHT
+        self.chunks_x = (self.width + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self.chunks_y = (self.height + CHUNK_SIZE - 1) // CHUNK_SIZE
 
         # Two levels: jungle (surface) and cave (underground)
-        self.jungle_tiles = [[TILE_GRASS for _ in range(self.height)] for _ in range(self.width)]
-        self.cave_tiles = [[TILE_CAVE_FLOOR for _ in range(self.height)] for _ in range(self.width)]
-
-        # Portal positions
-        self.jungle_portal = None  # (x, y) of cave entrance
-        self.cave_portal = None  # (x, y) of cave exit
-
-        # Generate both levels
-        self._generate_jungle()
-        self._generate_cave()
+        # Chunks are generated on first access: {level: {(chunk_x, chunk_y): Chunk}}
+        self.chunks = {
+            LEVEL_JUNGLE: {},
+            LEVEL_CAVE: {},
+        }
+
+        # Chunks changed by set_tile since the last save: {(level, chunk_x, chunk_y)}
+        self.dirty_chunks = set()
+
+        # Pristine chunks from the on-disk world cache, and the chunks this
+        # world had to generate itself (candidates for adding to the cache)
+        self.cache_source = None
+        if cache is not None:
+            self.cache_source = cache.open(self.seed, self.width, self.height)
+        self.generated_chunks = set()
+
+        # Union-find parents of the connected walkable regions of each level,
+        # how many loaded chunks have been labelled into them, and how many
+        # labels those chunks still use (relabelled chunks leave old ones behind)
+        self.region_parents = {
+            LEVEL_JUNGLE: [],
+            LEVEL_CAVE: [],
+        }
+        self.labelled_chunks = {
+            LEVEL_JUNGLE: 0,
+            LEVEL_CAVE: 0,
+        }
+        self.live_labels = {
+            LEVEL_JUNGLE: 0,
+            LEVEL_CAVE: 0,
+        }
+
+        # Pre-rendered chunk surfaces and the scrolling world layer, created on first draw
+        self.surface_cache = None
+        self.layer = None
+
+        # The cave's lightmap and its darkness layer, created when the cave is first drawn
+        self.lightmap = None
+        self.light_layer = None
+
+        # Minimap of each level, created when first shown: {level: Minimap}
+        self.minimaps = {}
+
+        # Portal positions (known up front, without generating anything)
+        self.jungle_portal = jungle_portal_position(self.width, self.height)  # (x, y) of cave entrance
+        self.cave_portal = cave_portal_position(self.seed, self.width, self.height)  # (x, y) of cave exit
 
         # Find spawn point (in jungle)
-        self.spawn_x, self.spawn_y = self._find_spawn_point()
-
-    def _generate_jungle(self):
-        """Generate the jungle level (surface)"""
-        # Fill with grass
-        for x in range(self.width):
-            for y in range(self.height):
-                self.jungle_tiles[x][y] = TILE_GRASS
-
-        # Add water bodies
-        self._add_water_bodies()
-
-        # Add trees
-        self._add_trees()
-
-        # Add bushes
-        self._add_bushes()
-
-        # Add flowers (decoration)
-        self._add_flowers()
-
-        # Add cave entrance portal (center of map)
-        portal_x = self.width // 2
-        portal_y = self.height // 2
-        self.jungle_portal = (portal_x, portal_y)
-        self.jungle_tiles[portal_x][portal_y] = TILE_CAVE_ENTRANCE
-
-    def _add_water_bodies(self):
-        """Add water bodies to jungle"""
-        num_lakes = 5
-
-        for _ in range(num_lakes):
-            # Random lake center
-            cx = random.randint(10, self.width - 10)
-            cy = random.randint(10, self.height - 10)
-
-            # Lake size
-            radius = random.randint(3, 7)
-
-            # Create circular lake
-            for dx in range(-radius, radius + 1):
-                for dy in range(-radius, radius + 1):
-                    if dx * dx + dy * dy <= radius * radius:
-                        x, y = cx + dx, cy + dy
-                        if 0 <= x < self.width and 0 <= y < self.height:
-                            self.jungle_tiles[x][y] = TILE_WATER
-
-    def _add_trees(self):
-        """Add trees to jungle"""
-        # Dense forest areas
-        num_forests = 10
-
-        for _ in range(num_forests):
-            # Forest center
-            cx = random.randint(5, self.width - 5)
-            cy = random.randint(5, self.height - 5)
-
-            # Forest size
-            size = random.randint(5, 12)
-
-            for _ in range(size * size // 2):
-                # Random position near center
-                x = cx + random.randint(-size, size)
-                y = cy + random.randint(-size, size)
-
-                if 0 <= x < self.width and 0 <= y < self.height:
-                    if self.jungle_tiles[x][y] == TILE_GRASS:
-                        self.jungle_tiles[x][y] = TILE_TREE
-
-        # Scattered trees
-        for _ in range(200):
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-
-            if self.jungle_tiles[x][y] == TILE_GRASS:
-                self.jungle_tiles[x][y] = TILE_TREE
-
-    def _add_bushes(self):
-        """Add bushes to jungle"""
-        for _ in range(150):
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-
-            if self.jungle_tiles[x][y] == TILE_GRASS:
-                self.jungle_tiles[x][y] = TILE_BUSH
-
-    def _add_flowers(self):
-        """Add decorative flowers to jungle"""
-        for _ in range(100):
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-
-            if self.jungle_tiles[x][y] == TILE_GRASS:
-                self.jungle_tiles[x][y] = TILE_FLOWER
-
-    def _generate_cave(self):
-        """Generate the cave level (underground)"""
-        # Fill with cave floor
-        for x in range(self.width):
-            for y in range(self.height):
-                self.cave_tiles[x][y] = TILE_CAVE_FLOOR
-
-        # Generate cave walls using cellular automata
-        self._generate_cave_walls()
-
-        # Add stone deposits (minable)
-        self._add_stone_deposits()
-
-        # Add ore deposits
-        self._add_ore_deposits()
-
-        # Add cave exit portal (near center)
-        portal_x = self.width // 2 + random.randint(-5, 5)
-        portal_y = self.height // 2 + random.randint(-5, 5)
-        self.cave_portal = (portal_x, portal_y)
-        self.cave_tiles[portal_x][portal_y] = TILE_CAVE_EXIT
-        # Clear area around portal
-        for dx in range(-2, 3):
-            for dy in range(-2, 3):
-                x, y = portal_x + dx, portal_y + dy
-                if 0 <= x < self.width and 0 <= y < self.height:
-                    if self.cave_tiles[x][y] == TILE_CAVE_WALL:
-                        self.cave_tiles[x][y] = TILE_CAVE_FLOOR
-
-    def _generate_cave_walls(self):
-        """Generate cave walls using cellular automata"""
-        # Initial random fill
-        for x in range(self.width):
-            for y in range(self.height):
-                if random.random() < 0.45:
-                    self.cave_tiles[x][y] = TILE_CAVE_WALL
-
-        # Apply cellular automata smoothing
-        for _ in range(4):
-            new_tiles = [[self.cave_tiles[x][y] for y in range(self.height)]
-                        for x in range(self.width)]
-
-            for x in range(1, self.width - 1):
-                for y in range(1, self.height - 1):
-                    # Count wall neighbors
-                    wall_count = 0
-                    for dx in [-1, 0, 1]:
-                        for dy in [-1, 0, 1]:
-                            if dx == 0 and dy == 0:
-                                continue
-                            if self.cave_tiles[x + dx][y + dy] == TILE_CAVE_WALL:
-                                wall_count += 1
-
-                    # Apply rules
-                    if wall_count > 4:
-                        new_tiles[x][y] = TILE_CAVE_WALL
-                    elif wall_count < 4:
-                        new_tiles[x][y] = TILE_CAVE_FLOOR
-
-            self.cave_tiles = new_tiles
-
-        # Add border walls
-        for x in range(self.width):
-            self.cave_tiles[x][0] = TILE_CAVE_WALL
-            self.cave_tiles[x][self.height - 1] = TILE_CAVE_WALL
-        for y in range(self.height):
-            self.cave_tiles[0][y] = TILE_CAVE_WALL
-            self.cave_tiles[self.width - 1][y] = TILE_CAVE_WALL
-
-    def _add_stone_deposits(self):
-        """Add minable stone to cave"""
-        for _ in range(100):
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-
-            if self.cave_tiles[x][y] == TILE_CAVE_WALL:
-                # Create small stone deposit
-                size = random.randint(2, 5)
-                for _ in range(size):
-                    if 0 <= x < self.width and 0 <= y < self.height:
-                        if self.cave_tiles[x][y] == TILE_CAVE_WALL:
-                            self.cave_tiles[x][y] = TILE_STONE
-
-                    # Move to adjacent tile
-                    x += random.choice([-1, 0, 1])
-                    y += random.choice([-1, 0, 1])
-
-    def _add_ore_deposits(self):
-        """Add ore deposits to cave"""
-        # Iron ore (more common)
-        for _ in range(80):
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-
-            if self.cave_tiles[x][y] in [TILE_CAVE_WALL, TILE_STONE]:
-                # Create small iron vein
-                size = random.randint(1, 3)
-                for _ in range(size):
-                    if 0 <= x < self.width and 0 <= y < self.height:
-                        if self.cave_tiles[x][y] in [TILE_CAVE_WALL, TILE_STONE]:
-                            self.cave_tiles[x][y] = TILE_IRON_ORE
-
-                    x += random.choice([-1, 0, 1])
-                    y += random.choice([-1, 0, 1])
-
-        # Diamond ore (rare)
-        for _ in range(20):
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-
-            if self.cave_tiles[x][y] in [TILE_CAVE_WALL, TILE_STONE]:
-                # Single diamond or small cluster
-                size = random.randint(1, 2)
-                for _ in range(size):
-                    if 0 <= x < self.width and 0 <= y < self.height:
-                        if self.cave_tiles[x][y] in [TILE_CAVE_WALL, TILE_STONE]:
-                            self.cave_tiles[x][y] = TILE_DIAMOND_ORE
-
-                    x += random.choice([-1, 0, 1])
-                    y += random.choice([-1, 0, 1])
+        if self.cache_source is not None:
+            self.spawn_x, self.spawn_y = self.cache_source.spawn
+        else:
+            self.spawn_x, self.spawn_y = self._find_spawn_point()
+
+    def get_chunk(self, level, chunk_x, chunk_y):
+        """Get a chunk of a level, generating it the first time it is touched"""
+        chunks = self.chunks[level]
+        chunk = chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            tiles = self._read_stored_chunk(level, chunk_x, chunk_y)
+            if tiles is None:
+                tiles = generate_chunk(self.seed, level, chunk_x, chunk_y, self.width, self.height)
+                self.generated_chunks.add((level, chunk_x, chunk_y))
+            chunk = self._add_chunk(level, chunk_x, chunk_y, tiles)
+        return chunk
+
+    def peek_chunk(self, level, chunk_x, chunk_y):
+        """A chunk of a level if it has been loaded, else None (never generates anything)"""
+        return self.chunks[level].get((chunk_x, chunk_y))
+
+    def _add_chunk(self, level, chunk_x, chunk_y, tiles):
+        """Store a newly loaded chunk, and patch what was worked out without it"""
+        chunk = self.chunks[level][(chunk_x, chunk_y)] = Chunk(chunk_x, chunk_y, tiles)
+
+        # Tiles on the facing borders of neighbours that already have edge masks
+        base_x, base_y = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+        for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            neighbour = self.chunks[level].get((chunk_x + dx, chunk_y + dy))
+            if neighbour is None or neighbour.edges is None:
+                continue
+            if dx:
+                x = base_x - 1 if dx < 0 else base_x + CHUNK_SIZE
+                border = [(x, base_y + y) for y in range(CHUNK_SIZE)]
+            else:
+                y = base_y - 1 if dy < 0 else base_y + CHUNK_SIZE
+                border = [(base_x + x, y) for x in range(CHUNK_SIZE)]
+            for x, y in border:
+                self._refresh_edge(level, x, y)
+
+        if self.lightmap is not None and level == self.lightmap.level:
+            self.lightmap.chunk_loaded(chunk_x, chunk_y)
+        return chunk
+
+    def _read_stored_chunk(self, level, chunk_x, chunk_y):
+        """Tiles of a chunk from the save file, then the world cache, or None"""
+        for source in (self.chunk_source, self.cache_source):
+            if source is not None:
+                try:
+                    tiles = source.read(level, chunk_x, chunk_y)
+                except ValueError:
+                    continue  # A corrupt stored chunk is regenerated rather than stopping the game
+                if tiles is not None:
+                    return tiles
+        return None
+
+    def close(self):
+        """Close the save file and world cache entry the world reads chunks from"""
+        for source in (self.chunk_source, self.cache_source):
+            if source is not None:
+                source.close()
+        self.chunk_source = self.cache_source = None
+
+    def pregenerate(self, levels=(LEVEL_JUNGLE, LEVEL_CAVE), region=None, workers=None):
+        """Generate every missing chunk of the given levels up front, in parallel
+
+        region is an optional (chunk_x0, chunk_y0, chunk_x1, chunk_y1) range
+        (end exclusive); by default the whole world is generated. The result is
+        the same for any number of workers.
+        """
+        if region is None:
+            region = (0, 0, self.chunks_x, self.chunks_y)
+        chunk_x0, chunk_y0, chunk_x1, chunk_y1 = region
+
+        for level in levels:
+            chunks = self.chunks[level]
+            missing = []
+            for chunk_y in range(chunk_y0, chunk_y1):
+                for chunk_x in range(chunk_x0, chunk_x1):
+                    if (chunk_x, chunk_y) in chunks:
+                        continue
+                    tiles = self._read_stored_chunk(level, chunk_x, chunk_y)
+                    if tiles is not None:
+                        self._add_chunk(level, chunk_x, chunk_y, tiles)
+                    else:
+                        missing.append((chunk_x, chunk_y))
+            generated = generate_chunks(self.seed, level, missing,
+                                        self.width, self.height, workers)
+            for (chunk_x, chunk_y), tiles in generated.items():
+                self._add_chunk(level, chunk_x, chunk_y, tiles)
+                self.generated_chunks.add((level, chunk_x, chunk_y))
+
+    def loaded_chunk_count(self, level=None):
+        """Number of chunks generated so far (for one level, or all levels)"""
+        if level is not None:
+            return len(self.chunks[level])
+        return sum(len(chunks) for chunks in self.chunks.values())
 
     def _find_spawn_point(self):
         """Find a safe spawn point in the jungle"""
+        rng = stage_rng(self.seed, LEVEL_JUNGLE, "spawn")
+
         # Start near the top-left quadrant
         for attempt in range(100):
-            x = random.randint(self.width // 4, self.width // 2)
-            y = random.randint(self.height // 4, self.height // 2)
+            x = rng.randint(self.width // 4, self.width // 2)
+            y = rng.randint(self.height // 4, self.height // 2)
 
-            if self.jungle_tiles[x][y] == TILE_GRASS:
+            if self.get_tile(x, y, LEVEL_JUNGLE) == TILE_GRASS:
                 return x * TILE_SIZE, y * TILE_SIZE
 
-        # Fallback to any grass tile
-        for x in range(self.width):
-            for y in range(self.height):
-                if self.jungle_tiles[x][y] == TILE_GRASS:
-                    return x * TILE_SIZE, y * TILE_SIZE
+        # Fallback to any walkable tile
+        tile = self.sample_walkable(LEVEL_JUNGLE, rng)
+        if tile is not None:
+            return tile[0] * TILE_SIZE, tile[1] * TILE_SIZE
 
         return (self.width // 2) * TILE_SIZE, (self.height // 2) * TILE_SIZE
 
@@ -271,20 +273,348 @@ class World:
         if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
             return TILE_CAVE_WALL if level == LEVEL_CAVE else TILE_WATER
 
-        if level == LEVEL_JUNGLE:
-            return self.jungle_tiles[tile_x][tile_y]
-        elif level == LEVEL_CAVE:
-            return self.cave_tiles[tile_x][tile_y]
-        else:
+        chunks = self.chunks.get(level)
+        if chunks is None:
             return TILE_AIR
+        chunk = chunks.get((tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE))
+        if chunk is None:
+            chunk = self.get_chunk(level, tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE)
+        return chunk.tiles[(tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE]
+
+    def peek_tile(self, tile_x, tile_y, level):
+        """Like get_tile, but None for tiles of chunks that have not been loaded yet"""
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return TILE_CAVE_WALL if level == LEVEL_CAVE else TILE_WATER
+        chunk = self.chunks[level].get((tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE))
+        if chunk is None:
+            return None
+        return chunk.tiles[(tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE]
+
+    def is_solid(self, tile_x, tile_y, level):
+        """Check the solidity mask (everything outside the world is solid)"""
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return True
+
+        chunk = self.chunks[level].get((tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE))
+        if chunk is None:
+            chunk = self.get_chunk(level, tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE)
+        return chunk.solid[(tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE] == 1
 
     def set_tile(self, tile_x, tile_y, tile_type, level):
         """Set tile at grid coordinates for a specific level"""
-        if 0 <= tile_x < self.width and 0 <= tile_y < self.height:
-            if level == LEVEL_JUNGLE:
-                self.jungle_tiles[tile_x][tile_y] = tile_type
-            elif level == LEVEL_CAVE:
-                self.cave_tiles[tile_x][tile_y] = tile_type
+        if 0 <= tile_x < self.width and 0 <= tile_y < self.height and level in self.chunks:
+            chunk_x, chunk_y = tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE
+            chunk = self.get_chunk(level, chunk_x, chunk_y)
+            i = (tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE
+            was_solid = chunk.solid[i]
+            chunk.tiles[i] = tile_type
+            chunk.solid[i] = SOLID_TABLE[tile_type]
+            chunk.modified = True
+            self.dirty_chunks.add((level, chunk_x, chunk_y))
+            if self.surface_cache is not None:
+                self.surface_cache.invalidate(level, chunk_x, chunk_y)
+                self.layer.invalidate_tile(level, tile_x, tile_y)
+            self._update_edges(level, tile_x, tile_y)
+            if level in self.minimaps:
+                self.minimaps[level].set_tile(tile_x, tile_y, tile_type)
+            if self.lightmap is not None and level == self.lightmap.level:
+                self.lightmap.tile_changed(tile_x, tile_y)
+            if chunk.solid[i] != was_solid:
+                if chunk.walkable is not None:
+                    self._update_walkable(chunk, i)
+                if chunk.region_labels is not None:
+                    self._update_regions(level, chunk, i)
+
+    def tile_edges(self, level, chunk_x, chunk_y):
+        """Edge masks of a chunk's tiles, computed on first use"""
+        chunk = self.get_chunk(level, chunk_x, chunk_y)
+        if chunk.edges is None:
+            # Tile groups with a one-tile border from the neighbouring chunks
+            size = CHUNK_SIZE + 2
+            base_x, base_y = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+            groups = bytearray(size * size)
+            for y in range(CHUNK_SIZE):
+                row = (y + 1) * size
+                groups[row + 1:row + 1 + CHUNK_SIZE] = chunk.tiles[
+                    y * CHUNK_SIZE:(y + 1) * CHUNK_SIZE].translate(AUTOTILE_GROUP_TABLE)
+            for y in range(-1, CHUNK_SIZE + 1):
+                row = (y + 1) * size
+                for x in (-1, CHUNK_SIZE) if 0 <= y < CHUNK_SIZE else range(-1, CHUNK_SIZE + 1):
+                    tile = self.peek_tile(base_x + x, base_y + y, level)
+                    if tile is None:
+                        # Not loaded yet: no edge against it until it loads and _add_chunk fixes this
+                        inside = (min(max(y, 0), CHUNK_SIZE - 1) + 1) * size + min(max(x, 0), CHUNK_SIZE - 1) + 1
+                        groups[row + x + 1] = groups[inside]
+                    else:
+                        groups[row + x + 1] = AUTOTILE_GROUP_TABLE[tile]
+
+            edges = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+            tiles = chunk.tiles
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                if AUTOTILED_TABLE[tiles[i]]:
+                    p = (i // CHUNK_SIZE + 1) * size + i % CHUNK_SIZE + 1
+                    group = groups[p]
+                    edges[i] = ((groups[p - size] != group) * EDGE_NORTH | (groups[p + 1] != group) * EDGE_EAST
+                                | (groups[p + size] != group) * EDGE_SOUTH | (groups[p - 1] != group) * EDGE_WEST)
+            chunk.edges = edges
+        return chunk.edges
+
+    def _edge_mask(self, level, tile_x, tile_y):
+        """Edge mask of one tile from its loaded neighbours"""
+        tile = self.get_tile(tile_x, tile_y, level)
+        if not AUTOTILED_TABLE[tile]:
+            return 0
+        group = AUTOTILE_GROUP_TABLE[tile]
+        mask = 0
+        for bit, dx, dy in ((EDGE_NORTH, 0, -1), (EDGE_EAST, 1, 0), (EDGE_SOUTH, 0, 1), (EDGE_WEST, -1, 0)):
+            neighbour = self.peek_tile(tile_x + dx, tile_y + dy, level)
+            if neighbour is not None and AUTOTILE_GROUP_TABLE[neighbour] != group:
+                mask |= bit
+        return mask
+
+    def _update_edges(self, level, tile_x, tile_y):
+        """Recompute the edge masks of a changed tile and its neighbours, redrawing those that change"""
+        for x, y in ((tile_x, tile_y), (tile_x, tile_y - 1), (tile_x + 1, tile_y),
+                     (tile_x, tile_y + 1), (tile_x - 1, tile_y)):
+            self._refresh_edge(level, x, y)
+
+    def _refresh_edge(self, level, tile_x, tile_y):
+        """Recompute one tile's edge mask, if its chunk has them, redrawing it when it changes"""
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return
+        chunk_x, chunk_y = tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE
+        chunk = self.chunks[level].get((chunk_x, chunk_y))
+        if chunk is None or chunk.edges is None:
+            return
+        i = (tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE
+        mask = self._edge_mask(level, tile_x, tile_y)
+        if mask != chunk.edges[i]:
+            chunk.edges[i] = mask
+            if self.surface_cache is not None:
+                self.surface_cache.invalidate(level, chunk_x, chunk_y)
+                self.layer.invalidate_tile(level, tile_x, tile_y)
+
+    def _walkable_index(self, level, chunk_x, chunk_y):
+        """Get a chunk with its walkable-tile index built"""
+        chunk = self.get_chunk(level, chunk_x, chunk_y)
+        if chunk.walkable is None:
+            buckets = [[] for _ in range(BUCKETS_PER_ROW * BUCKETS_PER_ROW)]
+            slots = [-1] * (CHUNK_SIZE * CHUNK_SIZE)
+            solid = chunk.solid
+
+            # Tiles of edge chunks that lie outside the world are never walkable
+            width = min(CHUNK_SIZE, self.width - chunk_x * CHUNK_SIZE)
+            height = min(CHUNK_SIZE, self.height - chunk_y * CHUNK_SIZE)
+            for local_y in range(height):
+                for i in range(local_y * CHUNK_SIZE, local_y * CHUNK_SIZE + width):
+                    if not solid[i]:
+                        bucket = buckets[_bucket_index(i)]
+                        slots[i] = len(bucket)
+                        bucket.append(i)
+
+            chunk.walkable = buckets
+            chunk.walkable_slot = slots
+        return chunk
+
+    def _update_walkable(self, chunk, i):
+        """Add or remove a tile whose solidity changed, in constant time"""
+        bucket = chunk.walkable[_bucket_index(i)]
+        slots = chunk.walkable_slot
+        if chunk.solid[i]:
+            # Move the bucket's last tile into the freed slot
+            slot = slots[i]
+            last = bucket.pop()
+            if last != i:
+                bucket[slot] = last
+                slots[last] = slot
+            slots[i] = -1
+        else:
+            slots[i] = len(bucket)
+            bucket.append(i)
+
+    def walkable_count(self, level, chunk_x, chunk_y):
+        """Number of walkable tiles in a chunk"""
+        return sum(len(bucket) for bucket in self._walkable_index(level, chunk_x, chunk_y).walkable)
+
+    def sample_walkable(self, level, rng=random, chunks=None):
+        """Uniformly random walkable tile (x, y) of a level, or None if there is none
+
+        chunks optionally limits the choice to a collection of (chunk_x, chunk_y).
+        """
+        if chunks is None:
+            chunks = [(chunk_x, chunk_y) for chunk_y in range(self.chunks_y)
+                      for chunk_x in range(self.chunks_x)]
+
+        candidates = []
+        for chunk_x, chunk_y in chunks:
+            chunk = self._walkable_index(level, chunk_x, chunk_y)
+            candidates.extend((chunk, bucket) for bucket in chunk.walkable if bucket)
+        return self._pick_walkable(candidates, rng)
+
+    def sample_walkable_near(self, level, x, y, min_distance, max_distance, rng=random):
+        """Random walkable tile (x, y) min_distance..max_distance pixels from (x, y)
+
+        Only buckets lying entirely inside the ring are considered, so any tile
+        picked is valid without retrying. Returns None if none of them has a
+        walkable tile.
+        """
+        span = WALKABLE_BUCKET_SIZE * TILE_SIZE
+        reach = span - TILE_SIZE  # From a bucket's first tile to its last one
+        min_squared = min_distance * min_distance
+        max_squared = max_distance * max_distance
+        last_x = (self.width - 1) // WALKABLE_BUCKET_SIZE
+        last_y = (self.height - 1) // WALKABLE_BUCKET_SIZE
+
+        candidates = []
+        for bucket_y in range(max(0, int(y - max_distance) // span),
+                              min(last_y, int(y + max_distance) // span) + 1):
+            top = bucket_y * span
+            near_y = max(top - y, y - top - reach, 0)
+            far_y = max(abs(top - y), abs(top + reach - y))
+            for bucket_x in range(max(0, int(x - max_distance) // span),
+                                  min(last_x, int(x + max_distance) // span) + 1):
+                left = bucket_x * span
+                near_x = max(left - x, x - left - reach, 0)
+                far_x = max(abs(left - x), abs(left + reach - x))
+                if (near_x * near_x + near_y * near_y < min_squared or
+                        far_x * far_x + far_y * far_y > max_squared):
+                    continue
+
+                chunk = self._walkable_index(level, bucket_x // BUCKETS_PER_ROW,
+                                             bucket_y // BUCKETS_PER_ROW)
+                bucket = chunk.walkable[(bucket_y % BUCKETS_PER_ROW) * BUCKETS_PER_ROW +
+                                        bucket_x % BUCKETS_PER_ROW]
+                if bucket:
+                    candidates.append((chunk, bucket))
+        return self._pick_walkable(candidates, rng)
+
+    def region_id(self, level, tile_x, tile_y):
+        """Id of the connected walkable region containing a tile, or None if it is solid
+
+        Regions are joined up through the chunks loaded so far, so two tiles
+        linked only through chunks nobody has touched yet count as apart.
+        """
+        if not (0 <= tile_x < self.width and 0 <= tile_y < self.height):
+            return None
+        chunk = self.get_chunk(level, tile_x // CHUNK_SIZE, tile_y // CHUNK_SIZE)
+        if self.labelled_chunks[level] != len(self.chunks[level]):
+            self._label_loaded_chunks(level)
+
+        label = chunk.region_labels[(tile_y % CHUNK_SIZE) * CHUNK_SIZE + tile_x % CHUNK_SIZE]
+        return None if label < 0 else _find_region(self.region_parents[level], label)
+
+    def same_region(self, a, b):
+        """Check if a walkable path (through loaded chunks) joins two (level, tile_x, tile_y) positions"""
+        if a[0] != b[0]:
+            return False
+        region = self.region_id(*a)
+        return region is not None and region == self.region_id(*b)
+
+    def _label_loaded_chunks(self, level):
+        """Label the chunks loaded since the last query and join them to their labelled neighbours"""
+        for chunk in list(self.chunks[level].values()):
+            if chunk.region_labels is None:
+                self._label_chunk(level, chunk)
+                self._join_chunk(level, chunk, ((-1, 0), (1, 0), (0, -1), (0, 1)))
+                self.labelled_chunks[level] += 1
+
+    def _label_chunk(self, level, chunk):
+        """Give each connected walkable part of a chunk a new region label
+
+        Rows are split into runs of open tiles, and runs touching a run of the
+        row above are merged, so the work is per run rather than per tile.
+        """
+        solid = chunk.solid
+        width = min(CHUNK_SIZE, self.width - chunk.chunk_x * CHUNK_SIZE)
+        height = min(CHUNK_SIZE, self.height - chunk.chunk_y * CHUNK_SIZE)
+        local = []  # Union-find over the chunk's runs
+        runs = []  # (start, end, run)
+        above = []
+        for row in range(0, height * CHUNK_SIZE, CHUNK_SIZE):
+            row_end = row + width
+            current = []
+            start = solid.find(0, row, row_end)
+            while start >= 0:
+                end = solid.find(1, start, row_end)
+                if end < 0:
+                    end = row_end
+                run = len(local)
+                local.append(run)
+                for above_start, above_end, above_run in above:
+                    if above_start < end - CHUNK_SIZE and start - CHUNK_SIZE < above_end:
+                        _union_regions(local, run, above_run)
+                current.append((start, end, run))
+                start = solid.find(0, end, row_end) if end < row_end else -1
+            runs.extend(current)
+            above = current
+
+        parent = self.region_parents[level]
+        labels = [-1] * (CHUNK_SIZE * CHUNK_SIZE)
+        ids = {}  # {run root: region label}
+        for start, end, run in runs:
+            root = _find_region(local, run)
+            label = ids.get(root)
+            if label is None:
+                label = ids[root] = len(parent)
+                parent.append(label)
+            labels[start:end] = [label] * (end - start)
+        chunk.region_labels = labels
+        self.live_labels[level] += len(ids) - chunk.region_count
+        chunk.region_count = len(ids)
+
+    def _join_chunk(self, level, chunk, sides):
+        """Merge a chunk's regions with those meeting them across the given sides' (dx, dy) edges"""
+        parent = self.region_parents[level]
+        labels = chunk.region_labels
+        last = CHUNK_SIZE - 1
+        for dx, dy in sides:
+            neighbour = self.chunks[level].get((chunk.chunk_x + dx, chunk.chunk_y + dy))
+            if neighbour is None or neighbour.region_labels is None:
+                continue
+            other = neighbour.region_labels
+            if dx:
+                own, across = (last, 0) if dx > 0 else (0, last)
+                pairs = ((row + own, row + across) for row in range(0, CHUNK_SIZE * CHUNK_SIZE, CHUNK_SIZE))
+            else:
+                own, across = (last * CHUNK_SIZE, 0) if dy > 0 else (0, last * CHUNK_SIZE)
+                pairs = ((own + column, across + column) for column in range(CHUNK_SIZE))
+            for i, j in pairs:
+                if labels[i] >= 0 and other[j] >= 0:
+                    _union_regions(parent, labels[i], other[j])
+
+    def _update_regions(self, level, chunk, i):
+        """Keep region labels right after a tile's solidity changed"""
+        self._label_chunk(level, chunk)
+        parent = self.region_parents[level]
+        compact = len(parent) > 2 * self.live_labels[level]
+        if not chunk.solid[i] and not compact:
+            # An opened wall only joins regions: the chunk's old labels stay valid too
+            self._join_chunk(level, chunk, ((-1, 0), (1, 0), (0, -1), (0, 1)))
+            return
+
+        # A new wall may split a region, which a union-find can't undo: keep every
+        # chunk's own labels but redo the joins between chunks. Once most labels
+        # are left over from relabelling, every chunk is labelled afresh instead.
+        labelled = [other for other in self.chunks[level].values() if other.region_labels is not None]
+        if compact:
+            parent.clear()
+            self.live_labels[level] = 0
+            for other in labelled:
+                other.region_count = 0
+                self._label_chunk(level, other)
+        else:
+            parent[:] = range(len(parent))
+        for other in labelled:
+            self._join_chunk(level, other, ((1, 0), (0, 1)))
+
+    def _pick_walkable(self, candidates, rng):
+        """Pick a bucket weighted by size, then a tile in it"""
+        if not candidates:
+            return None
+        chunk, bucket = rng.choices(candidates, [len(bucket) for _, bucket in candidates])[0]
+        i = bucket[rng.randrange(len(bucket))]
+        return (chunk.chunk_x * CHUNK_SIZE + i % CHUNK_SIZE,
+                chunk.chunk_y * CHUNK_SIZE + i // CHUNK_SIZE)
 
     def get_portal_position(self, level, portal_type):
         """Get the position of a portal in a specific level"""
@@ -294,65 +624,57 @@ class World:
             return self.cave_portal
         return (self.width // 2, self.height // 2)
 
-    def draw(self, screen, camera_x, camera_y, current_level):
-        """Draw visible tiles for the current level"""
-        # Calculate visible tile range
-        start_x = max(0, int(camera_x // TILE_SIZE) - 1)
-        end_x = min(self.width, int((camera_x + SCREEN_WIDTH) // TILE_SIZE) + 2)
-        start_y = max(0, int(camera_y // TILE_SIZE) - 1)
-        end_y = min(self.height, int((camera_y + SCREEN_HEIGHT) // TILE_SIZE) + 2)
-
-        # Get the appropriate tile grid
-        if current_level == LEVEL_JUNGLE:
-            tiles = self.jungle_tiles
-        else:
-            tiles = self.cave_tiles
-
-        # Draw tiles
-        for x in range(start_x, end_x):
-            for y in range(start_y, end_y):
-                tile = tiles[x][y]
-                sprite = self.sprite_manager.get_tile(tile)
-                screen_x = x * TILE_SIZE - camera_x
-                screen_y = y * TILE_SIZE - camera_y
-                screen.blit(sprite, (screen_x, screen_y))
+    def draw(self, screen, camera_x, camera_y, current_level, time=None, zoom=1, scale=1):
+        """Draw the visible part of the current level through the world layer
+
+        With a time, tiles are drawn with the tile set for its light level.
+        The camera is in world pixels; each screen pixel shows zoom * scale
+        world pixels, with tiles shrunk by nearest neighbour for the scale.
+        """
+        if self.surface_cache is None:
+            self.surface_cache = ChunkSurfaceCache(self.sprite_manager)
+            self.layer = WorldLayer(self.surface_cache)
+        light = LIGHT_LEVELS - 1 if time is None else self.light_level(current_level, time)
+        self.layer.draw(self, current_level, camera_x, camera_y, screen, light, zoom, scale)
+
+        # Get the next light level's chunks ready a little at a time
+        if time is not None:
+            upcoming = self.light_level(current_level, time + LIGHT_PREFETCH_FRAMES)
+            if upcoming != light:
+                self.layer.prefetch(self, current_level, camera_x, camera_y, screen.get_size(), upcoming,
+                                    zoom, scale)
+
+    def draw_lighting(self, screen, camera_x, camera_y, player_tile, zoom=1):
+        """Darken the drawn cave by its lightmap, following the player's light"""
+        if self.lightmap is None:
+            self.lightmap = Lightmap(self, LEVEL_CAVE)
+            self.light_layer = LightLayer(self.lightmap)
+        self.lightmap.move_player(*player_tile)
+        self.light_layer.draw(self, camera_x, camera_y, screen, zoom)
+
+    def get_minimap(self, level):
+        """The minimap of a level"""
+        minimap = self.minimaps.get(level)
+        if minimap is None:
+            minimap = self.minimaps[level] = Minimap(self, level)
+        return minimap
 
     def is_night(self, time):
         """Check if it's night time"""
         cycle_time = time % DAY_CYCLE_LENGTH
         return cycle_time >= DAY_LENGTH
 
+    def light_level(self, current_level, time):
+        """Discrete light level of a level at a time (the cave has no daylight to lose)"""
+        if current_level == LEVEL_CAVE:
+            return LIGHT_LEVELS - 1
+        return LIGHT_CYCLE[time % DAY_CYCLE_LENGTH]
+
     def get_background_color(self, current_level, time):
         """Get background color based on level and time"""
         if current_level == LEVEL_CAVE:
             # Always dark in cave
             return CAVE_DARK
 
-        # Jungle - varies with time
-        cycle_time = time % DAY_CYCLE_LENGTH
-
-        if cycle_time < DAY_LENGTH:
-            # Day time
-            return SKY_BLUE
-        else:
-            # Night time - interpolate to dark
-            progress = (cycle_time - DAY_LENGTH) / NIGHT_LENGTH
-            if progress < 0.1:
-                # Sunset
-                t = progress / 0.1
-                return self._lerp_color(SKY_BLUE, NIGHT_SKY, t)
-            elif progress > 0.9:
-                # Sunrise
-                t = (progress - 0.9) / 0.1
-                return self._lerp_color(NIGHT_SKY, SKY_BLUE, t)
-            else:
-                # Full night
-                return NIGHT_SKY
-
-    def _lerp_color(self, color1, color2, t):
-        """Linear interpolation between two colors"""
-        return (
-            int(color1[0] + (color2[0] - color1[0]) * t),
-            int(color1[1] + (color2[1] - color1[1]) * t),
-            int(color1[2] + (color2[2]) * t)
-        )
+        # Jungle - follows the light level, through sunset and sunrise
+        return SKY_COLORS[self.light_level(current_level, time)]
@@ -0,0 +1,152 @@
+"""
+On-disk cache of generated worlds
+
+Entries hold the pristine generated chunks, portals and spawn point of one
+(seed, width, height, generator version) in the save file format, so a
+cached world is memory-mapped and paged in just like a saved game. Entries
+from an older generator are dropped automatically and the rest are evicted
+least-recently-used first once the cache grows past its size limit.
+"""
+
+import hashlib
+import os
+from constants import *
+from savegame import SaveFile, SaveFormatError, WorldSnapshot, world_header, write_snapshot
+from world import World
+from worldgen import generate_chunk, generator_fingerprint
+
+
+def default_cache_dir():
+    """Per-user cache directory for generated worlds"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "vampire-cave-explorer", "worlds")
+
+
+class WorldCache:
+    """Size-bounded LRU cache of generated worlds on disk"""
+
+    def __init__(self, directory=None, max_bytes=WORLD_CACHE_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.fingerprint = generator_fingerprint()
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, seed, width, height):
+        """Cache file for a world; the generator fingerprint is part of the name"""
+        key = hashlib.sha1(f"{seed}:{width}:{height}:{self.fingerprint}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{self.fingerprint}-{key[:24]}.vcw")
+
+    def open(self, seed, width, height):
+        """Open the cached world as a chunk source, or return None on a miss"""
+        path = self.path_for(seed, width, height)
+        try:
+            entry = SaveFile(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, SaveFormatError):
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def store(self, world):
+        """Add the chunks world generated itself to its cache entry
+
+        Chunks that have been mined since are regenerated from the seed, so only
+        pristine tiles ever reach the cache. Returns True if anything was written.
+        """
+        if not world.generated_chunks:
+            return False
+
+        chunks = []
+        for level, chunk_x, chunk_y in sorted(world.generated_chunks):
+            chunk = world.chunks[level][(chunk_x, chunk_y)]
+            if chunk.modified:
+                tiles = bytes(generate_chunk(world.seed, level, chunk_x, chunk_y,
+                                             world.width, world.height))
+            else:
+                tiles = bytes(chunk.tiles)
+            chunks.append((level, chunk_x, chunk_y, tiles))
+
+        path = self.path_for(world.seed, world.width, world.height)
+        existing = world.cache_source
+        opened = False
+        if existing is None and os.path.exists(path):
+            try:
+                existing = SaveFile(path)
+                opened = True
+            except (OSError, SaveFormatError):
+                existing = None
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = path + ".tmp"
+            write_snapshot(temp_path, WorldSnapshot(world_header(world), chunks),
+                           compress=True, source=existing)
+            if opened:
+                existing.close()
+                opened = False
+            os.replace(temp_path, path)
+        except OSError:
+            return False
+        finally:
+            if opened:
+                existing.close()
+
+        world.generated_chunks.clear()
+        self.evict()
+        return True
+
+    def warm(self, seed, workers=None):
+        """Generate a whole world (in parallel) and store it, e.g. ahead of test runs"""
+        world = World(None, seed=seed, cache=self)
+        world.pregenerate(workers=workers)
+        return self.store(world)
+
+    def entries(self):
+        """[(path, size, last used)] of every entry file in the cache"""
+        result = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return result
+        for name in names:
+            if name.endswith(".vcw"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                result.append((path, stat.st_size, stat.st_mtime))
+        return result
+
+    def evict(self):
+        """Drop entries from other generator versions, then the least recently used"""
+        entries = []
+        for path, size, last_used in self.entries():
+            if os.path.basename(path).startswith(self.fingerprint + "-"):
+                entries.append((last_used, path, size))
+            else:
+                self._remove(path)
+
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,350 @@
+"""
+Deterministic chunk generation for the jungle and cave levels
+
+Every chunk is a pure function of (seed, level, chunk_x, chunk_y), and each
+generation stage draws from its own derived random stream. Features such as
+lakes, forests and ore veins belong to the chunk they start in, and a chunk
+replays the features of its eight neighbours so that anything spilling across
+a chunk border lines up no matter which chunk is generated first.
+"""
+
+import hashlib
+import os
+import random
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from constants import *
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; generation falls back to pure Python
+    np = None
+
+# Bump when a generation change isn't visible in this file's source
+# (for example a behaviour change in a helper it relies on)
+GENERATOR_VERSION = 1
+
+# Cells of context generated around a cave chunk so the cellular automaton
+# and the ore veins that reach into it see the same neighbours every time
+CAVE_PADDING = 12
+
+# Owned features kept around per process, so a batch of neighbouring chunks
+# draws each chunk's features once rather than once per neighbour
+FEATURE_CACHE_CHUNKS = 256
+
+# Per-chunk feature budgets (roughly the densities of the old 150x150 map)
+LAKE_CHANCE = 0.25
+FOREST_CHANCE = 0.45
+SCATTERED_TREES = 9
+BUSHES = 7
+FLOWERS = 5
+STONE_DEPOSITS = 5
+IRON_VEINS = 4
+DIAMOND_VEINS = 1
+
+
+def generator_fingerprint():
+    """Short hash identifying the generator: its version, chunk size and source code"""
+    digest = hashlib.sha1(f"{GENERATOR_VERSION}:{CHUNK_SIZE}:".encode())
+    with open(__file__, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def stage_rng(seed, level, stage, chunk_x=None, chunk_y=None):
+    """Independent random stream for one generation stage, optionally of one chunk
+
+    Streams are derived from the seed alone, never from the global random
+    module, so stages and chunks can be generated in any order or process.
+    """
+    if chunk_x is None:
+        return random.Random(f"{seed}:{level}:{stage}")
+    return random.Random(f"{seed}:{level}:{stage}:{chunk_x}:{chunk_y}")
+
+
+def cave_portal_position(seed, width, height):
+    """Tile position of the cave exit portal (near the centre of the cave)"""
+    rng = stage_rng(seed, LEVEL_CAVE, "portal")
+    return (width // 2 + rng.randint(-5, 5), height // 2 + rng.randint(-5, 5))
+
+
+def jungle_portal_position(width, height):
+    """Tile position of the cave entrance portal (centre of the jungle)"""
+    return (width // 2, height // 2)
+
+
+def generate_chunk(seed, level, chunk_x, chunk_y, width, height):
+    """Generate the tiles of one chunk as a row-major CHUNK_SIZE^2 bytearray"""
+    if level == LEVEL_JUNGLE:
+        return generate_jungle_chunk(seed, chunk_x, chunk_y, width, height)
+    elif level == LEVEL_CAVE:
+        return generate_cave_chunk(seed, chunk_x, chunk_y, width, height)
+    return bytearray(CHUNK_SIZE * CHUNK_SIZE)
+
+
+def _generate_chunk_job(job):
+    """Process pool entry point: generate one chunk from a picklable job tuple"""
+    seed, level, chunk_x, chunk_y, width, height = job
+    return generate_chunk(seed, level, chunk_x, chunk_y, width, height)
+
+
+def generate_chunks(seed, level, coords, width, height, workers=None):
+    """Generate many chunks of a level, spread over a process pool
+
+    Returns {(chunk_x, chunk_y): tiles}. Every chunk is a pure function of its
+    coordinates, so the output is identical for any number of workers.
+    """
+    coords = list(coords)
+    jobs = [(seed, level, chunk_x, chunk_y, width, height) for chunk_x, chunk_y in coords]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        results = map(_generate_chunk_job, jobs)
+        return dict(zip(coords, results))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        results = pool.map(_generate_chunk_job, jobs, chunksize=chunksize)
+        return dict(zip(coords, results))
+
+
+def _neighbour_chunks(chunk_x, chunk_y):
+    """The 3x3 block of chunks centred on a chunk, in a fixed order"""
+    return [(chunk_x + dx, chunk_y + dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+@lru_cache(maxsize=FEATURE_CACHE_CHUNKS)
+def _jungle_features(seed, chunk_x, chunk_y):
+    """Draw every jungle feature owned by a chunk, in global tile coordinates (cached, so never modify them)"""
+    x0 = chunk_x * CHUNK_SIZE
+    y0 = chunk_y * CHUNK_SIZE
+
+    def stream(stage):
+        return stage_rng(seed, LEVEL_JUNGLE, stage, chunk_x, chunk_y)
+
+    def point(rng):
+        return x0 + rng.randrange(CHUNK_SIZE), y0 + rng.randrange(CHUNK_SIZE)
+
+    lakes = []
+    rng = stream("lakes")
+    if rng.random() < LAKE_CHANCE:
+        cx, cy = point(rng)
+        lakes.append((cx, cy, rng.randint(3, 7)))
+
+    forest_trees = []
+    rng = stream("forests")
+    if rng.random() < FOREST_CHANCE:
+        cx, cy = point(rng)
+        size = rng.randint(5, 12)
+        for _ in range(size * size // 2):
+            forest_trees.append((cx + rng.randint(-size, size), cy + rng.randint(-size, size)))
+
+    rng = stream("trees")
+    trees = [point(rng) for _ in range(SCATTERED_TREES)]
+    rng = stream("bushes")
+    bushes = [point(rng) for _ in range(BUSHES)]
+    rng = stream("flowers")
+    flowers = [point(rng) for _ in range(FLOWERS)]
+    return lakes, forest_trees, trees, bushes, flowers
+
+
+def generate_jungle_chunk(seed, chunk_x, chunk_y, width, height):
+    """Generate one chunk of the jungle level (surface)"""
+    tiles = bytearray([TILE_GRASS]) * (CHUNK_SIZE * CHUNK_SIZE)
+    x0 = chunk_x * CHUNK_SIZE
+    y0 = chunk_y * CHUNK_SIZE
+
+    def index(x, y):
+        x -= x0
+        y -= y0
+        if 0 <= x < CHUNK_SIZE and 0 <= y < CHUNK_SIZE:
+            return y * CHUNK_SIZE + x
+        return -1
+
+    def plant(points, tile):
+        for x, y in points:
+            i = index(x, y)
+            if i >= 0 and tiles[i] == TILE_GRASS:
+                tiles[i] = tile
+
+    owned = {owner: _jungle_features(seed, *owner) for owner in _neighbour_chunks(chunk_x, chunk_y)}
+
+    # Water bodies and forests can spill over from neighbouring chunks
+    for lakes, _, _, _, _ in owned.values():
+        for cx, cy, radius in lakes:
+            for dx in range(-radius, radius + 1):
+                for dy in range(-radius, radius + 1):
+                    if dx * dx + dy * dy <= radius * radius:
+                        i = index(cx + dx, cy + dy)
+                        if i >= 0:
+                            tiles[i] = TILE_WATER
+
+    for _, forest_trees, _, _, _ in owned.values():
+        plant(forest_trees, TILE_TREE)
+
+    # Scattered trees, bushes and flowers stay inside their own chunk
+    _, _, trees, bushes, flowers = owned[(chunk_x, chunk_y)]
+    plant(trees, TILE_TREE)
+    plant(bushes, TILE_BUSH)
+    plant(flowers, TILE_FLOWER)
+
+    # Cave entrance portal
+    i = index(*jungle_portal_position(width, height))
+    if i >= 0:
+        tiles[i] = TILE_CAVE_ENTRANCE
+
+    return tiles
+
+
+def smooth_walls(walls, width, height, passes):
+    """Cellular-automata smoothing of a row-major 0/1 wall mask (border cells stay fixed)"""
+    if np is not None:
+        grid = np.frombuffer(bytes(walls), dtype=np.uint8).reshape(height, width).copy()
+        for _ in range(passes):
+            # Sum the 8 neighbours of every interior cell
+            count = (grid[:-2, :-2] + grid[:-2, 1:-1] + grid[:-2, 2:] +
+                     grid[1:-1, :-2] + grid[1:-1, 2:] +
+                     grid[2:, :-2] + grid[2:, 1:-1] + grid[2:, 2:])
+            # More than 4 walls -> wall, fewer than 4 -> floor, exactly 4 -> unchanged
+            grid[1:-1, 1:-1] = (count > 4) | ((count == 4) & (grid[1:-1, 1:-1] == 1))
+        return bytearray(grid.tobytes())
+
+    walls = bytearray(walls)
+    w = width
+    for _ in range(passes):
+        old = bytes(walls)
+        for y in range(1, height - 1):
+            row = y * w
+            for x in range(1, w - 1):
+                i = row + x
+                wall_count = (old[i - w - 1] + old[i - w] + old[i - w + 1] + old[i - 1] +
+                              old[i + 1] + old[i + w - 1] + old[i + w] + old[i + w + 1])
+                if wall_count > 4:
+                    walls[i] = 1
+                elif wall_count < 4:
+                    walls[i] = 0
+    return walls
+
+
+@lru_cache(maxsize=FEATURE_CACHE_CHUNKS)
+def _cave_features(seed, chunk_x, chunk_y):
+    """Draw the wall noise and ore veins owned by a cave chunk (cached, so never modify them)"""
+    x0 = chunk_x * CHUNK_SIZE
+    y0 = chunk_y * CHUNK_SIZE
+
+    rng = stage_rng(seed, LEVEL_CAVE, "noise", chunk_x, chunk_y)
+    draw = rng.random
+    noise = bytes([draw() < 0.45 for _ in range(CHUNK_SIZE * CHUNK_SIZE)])
+
+    def veins(stage, count, min_size, max_size):
+        # Walks are drawn up front so the stream never depends on tile state
+        rng = stage_rng(seed, LEVEL_CAVE, stage, chunk_x, chunk_y)
+        result = []
+        for _ in range(count):
+            x = x0 + rng.randrange(CHUNK_SIZE)
+            y = y0 + rng.randrange(CHUNK_SIZE)
+            steps = []
+            for _ in range(rng.randint(min_size, max_size)):
+                steps.append((x, y))
+                x += rng.choice([-1, 0, 1])
+                y += rng.choice([-1, 0, 1])
+            result.append(steps)
+        return result
+
+    stones = veins("stone", STONE_DEPOSITS, 2, 5)
+    iron = veins("iron", IRON_VEINS, 1, 3)
+    diamonds = veins("diamond", DIAMOND_VEINS, 1, 2)
+    return noise, stones, iron, diamonds
+
+
+CAVE_WALL_TILES = bytes([TILE_CAVE_FLOOR, TILE_CAVE_WALL]) + bytes(254)  # Wall mask -> tiles, for translate
+
+
+def generate_cave_chunk(seed, chunk_x, chunk_y, width, height):
+    """Generate one chunk of the cave level (underground)"""
+    pad = CAVE_PADDING
+    size = CHUNK_SIZE + 2 * pad
+    wx0 = chunk_x * CHUNK_SIZE - pad
+    wy0 = chunk_y * CHUNK_SIZE - pad
+
+    def index(x, y):
+        x -= wx0
+        y -= wy0
+        if 0 <= x < size and 0 <= y < size:
+            return y * size + x
+        return -1
+
+    def in_world(x, y):
+        return 0 <= x < width and 0 <= y < height
+
+    # Assemble the initial wall noise for the padded window (outside the world is wall),
+    # a row slice at a time
+    walls = bytearray([1]) * (size * size)
+    left, right = max(wx0, 0), min(wx0 + size, width)  # Window columns inside the world
+    owned = []
+    for owner_x, owner_y in _neighbour_chunks(chunk_x, chunk_y):
+        noise, stones, iron, diamonds = _cave_features(seed, owner_x, owner_y)
+        owned.append((stones, iron, diamonds))
+        gx0 = max(left, owner_x * CHUNK_SIZE)
+        gx1 = min(right, (owner_x + 1) * CHUNK_SIZE)
+        if gx0 >= gx1:
+            continue
+        for gy in range(max(wy0, 0, owner_y * CHUNK_SIZE), min(wy0 + size, height, (owner_y + 1) * CHUNK_SIZE)):
+            source = (gy - owner_y * CHUNK_SIZE) * CHUNK_SIZE + gx0 - owner_x * CHUNK_SIZE
+            target = (gy - wy0) * size + gx0 - wx0
+            walls[target:target + gx1 - gx0] = noise[source:source + gx1 - gx0]
+
+    # Generate cave walls using cellular automata
+    walls = smooth_walls(walls, size, size, 4)
+    tiles = walls.translate(CAVE_WALL_TILES)
+
+    # Add border walls: whole rows on the top and bottom edges, a few cells on the sides
+    wall_row = bytes([TILE_CAVE_WALL]) * size
+    for y in range(size):
+        gy = wy0 + y
+        row = y * size
+        if gy <= 0 or gy >= height - 1:
+            tiles[row:row + size] = wall_row
+            continue
+        low = min(size, max(0, 1 - wx0))  # Window columns with gx <= 0
+        high = max(0, min(size, width - 1 - wx0))  # ...and from gx >= width - 1
+        tiles[row:row + low] = wall_row[:low]
+        tiles[row + high:row + size] = wall_row[high:]
+
+    def grow(veins, targets, tile):
+        for steps in veins:
+            x, y = steps[0]
+            i = index(x, y)
+            if i < 0 or tiles[i] not in targets:
+                continue
+            for x, y in steps:
+                i = index(x, y)
+                if i >= 0 and 0 < x < width - 1 and 0 < y < height - 1 and tiles[i] in targets:
+                    tiles[i] = tile
+
+    # Add stone deposits (minable), then iron and diamond ore
+    for stones, _, _ in owned:
+        grow(stones, (TILE_CAVE_WALL,), TILE_STONE)
+    for _, iron, _ in owned:
+        grow(iron, (TILE_CAVE_WALL, TILE_STONE), TILE_IRON_ORE)
+    for _, _, diamonds in owned:
+        grow(diamonds, (TILE_CAVE_WALL, TILE_STONE), TILE_DIAMOND_ORE)
+
+    # Cave exit portal, with the walls around it cleared
+    portal_x, portal_y = cave_portal_position(seed, width, height)
+    for dx in range(-2, 3):
+        for dy in range(-2, 3):
+            i = index(portal_x + dx, portal_y + dy)
+            if i >= 0 and tiles[i] == TILE_CAVE_WALL and in_world(portal_x + dx, portal_y + dy):
+                tiles[i] = TILE_CAVE_FLOOR
+    i = index(portal_x, portal_y)
+    if i >= 0:
+        tiles[i] = TILE_CAVE_EXIT
+
+    # Crop the padded window down to the chunk itself
+    chunk = bytearray()
+    for y in range(pad, pad + CHUNK_SIZE):
+        chunk += tiles[y * size + pad:y * size + pad + CHUNK_SIZE]
+    return chunk